@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic Sokkia-style RINEX 2.11 families (.yyO, .yyN, .yyG) for the
+benchmarks. The files are named after the real session date while their
+content is dated `shift_weeks` GPS weeks earlier, as written by receivers
+hit by the week rollover.
+"""
+
+import argparse
+import math
+import random
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+OBS_TYPES = ("C1", "L1", "L2", "P2", "D1", "S1", "S2")
+WAVELENGTH_L1 = 0.190293672798
+WAVELENGTH_L2 = 0.244210213425
+
+GPS_SATS = tuple(f"G{prn:02d}" for prn in range(1, 33))
+GLONASS_SATS = tuple(f"R{slot:02d}" for slot in range(1, 25))
+
+# name: (duration in seconds, interval in seconds, constellations)
+PROFILES = {
+    "1h-30s-gps": (3600, 30, "G"),
+    "1h-1s-gps": (3600, 1, "G"),
+    "1h-1s-mixed": (3600, 1, "GR"),
+    "24h-30s-gps": (86400, 30, "G"),
+    "24h-30s-mixed": (86400, 30, "GR"),
+    "24h-1s-gps": (86400, 1, "G"),
+    "24h-1s-mixed": (86400, 1, "GR"),
+}
+
+DEFAULT_DATE = date(2019, 4, 7)
+DEFAULT_SHIFT_WEEKS = 1024
+
+
+def _header_line(content, label):
+    return f"{content:<60}{label:<20}\n"
+
+
+def _time_fields(t):
+    return (f"{t.year:6d}{t.month:6d}{t.day:6d}{t.hour:6d}{t.minute:6d}"
+            f"{t.second + t.microsecond / 1e6:13.7f}")
+
+
+def _d19(value):
+    return f"{value:19.12E}".replace("E", "D")
+
+
+def family_name(station, session_date):
+    doy = session_date.timetuple().tm_yday
+    return f"{station}{doy:03d}0", f"{session_date.year % 100:02d}"
+
+
+class _Satellite:
+    """Smooth synthetic observables, so compression ratios stay realistic"""
+
+    def __init__(self, rng):
+        self.range0 = rng.uniform(20e6, 25e6)
+        self.rate = rng.uniform(-800.0, 800.0)
+        self.accel = rng.uniform(-0.05, 0.05)
+        self.snr = rng.uniform(38.0, 50.0)
+        self.ambiguity1 = rng.randint(-10**6, 10**6)
+        self.ambiguity2 = rng.randint(-10**6, 10**6)
+
+    def fields(self, t, rng):
+        distance = self.range0 + self.rate * t + 0.5 * self.accel * t * t
+        velocity = self.rate + self.accel * t
+        noise = rng.gauss(0.0, 0.3)
+        values = (
+            distance + noise,
+            distance / WAVELENGTH_L1 + self.ambiguity1,
+            distance / WAVELENGTH_L2 + self.ambiguity2,
+            distance + 2.1 + rng.gauss(0.0, 0.3),
+            -velocity / WAVELENGTH_L1,
+            self.snr + 2.0 * math.sin(t / 900.0),
+            self.snr - 6.0 + 2.0 * math.sin(t / 900.0),
+        )
+        ssi = min(9, max(1, int(self.snr) // 6))
+        return [f"{value:14.3f} {ssi}" for value in values]
+
+
+def _visible(sats, epoch_index, epochs_per_hour, count):
+    # The visible window moves by one satellite every hour
+    start = (epoch_index // max(1, epochs_per_hour)) % len(sats)
+    return [sats[(start + i) % len(sats)] for i in range(count)]
+
+
+def write_observation_file(path, station, start, duration, interval,
+                           systems, seed=0):
+    rng = random.Random(seed)
+    epochs = duration // interval
+    last = start + timedelta(seconds=interval * (epochs - 1))
+    mixed = len(systems) > 1
+    satellites = {sat: _Satellite(rng) for sat in GPS_SATS + GLONASS_SATS}
+    epochs_per_hour = 3600 // interval
+
+    with open(path, "w", newline="\n") as f:
+        sys_char = "M (MIXED)" if mixed else "G (GPS)"
+        f.write(_header_line(f"     2.11           OBSERVATION DATA    {sys_char}",
+                             "RINEX VERSION / TYPE"))
+        f.write(_header_line(
+            f"{'Sokkia':<20}{'Sokkia':<20}{start:%Y%m%d %H:%M:%S}UTC",
+            "PGM / RUN BY / DATE"))
+        f.write(_header_line(station, "MARKER NAME"))
+        f.write(_header_line(f"{'0001':<20}{'SOKKIA GSR2700ISX':<20}{'3.110':<20}",
+                             "REC # / TYPE / VERS"))
+        f.write(_header_line(f"{len(OBS_TYPES):6d}" + "".join(f"{o:>6}" for o in OBS_TYPES),
+                             "# / TYPES OF OBSERV"))
+        f.write(_header_line(f"{interval:10.3f}", "INTERVAL"))
+        f.write(_header_line(f"{_time_fields(start)}     GPS", "TIME OF FIRST OBS"))
+        f.write(_header_line(f"{_time_fields(last)}     GPS", "TIME OF LAST OBS"))
+        f.write(_header_line("", "END OF HEADER"))
+
+        for i in range(epochs):
+            seconds = i * interval
+            t = start + timedelta(seconds=seconds)
+            sats = _visible(GPS_SATS, i, epochs_per_hour, 10)
+            if mixed:
+                sats += _visible(GLONASS_SATS, i, epochs_per_hour, 7)
+
+            clock = 0.000123456 + 1e-9 * seconds
+            line = (f" {t.year % 100:02d}{t.month:3d}{t.day:3d}{t.hour:3d}"
+                    f"{t.minute:3d}{t.second:11.7f}  0{len(sats):3d}"
+                    + "".join(sats[:12]))
+            if len(sats) <= 12:
+                line = line.ljust(68) + f"{clock:12.9f}"
+            f.write(line + "\n")
+            for k in range(12, len(sats), 12):
+                f.write(" " * 32 + "".join(sats[k:k + 12]) + "\n")
+
+            for sat in sats:
+                fields = satellites[sat].fields(seconds, rng)
+                f.write("".join(fields[:5]).rstrip() + "\n")
+                f.write("".join(fields[5:]).rstrip() + "\n")
+
+
+def write_gps_navigation_file(path, start, duration):
+    rng = random.Random(1)
+    week = (start.date() - date(1980, 1, 6)).days // 7
+
+    with open(path, "w", newline="\n") as f:
+        f.write(_header_line("     2.11           N: GPS NAV DATA", "RINEX VERSION / TYPE"))
+        f.write(_header_line(f"{'Sokkia':<20}{'Sokkia':<20}{start:%Y%m%d %H:%M:%S}UTC",
+                             "PGM / RUN BY / DATE"))
+        f.write(_header_line("    .1211D-07   .2235D-07  -.5960D-07  -.1192D-06",
+                             "ION ALPHA"))
+        f.write(_header_line("    .1024D+06   .1147D+06  -.6554D+05  -.5243D+06",
+                             "ION BETA"))
+        f.write(_header_line(f"   {_d19(0.0)}{_d19(0.0)}{405504:9d}{week:9d}",
+                             "DELTA-UTC: A0,A1,T,W"))
+        f.write(_header_line("    18", "LEAP SECONDS"))
+        f.write(_header_line("", "END OF HEADER"))
+
+        for hours in range(0, duration // 3600 or 1, 2):
+            t = start + timedelta(hours=hours)
+            for sat in GPS_SATS[:10]:
+                prn = int(sat[1:])
+                orbit = [rng.uniform(-1, 1) for _ in range(28)]
+                orbit[18] = float(week)  # BROADCAST ORBIT - 5, GPS week
+                f.write(f"{prn:2d} {t.year % 100:02d}{t.month:3d}{t.day:3d}"
+                        f"{t.hour:3d}{t.minute:3d}{t.second:5.1f}"
+                        f"{_d19(1e-5)}{_d19(1e-12)}{_d19(0.0)}\n")
+                for k in range(0, 28, 4):
+                    f.write("   " + "".join(_d19(v) for v in orbit[k:k + 4]) + "\n")
+
+
+def write_glonass_navigation_file(path, start, duration):
+    rng = random.Random(2)
+    with open(path, "w", newline="\n") as f:
+        f.write(_header_line("     2.11           G: GLONASS NAV DATA", "RINEX VERSION / TYPE"))
+        f.write(_header_line(f"{'Sokkia':<20}{'Sokkia':<20}{start:%Y%m%d %H:%M:%S}UTC",
+                             "PGM / RUN BY / DATE"))
+        f.write(_header_line(f"{start.year:6d}{start.month:6d}{start.day:6d}   {_d19(0.0)}",
+                             "CORR TO SYSTEM TIME"))
+        f.write(_header_line("    18", "LEAP SECONDS"))
+        f.write(_header_line("", "END OF HEADER"))
+
+        for minutes in range(0, max(duration // 60, 1), 30):
+            t = start + timedelta(minutes=minutes)
+            for sat in GLONASS_SATS[:7]:
+                slot = int(sat[1:])
+                f.write(f"{slot:2d} {t.year % 100:02d}{t.month:3d}{t.day:3d}"
+                        f"{t.hour:3d}{t.minute:3d}{t.second:5.1f}"
+                        f"{_d19(1e-5)}{_d19(0.0)}{_d19(0.0)}\n")
+                for _ in range(3):
+                    f.write("   " + "".join(_d19(rng.uniform(-1e4, 1e4)) for _ in range(4)) + "\n")
+
+
+def generate_family(directory, profile, station="SSTR", session_date=DEFAULT_DATE,
+                    shift_weeks=DEFAULT_SHIFT_WEEKS, seed=0):
+    """
+    Writes one family of the given profile into `directory`.
+
+    Returns:
+        Path: the observation file
+    """
+    duration, interval, systems = PROFILES[profile]
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    base, year = family_name(station, session_date)
+    start = datetime.combine(session_date, datetime.min.time()) \
+        - timedelta(weeks=shift_weeks)
+
+    obs_file = directory / f"{base}.{year}O"
+    write_observation_file(obs_file, station, start, duration, interval,
+                           systems, seed)
+    write_gps_navigation_file(directory / f"{base}.{year}N", start, duration)
+    if "R" in systems:
+        write_glonass_navigation_file(directory / f"{base}.{year}G", start, duration)
+    return obs_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("-p", "--profile", choices=sorted(PROFILES), default="1h-1s-gps")
+    parser.add_argument("-s", "--station", default="SSTR")
+    parser.add_argument("--date", default=DEFAULT_DATE.isoformat(),
+                        help="real session date, used in the file name")
+    parser.add_argument("--shift-weeks", type=int, default=DEFAULT_SHIFT_WEEKS,
+                        help="weeks the content is dated before the real date")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    obs_file = generate_family(
+        args.directory, args.profile, args.station,
+        date.fromisoformat(args.date), args.shift_weeks, args.seed)
+    print(obs_file)
+
+
+if __name__ == "__main__":
+    main()
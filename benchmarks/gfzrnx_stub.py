@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""
+Offline stand-in for the gfzrnx binary, covering the two calls made by
+this tool:
+
+    gfzrnx -finp FILE -meta basic:json
+    gfzrnx -shift_gpsw WEEKS -finp FILE -fout FILE [-vo 2]
+
+Point GFZRNX_PATH at this file (it must be executable) to run the
+gfzrnx code paths without the real binary.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rinex_reader import read_rinex_metadata  # noqa: E402
+from rinex_shift import shift_rinex_obs_file  # noqa: E402
+
+
+def _option(args, name):
+    if name not in args:
+        return None
+    return args[args.index(name) + 1]
+
+
+def main(args):
+    finp = _option(args, "-finp")
+    if not finp:
+        print("gfzrnx_stub: -finp is required", file=sys.stderr)
+        return 2
+
+    if _option(args, "-meta"):
+        print(json.dumps(read_rinex_metadata(finp, cache=None)))
+        return 0
+
+    shift = _option(args, "-shift_gpsw")
+    fout = _option(args, "-fout")
+    if shift is not None and fout:
+        shift_rinex_obs_file(finp, fout, int(shift))
+        return 0
+
+    print(f"gfzrnx_stub: unsupported arguments: {' '.join(args)}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
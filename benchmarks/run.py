@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Times each stage of the tool (metadata, rename, shift, re-date, zip, and
+the single-pass fix-and-archive pipeline) on
+synthetic RINEX families and reports throughput and peak RSS. Every
+stage runs in its own process on a fresh copy of the family, so the
+peak RSS of one stage does not leak into the next.
+
+    python benchmarks/run.py                      # default profiles
+    python benchmarks/run.py -p 24h-1s-mixed --repeat 3
+    python benchmarks/run.py -s shift -s zip -s pipeline   # two passes vs one
+    python benchmarks/run.py --compare benchmarks/results/<commit>.json
+
+Results are written to benchmarks/results/<commit>.json.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from generate import PROFILES, generate_family  # noqa: E402
+
+GFZRNX_STUB = BENCH_DIR / "gfzrnx_stub.py"
+DATA_DIR = BENCH_DIR / ".data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+STAGES = ("metadata", "metadata_gfzrnx", "rename", "shift", "shift_gfzrnx",
+          "redate", "zip", "pipeline", "split", "validate")
+DEFAULT_PROFILES = ("1h-30s-gps", "1h-1s-gps", "1h-1s-mixed", "24h-30s-mixed")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_stage(stage, obs_file):
+    """Runs one stage in the current (child) process"""
+    obs_file = Path(obs_file)
+    verified = None
+    start = time.perf_counter()
+
+    if stage == "metadata":
+        from rinex_reader import read_rinex_metadata
+        read_rinex_metadata(obs_file, cache=None)
+    elif stage == "metadata_gfzrnx":
+        from gfzrnx_executor import gfzrnx
+        gfzrnx.metadata(str(obs_file))
+    elif stage == "rename":
+        from rinex_filename_fixer import rinex_filename_fixer
+        verified = rinex_filename_fixer(str(obs_file), station_id="BNCH") is not None
+    elif stage in ("shift", "shift_gfzrnx"):
+        from rinex_fixer import RinexFixer
+        backend = "native" if stage == "shift" else "gfzrnx"
+        verified = RinexFixer(backend).process_rinex_file(obs_file)
+    elif stage == "redate":
+        from change_rinex_obs_date import modify_rinex_observation_date
+        modify_rinex_observation_date(obs_file, f"{obs_file}.redate", "2019-04-07")
+    elif stage == "zip":
+        from rinex_compress import compress_rinex_family
+        verified = compress_rinex_family(obs_file) is not None
+    elif stage == "pipeline":
+        from rinex_pipeline import fix_and_archive
+        verified = bool(fix_and_archive(obs_file, "BNCH")["epochs"])
+    elif stage == "split":
+        from rinex_split import split_rinex_obs_file
+        verified = bool(split_rinex_obs_file(obs_file, "BNCH")["files"])
+    elif stage == "validate":
+        from rinex_validate import ROLLED_BACK, validate_rinex_obs_file
+        # The synthetic family is still rolled back
+        verified = ROLLED_BACK in validate_rinex_obs_file(obs_file)["issues"]
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    seconds = time.perf_counter() - start
+
+    if stage in ("shift", "shift_gfzrnx") and verified:
+        # The synthetic content must now match the date in its name
+        from rinex_reader import read_rinex_metadata
+        data = read_rinex_metadata(obs_file, cache=None)["file"]
+        verified = data["epo_first"] == data["epo_first_name"]
+
+    return {"seconds": seconds, "peak_rss_mb": _peak_rss_mb(), "verified": verified}
+
+
+def _family_files(obs_file):
+    return sorted(obs_file.parent.glob(f"{obs_file.stem}.*"))
+
+
+def measure(profile, stage, source_obs, repeat=1):
+    """
+    Runs `stage` `repeat` times on fresh copies of the family of
+    `source_obs` and keeps the fastest run.
+    """
+    env = dict(os.environ, GFZRNX_PATH=str(GFZRNX_STUB))
+    best = None
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="rinex-bench-") as scratch:
+            for file in _family_files(source_obs):
+                shutil.copy2(file, scratch)
+            obs_file = Path(scratch) / source_obs.name
+
+            completed = subprocess.run(
+                [sys.executable, __file__, "--child", stage, str(obs_file)],
+                capture_output=True, text=True, env=env, cwd=scratch)
+            if completed.returncode != 0:
+                raise RuntimeError(f"{profile}/{stage} failed:\n{completed.stderr}")
+            run = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        if best is None or run["seconds"] < best["seconds"]:
+            best = run
+
+    duration, interval, _ = PROFILES[profile]
+    size = source_obs.stat().st_size
+    if stage in ("zip", "pipeline"):
+        size = sum(f.stat().st_size for f in _family_files(source_obs))
+    epochs = duration // interval
+
+    return {
+        "profile": profile,
+        "stage": stage,
+        "seconds": round(best["seconds"], 4),
+        "bytes": size,
+        "mb_per_s": round(size / best["seconds"] / 1e6, 1),
+        "epochs": epochs,
+        "epochs_per_s": round(epochs / best["seconds"]),
+        "peak_rss_mb": best["peak_rss_mb"],
+        "verified": best["verified"],
+    }
+
+
+def _commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def _print_table(results, baseline=None):
+    reference = {}
+    if baseline:
+        reference = {(r["profile"], r["stage"]): r for r in baseline["results"]}
+
+    header = f"{'profile':<15}{'stage':<17}{'s':>9}{'MB/s':>9}{'epochs/s':>11}{'RSS MB':>9}"
+    if reference:
+        header += f"{'vs base':>9}"
+    print(header)
+    for r in results:
+        line = (f"{r['profile']:<15}{r['stage']:<17}{r['seconds']:>9.3f}"
+                f"{r['mb_per_s']:>9.1f}{r['epochs_per_s']:>11}"
+                f"{r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '-':>9}")
+        base = reference.get((r["profile"], r["stage"]))
+        if base:
+            line += f"{base['seconds'] / r['seconds']:>8.2f}x"
+        if r["verified"] is False:
+            line += "  NOT VERIFIED"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RINEX tool benchmarks")
+    parser.add_argument("-p", "--profile", action="append", choices=sorted(PROFILES),
+                        help="profile to run (repeatable; default: %s)"
+                             % ", ".join(DEFAULT_PROFILES))
+    parser.add_argument("--all", action="store_true", help="run every profile")
+    parser.add_argument("-s", "--stage", action="append", choices=STAGES,
+                        help="stage to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per stage, the fastest is kept")
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--child", nargs=2, metavar=("STAGE", "FILE"),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_run_stage(*args.child)))
+        return 0
+
+    profiles = sorted(PROFILES) if args.all else (args.profile or DEFAULT_PROFILES)
+    stages = args.stage or STAGES
+
+    results = []
+    for profile in profiles:
+        source_dir = DATA_DIR / profile
+        source_obs = next(source_dir.glob("*.[0-9][0-9]O"), None) \
+            if source_dir.exists() else None
+        if source_obs is None:
+            print(f"Generating {profile}...", file=sys.stderr)
+            source_obs = generate_family(source_dir, profile)
+
+        for stage in stages:
+            print(f"Running {profile}/{stage}...", file=sys.stderr)
+            results.append(measure(profile, stage, source_obs, args.repeat))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_table(results, baseline)
+
+    if not args.no_save:
+        commit = _commit()
+        RESULTS_DIR.mkdir(exist_ok=True)
+        results_file = RESULTS_DIR / f"{commit}.json"
+        with open(results_file, "w") as f:
+            json.dump({
+                "commit": commit,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "results": results,
+            }, f, indent=2)
+        print(f"Results saved to {results_file}", file=sys.stderr)
+
+    return 0 if all(r["verified"] is not False for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
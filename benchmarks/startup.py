@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Startup budget of the headless entry points: every module is imported in
+a fresh interpreter and its import time is checked against a budget, as
+well as the absence of GUI/heavy modules (tkinter, termcolor, asyncio,
+NumPy) that must only load on demand.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 20 --scale 2   # slow machine
+
+The exit code is non-zero if a budget is exceeded.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# module: import budget in milliseconds, on top of the bare interpreter
+BUDGETS_MS = {
+    "rinex_gpsweek": 30,
+    "rinex_filename_fixer": 35,
+    "rinex_fixer": 35,
+    "rinex_cli": 40,
+}
+FORBIDDEN = ("tkinter", "_tkinter", "termcolor", "asyncio", "numpy")
+
+_CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({"ms": seconds * 1000,
+                  "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def measure_import(module, repeat):
+    """Fastest import time of `module` in `repeat` fresh interpreters"""
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _CHILD, module, *FORBIDDEN],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+        run = json.loads(completed.stdout)
+        if best is None or run["ms"] < best["ms"]:
+            best = run
+    return best
+
+
+def measure_process(args, repeat):
+    """Fastest wall time (ms) of running `python *args`"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=REPO_DIR,
+                       capture_output=True, check=True)
+        ms = (time.perf_counter() - start) * 1000
+        best = ms if best is None else min(best, ms)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup time budget")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="runs per measurement, the fastest is kept")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplies every budget (slow machines)")
+    args = parser.parse_args(argv)
+
+    # Warm the bytecode caches first
+    measure_process(["-c", "import " + ", ".join(BUDGETS_MS)], 1)
+
+    ok = True
+    print(f"{'module':<24}{'import ms':>10}{'budget':>8}  status")
+    for module, budget in BUDGETS_MS.items():
+        run = measure_import(module, args.repeat)
+        budget *= args.scale
+        status = "ok"
+        if run["ms"] > budget:
+            status = "OVER BUDGET"
+        if run["loaded"]:
+            status = "loads " + ", ".join(run["loaded"])
+        ok &= status == "ok"
+        print(f"{module:<24}{run['ms']:>10.1f}{budget:>8.0f}  {status}")
+
+    interpreter = measure_process(["-c", "pass"], args.repeat)
+    cli = measure_process(["rinex_cli.py", "--help"], args.repeat)
+    print(f"\nbare interpreter {interpreter:.1f} ms, "
+          f"rinex_cli.py --help {cli:.1f} ms")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
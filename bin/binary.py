@@ -8,10 +8,18 @@ def get_gfzrnx_path():
     """
     Returns the full path to the system-specific gfzrnx binary,
     compatible with both development and PyInstaller environments.
+    The GFZRNX_PATH environment variable overrides the bundled binary
+    (e.g. benchmarks/gfzrnx_stub.py to run offline).
 
     Returns:
         str: Full path to the gfzrnx binary
     """
+    override = os.environ.get("GFZRNX_PATH")
+    if override:
+        if not os.path.exists(override):
+            raise FileNotFoundError(f"Binary not found: {override}")
+        return override
+
     system = platform.system().lower()
 
     # Detecta se está rodando via PyInstaller
@@ -1,70 +1,99 @@
 #!/usr/bin/env python3
 
-import re
 import os
 import sys
 import glob
-import zipfile
 from datetime import datetime
+from itertools import islice
 
+from gps_time import GPSTime
+from rinex_compress import compress_rinex_family
+from rinex_io import buffer_size, open_rinex_text, rinex_size
+from rinex_reader import (END_OF_HEADER, epoch_record_length,
+                          obs_lines_per_satellite)
 
-def modify_rinex_observation_date(input_file, output_file, new_date_str):
-    with open(input_file, 'r') as f:
-        lines = f.readlines()
 
-    new_date = datetime.strptime(new_date_str, "%Y-%m-%d").date()
+OBS_TIME_LABELS = ("TIME OF FIRST OBS", "TIME OF LAST OBS")
+
+# Lines written between progress reports / cancellation checks
+PROGRESS_LINES = 50000
+
+
+def _redate_obs_time_line(line, new_date):
+    label = "TIME OF FIRST OBS" if "TIME OF FIRST OBS" in line else "TIME OF LAST OBS"
+    original = GPSTime.from_header_line(line).calendar()
+    updated = GPSTime.from_calendar(new_date.year, new_date.month, new_date.day,
+                                    *original[3:])
+    new_line = f"{updated.format_header()}     GPS         {label}\n"
+    return label, new_line
+
+
+def _epoch_date_columns(new_date):
+    """Date columns (" yy mm dd") of the epoch lines re-dated to `new_date`"""
+    return f"{new_date.strftime('%y'):>3}{new_date.strftime('%m'):>3}" \
+           f"{new_date.strftime('%d'):>3}"
 
-    # Flags to track if first and last obs times were modified
-    first_obs_modified = False
-    last_obs_modified = False
-
-    for i, line in enumerate(lines):
-        if "TIME OF FIRST OBS" in line or "TIME OF LAST OBS" in line:
-            label = "TIME OF FIRST OBS" if "TIME OF FIRST OBS" in line else "TIME OF LAST OBS"
-            original_fields = line[:43].strip()
-            parts = list(map(float, original_fields.split()))
-            original_datetime = datetime(int(parts[0]), int(parts[1]), int(parts[2]),
-                                         int(parts[3]), int(parts[4]), int(parts[5]))
-            updated_datetime = datetime.combine(
-                new_date, original_datetime.time())
-
-            new_line = f"{updated_datetime.year:>6}{updated_datetime.month:>6}{updated_datetime.day:>6}" \
-                       f"{updated_datetime.hour:>6}{updated_datetime.minute:>6}{updated_datetime.second:13.7f}     GPS         {label}\n"
-            lines[i] = new_line
-
-            if label == "TIME OF FIRST OBS":
-                first_obs_modified = True
-            else:
-                last_obs_modified = True
-
-        if first_obs_modified and last_obs_modified:
+
+def iter_redated_lines(lines, new_date):
+    """
+    Generator that re-dates a RINEX 2 observation file in a single pass.
+
+    Only lines that can be epoch headers are tested: the satellite count
+    of each epoch line tells how many continuation and observation lines
+    follow, and those are yielded untouched without any parsing.
+    """
+    lines = iter(lines)
+    obs_types = 0
+
+    for line in lines:
+        label = line[60:].strip()
+        if label in OBS_TIME_LABELS:
+            line = _redate_obs_time_line(line, new_date)[1]
+        elif label == "# / TYPES OF OBSERV" and line[:6].strip():
+            obs_types = int(line[:6])
+        yield line
+        if label == END_OF_HEADER:
             break
 
-    # Modify epochs in observation section
-    in_body = False
-    for i, line in enumerate(lines):
-        if "END OF HEADER" in line:
-            in_body = True
+    lines_per_sat = obs_lines_per_satellite({"obs_types": obs_types})
+    epoch_date = _epoch_date_columns(new_date)
+
+    for line in lines:
+        # Same layout test as rinex_reader.is_epoch_line()
+        if (len(line) < 32 or not line[28:29].isdigit()
+                or not line[29:32].strip().isdigit()):
+            yield line
             continue
 
-        if in_body and line.startswith(' '):
-            # match = re.match(r"\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+([\d\.]+)", line)
+        follow = epoch_record_length(line, lines_per_sat)
+        # Event records (flags 2-5) may leave the date blank
+        yield epoch_date + line[9:] if line[1:9].strip() else line
+        yield from islice(lines, follow)
+
 
-            match = re.match(
-                r"\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+([\d\.]+)\s+(.+)", line)
-            if match:
-                y, mo, d, h, mi, s, sats = match.groups()
-                original_time = datetime(int(y), int(mo), int(
-                    d), int(h), int(mi), int(float(s)))
-                updated_time = datetime.combine(new_date, original_time.time())
+def modify_rinex_observation_date(input_file, output_file, new_date_str,
+                                  progress=None):
+    """
+    Replaces the date of every epoch of a RINEX observation file.
 
-                updated_line = f"{updated_time.strftime('%y'):>3}{updated_time.strftime('%m'):>3}{updated_time.strftime('%d'):>3}" \
-                    f"{h:>3}{mi:>3} {s:>10}  {sats}\n"
-                # f"{updated_time.hour:>4}{updated_time.minute:>6}{updated_time.second + updated_time.microsecond / 1e6:13.7f}" + line[43:]
-                lines[i] = updated_line
+    The file is processed line by line through buffer_size() buffers,
+    so memory use does not depend on its size. A compressed or Compact
+    RINEX input is decoded on the fly (rinex_io). `progress`
+    (progress.Progress) receives the bytes read and may cancel it.
+    """
+    new_date = datetime.strptime(new_date_str, "%Y-%m-%d").date()
 
-    with open(output_file, 'w') as f:
-        f.writelines(lines)
+    with open_rinex_text(input_file) as src, \
+            open(output_file, 'w', buffering=buffer_size()) as dst:
+        lines = iter_redated_lines(src, new_date)
+        if progress is None:
+            dst.writelines(lines)
+        else:
+            progress.start("Alterando data", rinex_size(input_file) or 0)
+            for chunk in iter(lambda: list(islice(lines, PROGRESS_LINES)), []):
+                dst.writelines(chunk)
+                progress.check_cancelled()
+                progress.update(src.buffer.tell())
 
     print(f"Modified file saved as: {output_file}")
 
@@ -87,11 +116,11 @@ def zip_rinex_family_files(input_file):
         os.remove(zip_name)
         print(f"Removed existing zip archive: {zip_name}")
 
-    # Create zip file
-    with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file in matching_files:
-            zipf.write(file, arcname=os.path.basename(file))
-            print(f"Added to zip: {file}")
+    # Create zip file, compressing the members in parallel
+    result = compress_rinex_family(input_file, zip_filename=zip_name)
+    for member in result["members"]:
+        print(f"Added to zip: {member['name']} "
+              f"({100 * member['ratio']:.1f}%, {member['mb_per_s']} MB/s)")
 
     print(f"\nCreated new zip archive: {zip_name}")
 
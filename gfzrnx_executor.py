@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+from collections import deque
+
+from bin.binary import get_gfzrnx_path
+from logger import logger
+from progress import OperationCancelled
+
+# Per-call timeouts (seconds)
+METADATA_TIMEOUT = 120
+SHIFT_TIMEOUT = 3600
+
+# Seconds between cancellation/poll checks while a job runs
+POLL_SECONDS = 0.2
+
+# Lines of stdout/stderr kept for error reports; the rest is streamed
+TAIL_LINES = 1000
+# Bytes read from stdout/stderr at a time
+READ_CHUNK = 1 << 16
+
+
+class GfzrnxResult:
+    __slots__ = ("args", "returncode", "stdout", "stderr")
+
+    def __init__(self, args, returncode, stdout, stderr):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class GfzrnxExecutor:
+    """
+    Runs gfzrnx jobs on asyncio subprocesses. The binary is resolved and
+    validated once; at most `max_jobs` (default: CPU count) run_sync()
+    calls, from any thread, run at the same time, each with its own
+    timeout, and a job is killed when
+    it times out, is cancelled or its `cancelled()` check returns True.
+    stdout/stderr are read line by line: every line goes to the
+    `on_stdout`/`on_stderr` callbacks and only the last TAIL_LINES are
+    kept for the result (except with `capture=True`, for -meta JSON).
+    """
+
+    def __init__(self, max_jobs=None):
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self._binary = None
+        self._binary_override = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+
+    @property
+    def binary(self):
+        """Path of the gfzrnx binary, resolved on first use"""
+        override = os.environ.get("GFZRNX_PATH")
+        with self._lock:
+            if self._binary is None or override != self._binary_override:
+                binary = get_gfzrnx_path()
+                if not os.access(binary, os.X_OK):
+                    raise PermissionError(f"Binary is not executable: {binary}")
+                self._binary = binary
+                self._binary_override = override
+                logger.debug("Resolved gfzrnx binary: %s", binary)
+            return self._binary
+
+    async def run(self, args, timeout=None, check=True, capture=False,
+                  on_stdout=None, on_stderr=None, cancelled=None, on_poll=None):
+        """
+        Runs `gfzrnx *args`.
+
+        Raises:
+            subprocess.TimeoutExpired: the job took longer than `timeout`
+            subprocess.CalledProcessError: non-zero exit with `check`
+            OperationCancelled: `cancelled()` returned True
+
+        Returns:
+            GfzrnxResult
+        """
+        command = [self.binary, *map(str, args)]
+
+        with logger.span("gfzrnx", command=" ".join(command[1:3])):
+            logger.debug("Running %s", command)
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                start_new_session=sys.platform != "win32")
+            try:
+                stdout, stderr = await self._wait(
+                    process, timeout, capture, on_stdout, on_stderr,
+                    cancelled, on_poll)
+            except BaseException as e:
+                if process.returncode is None:
+                    _kill(process)
+                    await process.wait()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise subprocess.TimeoutExpired(command, timeout) from None
+                raise
+
+        result = GfzrnxResult(command, process.returncode,
+                              "".join(stdout), "".join(stderr))
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(
+                result.returncode, command, result.stdout, result.stderr)
+        return result
+
+    async def _wait(self, process, timeout, capture, on_stdout, on_stderr,
+                    cancelled, on_poll):
+        stdout = [] if capture else deque(maxlen=TAIL_LINES)
+        stderr = deque(maxlen=TAIL_LINES)
+        readers = asyncio.gather(
+            _pump(process.stdout, stdout, on_stdout),
+            _pump(process.stderr, stderr, on_stderr),
+            process.wait())
+
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            wait = POLL_SECONDS
+            if deadline is not None:
+                wait = min(wait, deadline - loop.time())
+                if wait <= 0:
+                    _discard(readers)
+                    raise asyncio.TimeoutError()
+            try:
+                done, _ = await asyncio.wait({readers}, timeout=wait)
+            except asyncio.CancelledError:
+                _discard(readers)
+                raise
+            if done:
+                readers.result()
+                return stdout, stderr
+            if cancelled is not None and cancelled():
+                _discard(readers)
+                raise OperationCancelled("gfzrnx job cancelled")
+            if on_poll is not None:
+                on_poll()
+
+    def run_sync(self, args, **kwargs):
+        """Blocking run() for threads without an event loop"""
+        with self._slots:
+            return _run_coroutine(self.run(args, **kwargs))
+
+    def metadata(self, rinex_file, timeout=METADATA_TIMEOUT):
+        """`gfzrnx -meta basic:json` of a RINEX file, parsed"""
+        result = self.run_sync(["-finp", rinex_file, "-meta", "basic:json"],
+                               timeout=timeout, capture=True)
+        return json.loads(result.stdout)
+
+    def shift_gpsw(self, input_file, output_file, shift_weeks,
+                   timeout=SHIFT_TIMEOUT, **kwargs):
+        return self.run_sync(
+            ["-shift_gpsw", shift_weeks, "-finp", input_file,
+             "-fout", output_file, "-vo", "2"],
+            timeout=timeout, check=False, **kwargs)
+
+
+async def _pump(stream, lines, callback):
+    # Split here rather than with readline(), which raises on lines longer
+    # than the StreamReader limit (64 KiB)
+    def emit(line):
+        line = line.decode("utf-8", "replace")
+        lines.append(line)
+        if callback is not None:
+            callback(line)
+
+    partial = []
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        parts = chunk.split(b"\n")
+        if len(parts) == 1:
+            partial.append(chunk)
+            continue
+        partial.append(parts[0])
+        emit(b"".join(partial) + b"\n")
+        for line in parts[1:-1]:
+            emit(line + b"\n")
+        partial = [parts[-1]] if parts[-1] else []
+    if partial:
+        emit(b"".join(partial))
+
+
+def _kill(process):
+    if sys.platform == "win32":
+        process.kill()
+        return
+    # The whole session, so no child is left holding the pipes open
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _discard(future):
+    future.cancel()
+    # Retrieve the result so asyncio does not warn about it
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+def _run_coroutine(coroutine):
+    if sys.platform == "win32" and sys.version_info < (3, 8):
+        # Subprocesses need the proactor loop, the default only from 3.8
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    return asyncio.run(coroutine)
+
+
+gfzrnx = GfzrnxExecutor()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timedelta
+
+WEEK_ROLLOVER = 1024
+NS_PER_SECOND = 1000000000
+NS_PER_DAY = 86400 * NS_PER_SECOND
+NS_PER_WEEK = 7 * NS_PER_DAY
+
+# Days from 1970-01-01 to the GPS epoch (1980-01-06)
+GPS_EPOCH_DAYS = 3657
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 of a proleptic Gregorian date (integer only)"""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month - 3 if month > 2 else month + 9) + 2) // 5 + day - 1
+    day_of_era = (year_of_era * 365 + year_of_era // 4 - year_of_era // 100
+                  + day_of_year)
+    return era * 146097 + day_of_era - 719468
+
+
+def _civil_from_days(days):
+    """Inverse of _days_from_civil: (year, month, day)"""
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524
+                   - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4
+                                - year_of_era // 100)
+    mp = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    return year_of_era + era * 400 + (month <= 2), month, day
+
+
+def full_year(year):
+    """Four-digit year of a RINEX 2 year (int, str or bytes columns)"""
+    year = int(year)
+    if year >= 100:
+        return year
+    # RINEX 2: 80-99 -> 1980-1999, 00-79 -> 2000-2079
+    return year + 1900 if year >= 80 else year + 2000
+
+
+def _seconds_to_ns(text):
+    """'ss.sssssss' -> integer ns, without going through float"""
+    whole, _, frac = text.strip().partition(".")
+    return int(whole or 0) * NS_PER_SECOND + int((frac + "000000000")[:9])
+
+
+class GPSTime:
+    """
+    GPS time as integer week + integer nanoseconds of week. Parsing and
+    formatting use fixed RINEX columns and integer arithmetic only, so
+    no datetime is created and fractional seconds keep all 7 RINEX
+    decimals.
+    """
+
+    __slots__ = ("week", "ns")
+
+    def __init__(self, week, ns=0):
+        week_carry, self.ns = divmod(ns, NS_PER_WEEK)
+        self.week = week + week_carry
+
+    @classmethod
+    def from_ns(cls, gps_ns):
+        """From ns since the GPS epoch (total_ns)"""
+        return cls(0, gps_ns)
+
+    @classmethod
+    def from_calendar(cls, year, month, day, hour=0, minute=0, second_ns=0):
+        days = _days_from_civil(year, month, day) - GPS_EPOCH_DAYS
+        return cls(0, days * NS_PER_DAY
+                   + (hour * 3600 + minute * 60) * NS_PER_SECOND + second_ns)
+
+    @classmethod
+    def from_datetime(cls, value):
+        return cls.from_calendar(value.year, value.month, value.day,
+                                 value.hour, value.minute,
+                                 value.second * NS_PER_SECOND
+                                 + value.microsecond * 1000)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        "YYYY MM DD HH MM SS.sssssss" (rinex_reader.format_epoch and the
+        gfzrnx metadata); other spacings fall back to splitting.
+        """
+        if len(text) >= 19 and text[4] == text[7] == text[10] == text[13] == " ":
+            return cls.from_calendar(int(text[0:4]), int(text[5:7]),
+                                     int(text[8:10]), int(text[11:13]),
+                                     int(text[14:16]), _seconds_to_ns(text[16:]))
+        year, month, day, hour, minute, seconds = text.split()
+        return cls.from_calendar(int(year), int(month), int(day), int(hour),
+                                 int(minute), _seconds_to_ns(seconds))
+
+    @classmethod
+    def from_epoch_line(cls, line):
+        """RINEX 2 epoch line, columns 1-26: " yy mm dd hh mm ss.sssssss" """
+        if isinstance(line, bytes):
+            line = line[:26].decode("ascii")
+        return cls.from_calendar(full_year(line[1:3]), int(line[4:6]),
+                                 int(line[7:9]), int(line[10:12]),
+                                 int(line[13:15]), _seconds_to_ns(line[15:26]))
+
+    @classmethod
+    def from_header_line(cls, line):
+        """TIME OF FIRST/LAST OBS record, 5I6,F13.7"""
+        if isinstance(line, bytes):
+            line = line[:43].decode("ascii")
+        return cls.from_calendar(int(line[0:6]), int(line[6:12]),
+                                 int(line[12:18]), int(line[18:24]),
+                                 int(line[24:30]), _seconds_to_ns(line[30:43]))
+
+    @property
+    def total_ns(self):
+        """ns since the GPS epoch"""
+        return self.week * NS_PER_WEEK + self.ns
+
+    @property
+    def rollovers(self):
+        return self.week // WEEK_ROLLOVER
+
+    def shift_weeks(self, weeks):
+        return GPSTime(self.week + weeks, self.ns)
+
+    def calendar(self):
+        """
+        Returns:
+            tuple: (year, month, day, hour, minute, second_ns)
+        """
+        days, ns_of_day = divmod(self.total_ns, NS_PER_DAY)
+        year, month, day = _civil_from_days(days + GPS_EPOCH_DAYS)
+        seconds, second_ns = divmod(ns_of_day, 60 * NS_PER_SECOND)
+        hour, minute = divmod(seconds, 60)
+        return year, month, day, hour, minute, second_ns
+
+    def day_of_year(self):
+        days = self.total_ns // NS_PER_DAY + GPS_EPOCH_DAYS
+        year = _civil_from_days(days)[0]
+        return days - _days_from_civil(year, 1, 1) + 1
+
+    def to_datetime(self):
+        """Calendar datetime (truncated to microseconds)"""
+        return datetime(1980, 1, 6) + timedelta(
+            weeks=self.week, microseconds=self.ns // 1000)
+
+    @staticmethod
+    def _format_seconds(second_ns, width):
+        whole, frac = divmod(second_ns, NS_PER_SECOND)
+        return f"{whole}.{frac // 100:07d}".rjust(width)
+
+    def format_epoch(self):
+        """Same layout as rinex_reader.format_epoch ("YYYY MM DD HH MM SS.sssssss")"""
+        year, month, day, hour, minute, second_ns = self.calendar()
+        return (f"{year:04d} {month:02d} {day:02d} {hour:02d} {minute:02d} "
+                + self._format_seconds(second_ns, 10).replace(" ", "0"))
+
+    def format_epoch_line(self):
+        """Columns 1-26 of a RINEX 2 epoch line (" yy mm dd hh mm ss.sssssss")"""
+        year, month, day, hour, minute, second_ns = self.calendar()
+        return (f" {year % 100:02d}{month:3d}{day:3d}{hour:3d}{minute:3d}"
+                + self._format_seconds(second_ns, 11))
+
+    def format_header(self):
+        """Columns 1-43 of a TIME OF FIRST/LAST OBS record (5I6,F13.7)"""
+        year, month, day, hour, minute, second_ns = self.calendar()
+        return (f"{year:6d}{month:6d}{day:6d}{hour:6d}{minute:6d}"
+                + self._format_seconds(second_ns, 13))
+
+    def _key(self):
+        return (self.week, self.ns)
+
+    def __eq__(self, other):
+        return isinstance(other, GPSTime) and self._key() == other._key()
+
+    def __lt__(self, other):
+        return self._key() < other._key()
+
+    def __le__(self, other):
+        return self._key() <= other._key()
+
+    def __gt__(self, other):
+        return self._key() > other._key()
+
+    def __ge__(self, other):
+        return self._key() >= other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"GPSTime(week={self.week}, ns={self.ns})"
+
+    def __str__(self):
+        return self.format_epoch()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized GPS time conversions over NumPy arrays of epochs.
+
+Times are int64 nanoseconds since the GPS epoch (1980-01-06), the
+same representation used by the epoch index (rinex_index), so whole
+files are converted, shifted or checked in a few array operations.
+
+NumPy is an optional dependency (pip install .[numpy]); it is only
+imported when one of these functions is first called.
+"""
+
+# GPS_EPOCH_DAYS also counts from the NumPy datetime64 epoch (1970-01-01)
+from gps_time import (GPS_EPOCH_DAYS, NS_PER_DAY, NS_PER_SECOND, NS_PER_WEEK,
+                      WEEK_ROLLOVER)
+
+# RINEX 2 epoch line columns: " yy mm dd hh mm ss.sssssss"
+EPOCH_LINE_WIDTH = 26
+
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "NumPy is required for the vectorized GPS time functions "
+                "(pip install numpy)") from None
+        _np = numpy
+    return _np
+
+
+def _full_years(years):
+    # RINEX 2: 80-99 -> 1980-1999, 00-79 -> 2000-2079
+    np = _numpy()
+    years = np.asarray(years, dtype=np.int64)
+    return np.where(years >= 100, years,
+                    np.where(years >= 80, years + 1900, years + 2000))
+
+
+def from_fields(year, month, day, hour=0, minute=0, second=0):
+    """
+    Epoch fields (scalars or arrays; two-digit years are accepted) to
+    int64 ns since the GPS epoch
+    """
+    np = _numpy()
+    second_ns = np.rint(np.asarray(second, dtype=np.float64) * NS_PER_SECOND)
+    return from_fields_ns(year, month, day, hour, minute,
+                          second_ns.astype(np.int64))
+
+
+def from_fields_ns(year, month, day, hour, minute, second_ns):
+    """Like from_fields(), with the seconds already in integer ns"""
+    np = _numpy()
+    years = _full_years(year)
+    months = (years - 1970) * 12 + np.asarray(month, dtype=np.int64) - 1
+    days = (months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+            + np.asarray(day, dtype=np.int64) - 1 - GPS_EPOCH_DAYS)
+    seconds = (np.asarray(hour, dtype=np.int64) * 3600
+               + np.asarray(minute, dtype=np.int64) * 60)
+    return (days * NS_PER_DAY + seconds * NS_PER_SECOND
+            + np.asarray(second_ns, dtype=np.int64))
+
+
+def parse_epoch_lines(lines):
+    """
+    Parses RINEX 2 epoch lines (sequence of bytes or str, at least the
+    first 26 columns) in one pass over a fixed-width character matrix.
+
+    Returns:
+        numpy.ndarray: int64 ns since the GPS epoch
+    """
+    np = _numpy()
+    lines = [line.encode("latin-1") if isinstance(line, str) else line
+             for line in lines]
+    chars = np.array(lines, dtype=f"S{EPOCH_LINE_WIDTH}")
+    chars = chars.view(np.uint8).reshape(len(lines), EPOCH_LINE_WIDTH)
+    # Blanks (and the padding of short lines) count as zeros
+    digits = np.where(chars >= 48, chars.astype(np.int64) - 48, 0)
+
+    def number(start, end):
+        value = np.zeros(len(lines), dtype=np.int64)
+        for col in range(start, end):
+            value = value * 10 + digits[:, col]
+        return value
+
+    # F11.7 seconds (cols 16-26): whole seconds in 17-18, fraction in 20-26
+    second_ns = number(16, 18) * NS_PER_SECOND + number(19, 26) * 100
+    return from_fields_ns(number(1, 3), number(4, 6), number(7, 9),
+                          number(10, 12), number(13, 15), second_ns)
+
+
+def to_fields(gps_ns):
+    """
+    Returns:
+        tuple: (year, month, day, hour, minute, second) arrays, the
+        seconds as float64
+    """
+    np = _numpy()
+    gps_ns = np.asarray(gps_ns, dtype=np.int64)
+    days, ns_of_day = np.divmod(gps_ns, NS_PER_DAY)
+    dates = (days + GPS_EPOCH_DAYS).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    years = dates.astype("datetime64[Y]")
+
+    year = years.astype(np.int64) + 1970
+    month = (months - years.astype("datetime64[M]")).astype(np.int64) + 1
+    day = (dates - months.astype("datetime64[D]")).astype(np.int64) + 1
+    seconds_of_day, ns = np.divmod(ns_of_day, NS_PER_SECOND)
+    hour, rest = np.divmod(seconds_of_day, 3600)
+    minute, second = np.divmod(rest, 60)
+    return year, month, day, hour, minute, second + ns / NS_PER_SECOND
+
+
+def week_and_seconds(gps_ns):
+    """
+    Returns:
+        tuple: (GPS week, seconds of week as float64) arrays
+    """
+    np = _numpy()
+    week, ns_of_week = np.divmod(np.asarray(gps_ns, dtype=np.int64), NS_PER_WEEK)
+    return week, ns_of_week / NS_PER_SECOND
+
+
+def day_of_year(gps_ns):
+    np = _numpy()
+    dates = (np.asarray(gps_ns, dtype=np.int64) // NS_PER_DAY
+             + GPS_EPOCH_DAYS).astype("datetime64[D]")
+    return (dates - dates.astype("datetime64[Y]")).astype(np.int64) + 1
+
+
+def rollover_count(gps_ns):
+    """Number of 1024-week rollovers since the GPS epoch"""
+    np = _numpy()
+    return np.asarray(gps_ns, dtype=np.int64) // NS_PER_WEEK // WEEK_ROLLOVER
+
+
+def shift_weeks(gps_ns, weeks):
+    np = _numpy()
+    return np.asarray(gps_ns, dtype=np.int64) + np.asarray(weeks, dtype=np.int64) * NS_PER_WEEK
+
+
+def fix_rollover(gps_ns):
+    """
+    Array version of rinex_filename_fixer.fixed_first_epoch: every
+    epoch is moved forward by its number of rollovers times 1024 weeks.
+    """
+    return shift_weeks(gps_ns, rollover_count(gps_ns) * WEEK_ROLLOVER)
+
+
+def from_index(index):
+    """Zero-copy view of the epoch times of a rinex_index.EpochIndex"""
+    np = _numpy()
+    return np.frombuffer(index.times, dtype=np.int64)
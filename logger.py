@@ -1,7 +1,20 @@
-from typing import List
+import functools
+import os
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+ERROR = 40
 
 
 class Observer:
+    # Minimum level this observer wants to receive. Messages below the
+    # level of every observer are dropped before being formatted.
+    level = DEBUG
+    # Observers receiving timing spans; spans cost nothing while none does
+    traces = False
+
     def log(self, message):
         raise NotImplementedError(
             "The 'log' method must be implemented by the observer.")
@@ -12,30 +25,133 @@ class Observer:
     def error(self, message):
         pass
 
+    def span(self, record):
+        """
+        Receives a finished span: dict with name, start_ns and
+        duration_ns (time.perf_counter_ns), pid, tid and args
+        """
+        pass
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("logger", "name", "args", "start_ns")
+
+    def __init__(self, logger, name, args):
+        self.logger = logger
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.logger._dispatch_span({
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ns": duration_ns,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+        return False
+
 
 class Logger:
     def __init__(self):
-        self._observers: List[Observer] = []
+        self._observers = []
+        self._min_level = ERROR + 1
+        self._tracing = False
 
     def add_observer(self, observer):
         if observer not in self._observers:
             self._observers.append(observer)
+        self.refresh_levels()
 
     def remove_observer(self, observer):
         if observer in self._observers:
             self._observers.remove(observer)
+        self.refresh_levels()
+
+    def refresh_levels(self):
+        """Must be called if the level of a registered observer changes"""
+        self._min_level = min(
+            (observer.level for observer in self._observers), default=ERROR + 1)
+        self._tracing = any(observer.traces for observer in self._observers)
+
+    def is_enabled_for(self, level):
+        return level >= self._min_level
+
+    def span(self, name, **args):
+        """
+        Times a block: `with logger.span("shift", file=name): ...`.
+        Without tracing observers a shared no-op context is returned.
+        """
+        if not self._tracing:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def timed(self, name):
+        """Decorator wrapping every call of a function in a span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self._tracing:
+                    return func(*args, **kwargs)
+                with _Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _dispatch_span(self, record):
+        for observer in self._observers:
+            if observer.traces:
+                observer.span(record)
+
+    @staticmethod
+    def _format(message, args):
+        # Lazy %-style formatting: logger.debug("Shift: %s", shift)
+        if args:
+            return str(message) % args
+        return message
 
     def notify(self, message, *args, **kwargs):
+        if INFO < self._min_level:
+            return
+        message = self._format(message, args)
         for observer in self._observers:
-            observer.log(message)
+            if observer.level <= INFO:
+                observer.log(message)
 
     def debug(self, message, *args, **kwargs):
+        if DEBUG < self._min_level:
+            return
+        message = self._format(message, args)
         for observer in self._observers:
-            observer.debug(message)
+            if observer.level <= DEBUG:
+                observer.debug(message)
 
     def error(self, message, *args, **kwargs):
+        if ERROR < self._min_level:
+            return
+        message = self._format(message, args)
         for observer in self._observers:
-            observer.error(message)
+            if observer.level <= ERROR:
+                observer.error(message)
 
 
 logger = Logger()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from logger import logger
+
+CACHE_VERSION = 1
+
+
+class MetadataCache:
+    """
+    Bounded LRU cache of RINEX metadata keyed on file identity
+    (device, inode, size and mtime), so renaming a file keeps its entry
+    while any change to its content invalidates it.
+
+    An optional persistent `store` (e.g. rinex_catalog.RinexCatalog),
+    with get(path) and put(path, value), is consulted on misses before
+    the file is scanned, and receives what was scanned.
+    """
+
+    def __init__(self, max_entries=1024, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        key = self.file_key(path)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, path, value):
+        key = self.file_key(path)
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_load(self, path, loader):
+        """
+        Returns the cached metadata for `path`, calling `loader(path)`
+        only when the file is new or has changed.
+        """
+        key = self.file_key(path)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = self.store.get(path) if self.store is not None else None
+        if value is None:
+            value = loader(path)
+            if self.store is not None:
+                self.store.put(path, value)
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, cache_file):
+        """Loads entries saved by `save()`; a missing or invalid file is ignored"""
+        try:
+            with open(cache_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") != CACHE_VERSION:
+            return
+
+        with self._lock:
+            for key, value in data.get("entries", []):
+                self._store(key, value)
+        logger.debug("Loaded %d metadata cache entries from %s",
+                     len(data.get("entries", [])), cache_file)
+
+    def save(self, cache_file):
+        with self._lock:
+            entries = list(self._entries.items())
+
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": entries}, f)
+        os.replace(tmp_file, cache_file)
+        logger.debug(
+            "Saved %d metadata cache entries to %s", len(entries), cache_file)
+
+
+metadata_cache = MetadataCache()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import time
+
+from logger import logger
+
+# Seconds between throughput reports in the log, when enabled
+REPORT_SECONDS = 5.0
+
+
+class OperationCancelled(Exception):
+    """Raised inside a long operation when its cancel event is set"""
+
+
+def format_duration(seconds):
+    """125 -> "2:05", 3725 -> "1:02:05" """
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_throughput(data):
+    """Throughput and ETA of a progress update ("12.3 MB/s, faltam 0:42")"""
+    parts = [f"{data['bytes_per_s'] / 1e6:.1f} MB/s"]
+    if data["epochs_per_s"]:
+        parts.append(f"{data['epochs_per_s']:.0f} épocas/s")
+    if data["eta"] is not None:
+        parts.append(f"faltam {format_duration(data['eta'])}")
+    return ", ".join(parts)
+
+
+class Progress:
+    """
+    Carries the progress callback and the cancel event of a long
+    operation (fix, compression) down to the loops doing the work.
+
+    The callback receives a dict with the current `stage`, the `bytes`
+    processed out of `total` and, when known, the number of `epochs`,
+    along with the throughput of the stage so far (`bytes_per_s`,
+    `epochs_per_s`) and its `eta` in seconds (None when unknown). With
+    `report_seconds`, the throughput is also logged at that interval.
+    """
+
+    def __init__(self, callback=None, cancel_event=None, report_seconds=None):
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.report_seconds = report_seconds
+        self.stage = None
+        self.total = 0
+        self._started = None
+        self._reported = None
+
+    def start(self, stage, total=0):
+        self.check_cancelled()
+        self.stage = stage
+        self.total = total
+        self._started = self._reported = time.perf_counter()
+        self.update(0)
+
+    def update(self, processed, epochs=None):
+        if not self.callback and self.report_seconds is None:
+            return
+
+        now = time.perf_counter()
+        elapsed = now - self._started if self._started else 0.0
+        bytes_per_s = processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and bytes_per_s:
+            eta = max(0.0, (self.total - processed) / bytes_per_s)
+        data = {
+            "stage": self.stage,
+            "bytes": processed,
+            "total": self.total,
+            "epochs": epochs,
+            "bytes_per_s": bytes_per_s,
+            "epochs_per_s": epochs / elapsed if epochs and elapsed > 0 else None,
+            "eta": eta,
+        }
+        if self.callback:
+            self.callback(data)
+
+        if (self.report_seconds is not None and processed
+                and now - self._reported >= self.report_seconds):
+            self._reported = now
+            done = (f"{100 * processed / self.total:.0f}%" if self.total
+                    else f"{processed / 1e6:.1f} MB")
+            logger.notify(f"{self.stage}: {done} ({format_throughput(data)})")
+
+    @property
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(f"Cancelled during: {self.stage}")
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from logger import DEBUG, INFO, Observer, logger
+from rinex_compress import CODECS, check_level, compress_rinex_family
+from rinex_filename_fixer import rinex_filename_fixer
+from rinex_fixer import RinexFixer
+from rinex_hatanaka import compress_obs_file, decompress_crx_file, rinex_filename
+from rinex_io import set_buffer_size
+from rinex_manifest import (FIXED, MISMATCH, NEW, Manifest, file_record,
+                            new_entry)
+from rinex_pipeline import fix_and_archive
+from rinex_trace import TraceObserver, format_summary, merge_traces
+from rinex_validate import validate_rinex_obs_file
+
+OBS_FILE_PATTERN = "*.[0-9][0-9][oOdD]"
+ORIGINAL_SUFFIX = ".ORIGINAL"
+
+
+class BatchLogObserver(Observer):
+    """Writes log messages to stderr, prefixed with the worker process id"""
+
+    def __init__(self, debug_mode=False):
+        self.debug_mode = debug_mode
+
+    @property
+    def level(self):
+        return DEBUG if self.debug_mode else INFO
+
+    def log(self, message):
+        message = str(message).strip()
+        if message:
+            print(f"[{os.getpid()}] {message}", file=sys.stderr)
+
+    def debug(self, message):
+        if self.debug_mode:
+            print(f"[{os.getpid()}] [DEBUG] {message}", file=sys.stderr)
+
+    def error(self, message):
+        print(f"[{os.getpid()}] [ERRO] {message}", file=sys.stderr)
+
+
+batch_observer = BatchLogObserver()
+
+
+def init_worker(debug_mode, trace_file=None, catalog=None):
+    """
+    Process pool initializer: logs to stderr through batch_observer,
+    and optionally to a per-worker trace and through a catalog
+    """
+    batch_observer.debug_mode = debug_mode
+    logger.add_observer(batch_observer)
+    if trace_file:
+        # One trace per worker, merged by the parent at the end
+        logger.add_observer(TraceObserver(f"{trace_file}.{os.getpid()}.part"))
+    if catalog:
+        # Metadata of cataloged files is looked up instead of read
+        from metadata_cache import metadata_cache
+        from rinex_catalog import RinexCatalog
+        metadata_cache.store = RinexCatalog(catalog)
+
+
+def discover_observation_files(inputs, recursive=False):
+    """
+    Expands directories and glob patterns into the list of RINEX
+    observation files (*.yyO, or Compact RINEX *.yyD), one per family.
+    """
+    found = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pattern = f"**/{OBS_FILE_PATTERN}" if recursive else OBS_FILE_PATTERN
+            found.extend(path.glob(pattern))
+        elif path.is_file():
+            found.append(path)
+        else:
+            found.extend(Path(p) for p in glob.glob(item, recursive=recursive))
+
+    unique = {}
+    for path in found:
+        if not path.is_file():
+            continue
+        if path.suffix[-1:] in ("d", "D") and rinex_filename(path).exists():
+            # The plain observation file of the same family is used instead
+            continue
+        if path.suffix[-1:] in ("o", "O", "d", "D"):
+            unique.setdefault(path.resolve(), path)
+    return sorted(unique)
+
+
+def _expand_crinex(crinex_file):
+    """
+    Decodes a Compact RINEX input (.yyD) to the .yyO processed by the
+    other stages; the input is kept as <file>.ORIGINAL.
+    """
+    original = Path(f"{crinex_file}{ORIGINAL_SUFFIX}")
+    if original.exists():
+        raise FileExistsError(f"{original} already exists")
+
+    obs_file = decompress_crx_file(crinex_file)
+    os.rename(crinex_file, original)
+    logger.debug("Decoded %s to %s", crinex_file, obs_file)
+    return obs_file
+
+
+def _check_validation(result):
+    """Marks a family whose fixed file failed validation as `invalid`"""
+    validation = result.get("validation")
+    if validation and not validation["ok"]:
+        result["status"] = "invalid"
+        result["error"] = "; ".join(validation["messages"][:3])
+
+
+def _pipeline_family(result, obs_file, station_id, codec, level, tee,
+                     input_record, validate):
+    fixed = fix_and_archive(obs_file, station_id, codec, level, tee)
+    result["archive"] = fixed["archive"]
+    result["compression"] = fixed["members"]
+    # Without the plain copy, the archive is the only output
+    result["output"] = fixed["outputs"][0] if fixed["outputs"] else fixed["archive"]
+    if input_record:
+        result["manifest_entry"] = new_entry(
+            input_record, result["output"], fixed["shift_weeks"],
+            fixed["archive"], fixed["new_name"])
+    result["status"] = "ok"
+    if validate:
+        result["validation"] = validate_rinex_obs_file(result["output"])
+        _check_validation(result)
+    return result
+
+
+@logger.timed("family")
+def process_family(obs_file, station_id, backend="gfzrnx", compress=True,
+                   codec="deflate", level=None, hatanaka=False,
+                   use_manifest=True, pipeline=False, tee=False,
+                   validate=False):
+    """
+    Runs rename -> week shift -> compression for one RINEX family.
+    Compact RINEX input is decoded first, and with `hatanaka` the fixed
+    observation file is written as .yyD instead of .yyO.
+    With `pipeline`, the family is instead fixed and archived in a
+    single pass by rinex_pipeline.fix_and_archive() (native shift; the
+    inputs are left as they are, `tee` also writes the plain files).
+    With `use_manifest`, files already recorded in the directory
+    manifest are skipped and the new manifest entry (or the refreshed
+    entry of a touched output) is returned in the result (the manifest
+    itself is only written by the parent process).
+    With `validate`, the fixed observation file is checked by
+    rinex_validate, and a file that fails is reported as `invalid`.
+    Never raises, so one bad family does not stop the batch.
+
+    Returns:
+        dict: result entry for the batch summary
+    """
+    start = time.perf_counter()
+    result = {
+        "input": str(obs_file),
+        "status": "failed",
+        "output": None,
+        "archive": None,
+        "error": None,
+    }
+
+    try:
+        if compress or pipeline:
+            # Before anything is renamed or shifted
+            check_level(codec, level)
+        input_record = None
+        if use_manifest:
+            state, entry, sha256 = Manifest.load(Path(obs_file).parent).check(obs_file)
+            if state != NEW:
+                result["status"] = "mismatch" if state == MISMATCH else "skipped"
+                result["manifest"] = state
+                result["output"] = entry["output"]["name"]
+                if state == MISMATCH:
+                    result["error"] = "file does not match its manifest entry"
+                else:
+                    logger.notify(f"Arquivo já processado, ignorado: {Path(obs_file).name}")
+                if (state == FIXED and sha256
+                        and entry["output"]["name"] == Path(obs_file).name):
+                    # Hashed after a touch: save its new mtime, so the
+                    # next run settles it by stat again
+                    result["manifest_entry"] = entry
+                return result
+            input_record = file_record(obs_file, sha256)
+
+        if Path(obs_file).suffix[-1:] in ("d", "D"):
+            obs_file = _expand_crinex(obs_file)
+
+        if pipeline:
+            return _pipeline_family(result, obs_file, station_id, codec,
+                                    level, tee, input_record, validate)
+
+        fixed_filename = rinex_filename_fixer(str(obs_file), station_id=station_id)
+        if not fixed_filename:
+            result["error"] = "rinex_filename_fixer failed"
+            return result
+
+        dir_path = Path(obs_file).parent
+        # Same suffix as the input: families of other years may share the name
+        fixed_file = dir_path / f"{fixed_filename}{Path(obs_file).suffix}"
+        if not fixed_file.exists():
+            result["error"] = "observation file not found after rename"
+            return result
+        result["output"] = str(fixed_file)
+
+        fixer = RinexFixer(backend)
+        if not fixer.process_rinex_file(fixed_file):
+            result["error"] = "RinexFixer.process_rinex_file failed"
+            return result
+
+        if validate:
+            # Before Hatanaka/zip, on the plain file the fixer swapped in
+            result["validation"] = validate_rinex_obs_file(fixed_file)
+
+        if hatanaka:
+            crinex_file = compress_obs_file(fixed_file)
+            os.remove(fixed_file)
+            result["output"] = str(crinex_file)
+
+        if compress:
+            compressed = compress_rinex_family(result["output"], codec, level)
+            if compressed:
+                result["archive"] = compressed["archive"]
+                result["compression"] = compressed["members"]
+
+        if input_record:
+            result["manifest_entry"] = new_entry(
+                input_record, result["output"], fixer.last_shift, result["archive"])
+
+        result["status"] = "ok"
+        _check_validation(result)
+    except Exception as e:
+        logger.error(e)
+        result["error"] = str(e)
+    finally:
+        result["seconds"] = round(time.perf_counter() - start, 3)
+
+    return result
+
+
+def update_manifests(results):
+    """Writes the manifest entries of `results` to their directories"""
+    by_directory = {}
+    for result in results:
+        entry = result.pop("manifest_entry", None)
+        if entry:
+            directory = Path(result["input"]).parent
+            by_directory.setdefault(directory, []).append(entry)
+
+    for directory, entries in by_directory.items():
+        manifest = Manifest.load(directory)
+        for entry in entries:
+            manifest.add(entry)
+        manifest.save()
+
+
+def _merge_worker_traces(trace_file):
+    parts = glob.glob(glob.escape(trace_file) + ".*.part")
+    events = merge_traces(parts, trace_file)
+    for part in parts:
+        os.remove(part)
+    print(format_summary(events), file=sys.stderr)
+
+
+def run_batch(obs_files, station_id, jobs=None, backend="gfzrnx",
+              compress=True, debug_mode=False, codec="deflate", level=None,
+              hatanaka=False, use_manifest=True, trace_file=None,
+              pipeline=False, tee=False, catalog=None, validate=False):
+    """
+    Processes every family on a process pool of `jobs` workers.
+    With `trace_file`, the timing spans of all workers are merged into
+    that Chrome trace file and a summary table is printed to stderr.
+    With `catalog` (a rinex_catalog database), the metadata of files
+    already cataloged is read from it, and the others are added to it.
+
+    Returns:
+        dict: machine-readable summary of the batch
+    """
+    start = time.perf_counter()
+    results = []
+    if catalog:
+        # Created here rather than by all the workers at once
+        from rinex_catalog import RinexCatalog
+        RinexCatalog(catalog).close()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(debug_mode, trace_file, catalog)) as executor:
+        futures = {
+            executor.submit(process_family, str(obs_file), station_id,
+                            backend, compress, codec, level,
+                            hatanaka, use_manifest, pipeline, tee,
+                            validate): obs_file
+            for obs_file in obs_files
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker process itself died
+                results.append({"input": str(futures[future]),
+                                "status": "failed", "error": str(e)})
+
+    results.sort(key=lambda r: r["input"])
+    if trace_file:
+        _merge_worker_traces(trace_file)
+    if use_manifest:
+        update_manifests(results)
+
+    ok = sum(1 for r in results if r["status"] == "ok")
+    skipped = sum(1 for r in results if r["status"] == "skipped")
+
+    return {
+        "total": len(results),
+        "ok": ok,
+        "skipped": skipped,
+        "failed": len(results) - ok - skipped,
+        "jobs": jobs or os.cpu_count(),
+        "seconds": round(time.perf_counter() - start, 3),
+        "families": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fixes the GPS week rollover of whole RINEX campaign "
+                    "directories without the graphical interface.")
+    parser.add_argument("inputs", nargs="+",
+                        help="directories, RINEX observation files or glob patterns")
+    parser.add_argument("-s", "--station-id", default="SSTR",
+                        help="station id used in the new file names (default: SSTR)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="search directories recursively")
+    parser.add_argument("--backend", choices=("gfzrnx", "native"), default="gfzrnx",
+                        help="GPS week shift engine (default: gfzrnx)")
+    parser.add_argument("--hatanaka", action="store_true",
+                        help="write the fixed observation files as Compact "
+                             "RINEX (.yyD)")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="process every file, ignoring and not updating "
+                             "the per-directory manifest")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="fix and archive each family in a single pass, "
+                             "with no intermediate or renamed files (always "
+                             "uses the native shift; the inputs are kept)")
+    parser.add_argument("--tee", action="store_true",
+                        help="with --pipeline, also write the fixed files "
+                             "next to the archive")
+    parser.add_argument("--no-zip", action="store_true",
+                        help="do not compress the fixed families")
+    parser.add_argument("--codec", choices=CODECS, default="deflate",
+                        help="compression codec; gzip writes one .gz per file "
+                             "(default: deflate)")
+    parser.add_argument("--level", type=int, default=None,
+                        help="compression level of the codec")
+    parser.add_argument("--buffer-size", default=None,
+                        help="I/O buffer size of the streaming stages per worker, "
+                             "e.g. 4M (default: 1M)")
+    parser.add_argument("--validate", action="store_true",
+                        help="check the epochs of every fixed observation file "
+                             "(order, INTERVAL, header, name date, rollover)")
+    parser.add_argument("--catalog", metavar="DB",
+                        help="look up the metadata of the files in this "
+                             "rinex_catalog.py database, adding the missing ones")
+    parser.add_argument("-o", "--summary",
+                        help="write the JSON summary to this file instead of stdout")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write per-stage timing spans to FILE (Chrome trace "
+                             "format) and print a summary table")
+    parser.add_argument("-D", "--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.tee and not args.pipeline:
+        parser.error("--tee requires --pipeline")
+    if args.pipeline and (args.no_zip or args.hatanaka or args.codec == "gzip"):
+        parser.error("--pipeline writes a zip archive: it cannot be combined "
+                     "with --no-zip, --hatanaka or --codec gzip")
+    if args.buffer_size is not None:
+        try:
+            # Through the environment, so the workers inherit it
+            set_buffer_size(args.buffer_size)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        check_level(args.codec, args.level)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    obs_files = discover_observation_files(args.inputs, args.recursive)
+    if not obs_files:
+        print("No RINEX observation files found.", file=sys.stderr)
+        return 1
+
+    summary = run_batch(obs_files, args.station_id, args.jobs, args.backend,
+                        not args.no_zip, args.debug, args.codec, args.level,
+                        args.hatanaka, not args.no_manifest, args.trace,
+                        args.pipeline, args.tee, args.catalog, args.validate)
+
+    output = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
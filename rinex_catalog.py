@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+
+"""
+SQLite catalog of the headers of a RINEX archive: marker name,
+receiver, interval, first and last epoch and the week rollover state
+of every observation file, so sessions are found by station and date
+with a query instead of opening the files.
+
+    python rinex_catalog.py scan /arquivo/campo /arquivo/2019 -j 8
+    python rinex_catalog.py query --station SSTR --date 2019-04-07
+    python rinex_catalog.py query --needs-fix
+
+Files are read on a process pool, header and first epoch only (see
+rinex_reader), and keyed on path, size and mtime: a rescan only reads
+new and changed files and forgets the ones that are gone.
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from gps_time import GPSTime
+from logger import logger
+from rinex_filename_fixer import fixed_first_epoch
+from rinex_gpsweek import gpsw_correction
+from rinex_io import rinex_name
+from rinex_reader import epoch_from_filename, read_rinex_metadata
+
+CATALOG_NAME = "rinex_catalog.sqlite"
+CATALOG_VERSION = 1
+# Seconds to wait for a writer holding the database (e.g. batch workers)
+LOCK_TIMEOUT = 30.0
+# Files handed to a scanner process at a time
+SCAN_CHUNK_SIZE = 16
+# Rows written per transaction during a scan
+COMMIT_ROWS = 500
+
+# ssssdddf.yyO / .yyD, plain or compressed
+OBS_FILE_PATTERN = re.compile(r"\.\d\d[oOdD](\.gz|\.Z)?$")
+
+# Columns read from the file content, as returned by
+# rinex_reader.read_rinex_content_metadata()
+CONTENT_COLUMNS = ("version", "type", "satsys", "interval", "marker_name",
+                   "receiver", "epo_first", "epo_last")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version TEXT,
+    type TEXT,
+    satsys TEXT,
+    interval REAL,
+    marker_name TEXT,
+    receiver TEXT,
+    epo_first TEXT,
+    epo_last TEXT,
+    epo_first_name TEXT,
+    first_date TEXT,
+    fixed_first TEXT,
+    fixed_date TEXT,
+    rollover_weeks INTEGER,
+    shift_weeks INTEGER,
+    error TEXT,
+    scanned_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_marker_name ON files (marker_name);
+CREATE INDEX IF NOT EXISTS files_fixed_date ON files (fixed_date);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+"""
+
+COLUMNS = ("path", "directory", "name", "size", "mtime_ns") + CONTENT_COLUMNS + (
+    "epo_first_name", "first_date", "fixed_first", "fixed_date",
+    "rollover_weeks", "shift_weeks", "error", "scanned_at")
+
+
+def iter_observation_files(roots, recursive=True):
+    """Observation files (*.yyO, *.yyD, also .gz/.Z) under `roots`"""
+    for root in roots:
+        root = Path(root)
+        if root.is_file():
+            yield root.resolve()
+            continue
+        for directory, dirs, files in os.walk(root):
+            if not recursive:
+                dirs.clear()
+            dirs.sort()
+            for name in sorted(files):
+                if OBS_FILE_PATTERN.search(name):
+                    yield Path(directory, name).resolve()
+
+
+def _epoch_date(epoch):
+    """ "2019 04 07 00 00 00.0000000" -> "2019-04-07" """
+    return "-".join(epoch.split()[:3]) if epoch else None
+
+
+def catalog_entry(path, data=None):
+    """
+    Catalog row of `path`, reading its header and first epoch unless
+    its metadata (rinex_reader.read_rinex_metadata) is given. A file
+    that cannot be read gets a row with its `error`, so it is not read
+    again until it changes.
+    """
+    path = Path(path)
+    stat = path.stat()
+    entry = dict.fromkeys(COLUMNS)
+    entry.update({
+        "path": str(path),
+        "directory": str(path.parent),
+        "name": path.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "scanned_at": time.time(),
+    })
+
+    try:
+        if data is None:
+            data = read_rinex_metadata(path, cache=None)
+        for column in CONTENT_COLUMNS:
+            entry[column] = data["file"].get(column)
+        entry["marker_name"] = data["site"]["name"]
+        entry["receiver"] = data["site"]["receiver"]
+        entry["epo_first_name"] = data["file"].get("epo_first_name")
+        entry["first_date"] = _epoch_date(entry["epo_first"])
+
+        fixed = fixed_first_epoch(data)
+        first = GPSTime.parse(entry["epo_first"])
+        if fixed > GPSTime.from_datetime(datetime.today()):
+            # Already fixed (fixed_rinex_filename() refuses these)
+            fixed = first
+        entry["fixed_first"] = fixed.format_epoch()
+        entry["fixed_date"] = _epoch_date(entry["fixed_first"])
+        entry["rollover_weeks"] = fixed.week - first.week
+        if entry["epo_first_name"]:
+            entry["shift_weeks"] = gpsw_correction(data)
+    except Exception as e:
+        entry["error"] = str(e) or type(e).__name__
+    return entry
+
+
+def _scan_file(path):
+    # Runs on the scanner processes
+    try:
+        return catalog_entry(path)
+    except OSError:
+        # Gone since it was listed
+        return None
+
+
+class RinexCatalog:
+    """
+    The catalog database. It can also back rinex_reader's metadata
+    cache (metadata_cache.store = catalog): get()/put() serve and record
+    the content metadata of any file, cataloged or not, so fixing a file
+    that was already scanned does not read it again.
+    """
+
+    def __init__(self, db_path=CATALOG_NAME):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT,
+                                   check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, CATALOG_VERSION):
+                raise ValueError(f"{self.db_path}: unsupported catalog "
+                                 f"version {version}")
+            # Readers do not block the writer (e.g. several batch workers)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _upsert(self, entries):
+        placeholders = ", ".join("?" * len(COLUMNS))
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) "
+            f"VALUES ({placeholders})",
+            [tuple(entry[column] for column in COLUMNS) for entry in entries])
+
+    def add(self, path, data=None):
+        """Catalogs (or refreshes) one file; returns its row"""
+        entry = catalog_entry(Path(path).resolve(), data)
+        with self._lock, self._db:
+            self._upsert([entry])
+        return entry
+
+    def lookup(self, path):
+        """Row of `path` as a dict, or None if it is unknown or has changed"""
+        path = Path(path).resolve()
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, path):
+        """Content metadata of `path` (MetadataCache store), None if unknown"""
+        try:
+            row = self.lookup(path)
+        except sqlite3.Error as e:
+            logger.debug("Catalog lookup of %s failed: %s", path, e)
+            return None
+        if row is None or row["error"]:
+            return None
+        return {column: row[column] for column in CONTENT_COLUMNS}
+
+    def put(self, path, content):
+        """Records the content metadata of `path` (MetadataCache store)"""
+        data = {
+            "file": {column: content[column] for column in CONTENT_COLUMNS},
+            "site": {"name": content["marker_name"],
+                     "receiver": content["receiver"]},
+        }
+        try:
+            epo_first_name = epoch_from_filename(rinex_name(path))
+            if epo_first_name:
+                data["file"]["epo_first_name"] = epo_first_name
+            self.add(path, data)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("Could not catalog %s: %s", path, e)
+
+    def scan(self, roots, jobs=None, recursive=True):
+        """
+        Catalogs the observation files under `roots` on `jobs` processes,
+        reading only the new and changed ones, and drops the rows of the
+        files that no longer exist there.
+
+        Returns:
+            dict: files found, scanned, unchanged, removed and unreadable
+        """
+        start = time.perf_counter()
+        found = {str(path): path.stat() for path in iter_observation_files(
+            roots, recursive)}
+
+        with self._lock:
+            known = {row["path"]: (row["size"], row["mtime_ns"])
+                     for row in self._db.execute(
+                         "SELECT path, size, mtime_ns FROM files")}
+        changed = [path for path, stat in found.items()
+                   if known.get(path) != (stat.st_size, stat.st_mtime_ns)]
+        logger.notify(f"Catálogo: {len(found)} arquivos, "
+                      f"{len(changed)} novos ou alterados")
+
+        scanned = errors = 0
+        batch = []
+        if len(changed) > 1 and jobs != 1:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            entries = executor.map(_scan_file, changed, chunksize=SCAN_CHUNK_SIZE)
+        else:
+            executor = None
+            entries = map(_scan_file, changed)
+        try:
+            for entry in entries:
+                if entry is None:
+                    continue
+                scanned += 1
+                if entry["error"]:
+                    errors += 1
+                    logger.debug("Unreadable %s: %s", entry["path"], entry["error"])
+                batch.append(entry)
+                if len(batch) == COMMIT_ROWS:
+                    with self._lock, self._db:
+                        self._upsert(batch)
+                    batch = []
+        finally:
+            if executor:
+                executor.shutdown()
+            if batch:
+                with self._lock, self._db:
+                    self._upsert(batch)
+
+        removed = self._prune(roots, found, recursive)
+        summary = {
+            "files": len(found),
+            "scanned": scanned,
+            "unchanged": len(found) - len(changed),
+            "removed": removed,
+            "errors": errors,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        logger.debug("Catalog scan of %s: %s", roots, summary)
+        return summary
+
+    def _prune(self, roots, found, recursive):
+        """Deletes the rows under `roots` whose file was not found"""
+        gone = []
+        with self._lock:
+            for root in roots:
+                root = Path(root).resolve()
+                if root.is_file():
+                    continue
+                rows = self._db.execute(
+                    "SELECT path, directory FROM files "
+                    "WHERE directory = ? OR directory LIKE ? ESCAPE '\\'",
+                    (str(root), _like_prefix(root)))
+                gone.extend(row["path"] for row in rows
+                            if row["path"] not in found
+                            and (recursive or row["directory"] == str(root))
+                            and not os.path.exists(row["path"]))
+            with self._db:
+                self._db.executemany("DELETE FROM files WHERE path = ?",
+                                     [(path,) for path in gone])
+        return len(gone)
+
+    def find(self, station=None, date=None, needs_fix=None, directory=None):
+        """
+        Cataloged files matching every given filter, ordered by their
+        fixed first epoch: `station` (MARKER NAME, case-insensitive),
+        `date` (YYYY-MM-DD, the real date of the first epoch once fixed),
+        `needs_fix` (whether a week rollover is still to be undone) and
+        `directory` (and its subdirectories)
+        """
+        where = ["error IS NULL"]
+        params = []
+        if station is not None:
+            where.append("UPPER(TRIM(marker_name)) = ?")
+            params.append(station.strip().upper())
+        if date is not None:
+            where.append("fixed_date = ?")
+            params.append(date)
+        if needs_fix is not None:
+            where.append("rollover_weeks > 0" if needs_fix
+                         else "rollover_weeks = 0")
+        if directory is not None:
+            directory = Path(directory).resolve()
+            where.append("(directory = ? OR directory LIKE ? ESCAPE '\\')")
+            params.extend((str(directory), _like_prefix(directory)))
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM files WHERE {' AND '.join(where)} "
+                "ORDER BY fixed_first, path", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def stations(self):
+        """Files, first and last fixed date per MARKER NAME"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT marker_name, COUNT(*) AS files, "
+                "MIN(fixed_date) AS first_date, MAX(fixed_date) AS last_date, "
+                "SUM(rollover_weeks > 0) AS needs_fix "
+                "FROM files WHERE error IS NULL "
+                "GROUP BY marker_name ORDER BY marker_name").fetchall()
+        return [dict(row) for row in rows]
+
+    def errors(self):
+        """Files that could not be read, with the reason"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, error FROM files WHERE error IS NOT NULL "
+                "ORDER BY path").fetchall()
+        return [dict(row) for row in rows]
+
+
+def _like_prefix(directory):
+    """LIKE pattern of the subdirectories of `directory`"""
+    prefix = os.path.join(str(directory), "")
+    return re.sub(r"([\\%_])", r"\\\1", prefix) + "%"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Catalogs the headers of a RINEX archive in an SQLite "
+                    "database and queries it.")
+    parser.add_argument("--db", default=CATALOG_NAME,
+                        help=f"catalog database (default: {CATALOG_NAME})")
+    parser.add_argument("-D", "--debug", action="store_true")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    scan = commands.add_parser("scan", help="catalog new and changed files")
+    scan.add_argument("roots", nargs="+", help="directories or files")
+    scan.add_argument("-j", "--jobs", type=int, default=None,
+                      help="number of scanner processes (default: CPU count)")
+    scan.add_argument("--no-recursive", action="store_true",
+                      help="do not descend into subdirectories")
+
+    query = commands.add_parser("query", help="list cataloged files as JSON")
+    query.add_argument("-s", "--station", help="MARKER NAME")
+    query.add_argument("-d", "--date",
+                       help="real date of the first epoch, YYYY-MM-DD")
+    fix = query.add_mutually_exclusive_group()
+    fix.add_argument("--needs-fix", dest="needs_fix", action="store_true",
+                     default=None, help="only files with a week rollover")
+    fix.add_argument("--fixed", dest="needs_fix", action="store_false",
+                     help="only files without a week rollover")
+    query.add_argument("--directory", help="only files under this directory")
+    query.add_argument("--paths", action="store_true",
+                       help="print only the paths, one per line")
+
+    commands.add_parser("stations", help="summary per station, as JSON")
+    commands.add_parser("errors", help="files that could not be read, as JSON")
+
+    args = parser.parse_args(argv)
+    if args.command == "query" and args.date:
+        try:
+            datetime.strptime(args.date, "%Y-%m-%d")
+        except ValueError:
+            parser.error(f"invalid date: {args.date} (expected YYYY-MM-DD)")
+    return args
+
+
+def main(argv=None):
+    from rinex_cli import CliLogObserver
+
+    args = parse_args(argv)
+    logger.add_observer(CliLogObserver(args.debug))
+
+    with RinexCatalog(args.db) as catalog:
+        if args.command == "scan":
+            result = catalog.scan(args.roots, args.jobs, not args.no_recursive)
+        elif args.command == "query":
+            result = catalog.find(args.station, args.date, args.needs_fix,
+                                  args.directory)
+            if args.paths:
+                for row in result:
+                    print(row["path"])
+                return 0
+        elif args.command == "stations":
+            result = catalog.stations()
+        else:
+            result = catalog.errors()
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+Headless entry point for scripts and pipelines: fixes one RINEX family
+per invocation. Only what a run needs is imported (no tkinter, asyncio
+only when gfzrnx runs, the zip codecs only when compressing), so it
+starts in a few tens of milliseconds.
+
+    python rinex_cli.py SSTR0970.99O --station-id SSTR --native
+
+The fixed observation file (the archive, or with --split one line per
+daily file) is printed on stdout; the exit code is non-zero on failure.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from logger import DEBUG, ERROR, INFO, Observer, logger
+from progress import REPORT_SECONDS, Progress
+from rinex_filename_fixer import rinex_filename_fixer
+from rinex_fixer import RinexFixer
+from rinex_io import set_buffer_size, strip_compression
+
+
+class CliLogObserver(Observer):
+    """Writes log messages to stderr, keeping stdout for the result"""
+
+    def __init__(self, debug_mode=False, quiet=False):
+        self.debug_mode = debug_mode
+        self.quiet = quiet
+
+    @property
+    def level(self):
+        if self.debug_mode:
+            return DEBUG
+        return ERROR if self.quiet else INFO
+
+    def log(self, message):
+        message = str(message).strip()
+        if message:
+            print(message, file=sys.stderr)
+
+    def debug(self, message):
+        print(f"[DEBUG] {message}", file=sys.stderr)
+
+    def error(self, message):
+        print(f"[ERRO] {message}", file=sys.stderr)
+
+
+def fix_file(obs_file, station_id, backend="gfzrnx", compress=True,
+             progress=None):
+    """
+    Rename -> week shift -> (optional) compression of one family.
+    `progress` (progress.Progress) follows the shift and the compression.
+
+    Returns:
+        str: the archive, or the fixed observation file with `compress`
+        off; None on failure
+    """
+    fixed_filename = rinex_filename_fixer(str(obs_file), station_id=station_id)
+    if not fixed_filename:
+        return None
+
+    # Same suffixes as the input, e.g. .99O.gz
+    old_filename = strip_compression(obs_file).stem
+    fixed_file = Path(obs_file).parent / \
+        f"{fixed_filename}{Path(obs_file).name[len(old_filename):]}"
+    fixer = RinexFixer(backend)
+    if not fixer.process_rinex_file(fixed_file, progress):
+        return None
+    fixed_file = fixer.last_output
+    if not compress:
+        return str(fixed_file)
+
+    from rinex_compress import zip_rinex_family
+    archive = zip_rinex_family(fixed_file, progress)
+    return str(archive) if archive else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fixes the GPS week rollover of one RINEX family.")
+    parser.add_argument("file", help="RINEX observation file (*.yyO, also "
+                                     "compressed: *.yyO.gz, *.yyO.Z, *.yyD.Z)")
+    parser.add_argument("-s", "--station-id", default="SSTR",
+                        help="station id used in the new file names (default: SSTR)")
+    parser.add_argument("--native", action="store_true",
+                        help="shift the epochs with the built-in engine "
+                             "instead of gfzrnx")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="fix and archive in a single pass, leaving the "
+                             "input files as they are (native engine)")
+    parser.add_argument("--split", action="store_true",
+                        help="split a multi-day session into fixed daily "
+                             "files, in a single read (native engine)")
+    parser.add_argument("--no-zip", action="store_true",
+                        help="do not compress the fixed family")
+    parser.add_argument("--buffer-size", default=None,
+                        help="I/O buffer size of the streaming stages, e.g. 4M "
+                             "(default: 1M); memory use does not grow with the "
+                             "file size")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only print errors and the result (no throughput "
+                             "reports)")
+    parser.add_argument("-D", "--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.pipeline and args.no_zip:
+        parser.error("--pipeline writes a zip archive: it cannot be combined "
+                     "with --no-zip")
+    if args.split and args.pipeline:
+        parser.error("--split cannot be combined with --pipeline")
+    if args.buffer_size is not None:
+        try:
+            set_buffer_size(args.buffer_size)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.add_observer(CliLogObserver(args.debug, args.quiet))
+
+    if not Path(args.file).is_file():
+        logger.error(f"Arquivo não encontrado: {args.file}")
+        return 1
+
+    # Throughput and ETA of long stages, every few seconds
+    progress = Progress(report_seconds=REPORT_SECONDS)
+
+    if args.pipeline:
+        from rinex_pipeline import fix_and_archive
+        try:
+            output = fix_and_archive(args.file, args.station_id,
+                                     progress=progress)["archive"]
+        except Exception as e:
+            logger.error(e)
+            output = None
+    elif args.split:
+        from rinex_split import split_rinex_obs_file
+        try:
+            result = split_rinex_obs_file(args.file, args.station_id,
+                                          progress=progress)
+            output = "\n".join(f["file"] for f in result["files"])
+        except Exception as e:
+            logger.error(e)
+            output = None
+    else:
+        output = fix_file(args.file, args.station_id,
+                          "native" if args.native else "gfzrnx",
+                          not args.no_zip, progress)
+
+    if not output:
+        return 1
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+
+import bz2
+import gzip
+import lzma
+import os
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from logger import logger
+from progress import OperationCancelled
+from rinex_io import buffer_size
+
+# Members larger than this need zip64 headers when written as a stream
+ZIP64_LIMIT = (1 << 31) - 1
+
+# codec: (zip compression method, version needed to extract)
+ZIP_CODECS = {
+    "deflate": (zipfile.ZIP_DEFLATED, 20),
+    "bzip2": (zipfile.ZIP_BZIP2, 46),
+    "lzma": (zipfile.ZIP_LZMA, 63),
+}
+# "gzip" writes one <member>.gz per file instead of a zip archive
+CODECS = tuple(ZIP_CODECS) + ("gzip",)
+# codec: (lowest, highest) compression level
+LEVELS = {"deflate": (0, 9), "bzip2": (1, 9), "lzma": (0, 9), "gzip": (0, 9)}
+
+# The zip container is written here instead of through zipfile, so members
+# compressed concurrently can be appended without compressing them again.
+# It has no zip64 records: families above this size go through zipfile.
+ZIP32_LIMIT = 0xF0000000
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+FLAG_UTF8 = 0x800
+FLAG_LZMA_EOS = 0x02
+
+# LZMA1 dictionary size of each preset (liblzma)
+LZMA_DICT_SIZES = (1 << 18, 1 << 20, 1 << 21, 1 << 22, 1 << 22,
+                   1 << 23, 1 << 23, 1 << 24, 1 << 25, 1 << 26)
+
+
+def find_rinex_family(rinex_file):
+    """
+    Returns the observation/navigation files sharing the base name
+    of `rinex_file` (base.yyO or base.yyD, base.yyN, base.yyG)
+    """
+    file_path = Path(rinex_file)
+    pattern = f"{file_path.stem}.[0-9][0-9][D,G,N,O]"
+    return sorted(file_path.parent.glob(pattern))
+
+
+def check_level(codec, level):
+    """
+    Raises ValueError if `codec` is unknown or `level` (None for its
+    default) is outside the levels it accepts
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    low, high = LEVELS[codec]
+    if level is not None and not low <= level <= high:
+        raise ValueError(f"The {codec} level must be between {low} and {high}, "
+                         f"not {level}")
+
+
+class _LZMAZipCompressor:
+    """LZMA as stored in zip members: a properties header, then raw LZMA1"""
+
+    def __init__(self, preset):
+        lc, lp, pb, dict_size = 3, 0, 2, LZMA_DICT_SIZES[preset]
+        props = bytes([(pb * 5 + lp) * 9 + lc]) + struct.pack("<I", dict_size)
+        self._header = struct.pack("<BBH", 9, 4, len(props)) + props
+        self._compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[{
+            "id": lzma.FILTER_LZMA1, "preset": preset, "dict_size": dict_size,
+            "lc": lc, "lp": lp, "pb": pb}])
+
+    def compress(self, data):
+        header, self._header = self._header, b""
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b""
+        return header + self._compressor.flush()
+
+
+def _new_compressor(codec, level):
+    if codec == "deflate":
+        level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        return zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    if codec == "bzip2":
+        return bz2.BZ2Compressor(9 if level is None else level)
+    return _LZMAZipCompressor(6 if level is None else level)
+
+
+class _SharedProgress:
+    """Sums the bytes compressed by every worker thread into one Progress"""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.processed = 0
+        self._lock = threading.Lock()
+        # Set when a member failed, to stop the others without touching
+        # the cancel event of the caller's Progress
+        self.stopped = threading.Event()
+
+    def add(self, size):
+        if self.stopped.is_set():
+            raise OperationCancelled("Stopped: another member failed")
+        if self.progress is None:
+            return
+        with self._lock:
+            self.processed += size
+            processed = self.processed
+        self.progress.check_cancelled()
+        self.progress.update(processed)
+
+
+@logger.timed("zip_member")
+def _compress_member(file, codec, level, shared_progress):
+    """
+    Compresses one family member in chunks (runs on a worker thread;
+    zlib, bz2 and lzma release the GIL while compressing).
+
+    Returns:
+        dict: member statistics, plus the compressed data location
+    """
+    start = time.perf_counter()
+    stat = file.stat()
+    crc = 0
+
+    if codec == "gzip":
+        output = file.with_name(f"{file.name}.gz")
+        dst = gzip.open(output, "wb", 9 if level is None else level)
+        compressor = None
+    else:
+        dst = tempfile.NamedTemporaryFile(
+            dir=file.parent, prefix=f".{file.name}.", suffix=".part", delete=False)
+        output = Path(dst.name)
+        compressor = _new_compressor(codec, level)
+
+    try:
+        chunk_size = buffer_size()
+        with open(file, "rb") as src, dst:
+            for chunk in iter(lambda: src.read(chunk_size), b""):
+                if compressor is None:
+                    dst.write(chunk)
+                else:
+                    crc = zlib.crc32(chunk, crc)
+                    dst.write(compressor.compress(chunk))
+                shared_progress.add(len(chunk))
+            if compressor is not None:
+                dst.write(compressor.flush())
+    except BaseException:
+        output.unlink()
+        raise
+
+    seconds = time.perf_counter() - start
+    compressed = output.stat().st_size
+
+    return {
+        "name": file.name,
+        "size": stat.st_size,
+        "compressed": compressed,
+        "ratio": round(compressed / stat.st_size, 4) if stat.st_size else 0.0,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(stat.st_size / 1e6 / seconds, 1) if seconds else 0.0,
+        "crc": crc,
+        "mtime": stat.st_mtime,
+        "mode": stat.st_mode,
+        "output": str(output),
+    }
+
+
+def _dos_date_time(timestamp):
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_date = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+def _zip_headers(member, codec, offset):
+    """Local and central directory headers of a member stored at `offset`"""
+    method, extract_version = ZIP_CODECS[codec]
+    name = member["name"].encode("utf-8")
+    flags = 0 if member["name"].isascii() else FLAG_UTF8
+    if codec == "lzma":
+        flags |= FLAG_LZMA_EOS
+    dos_time, dos_date = _dos_date_time(member["mtime"])
+
+    local = LOCAL_HEADER.pack(
+        b"PK\003\004", extract_version, 0, flags, method, dos_time, dos_date,
+        member["crc"], member["compressed"], member["size"], len(name), 0) + name
+
+    create_system = 0 if os.name == "nt" else 3
+    central = CENTRAL_HEADER.pack(
+        b"PK\001\002", max(extract_version, 20), create_system, extract_version,
+        0, flags, method, dos_time, dos_date, member["crc"],
+        member["compressed"], member["size"], len(name), 0, 0, 0, 0,
+        (member["mode"] & 0xFFFF) << 16, offset) + name
+    return local, central
+
+
+def _write_central_directory(out, central):
+    central_offset = out.tell()
+    out.write(b"".join(central))
+    out.write(END_RECORD.pack(
+        b"PK\005\006", 0, 0, len(central), len(central),
+        out.tell() - central_offset, central_offset, 0))
+
+
+def _append_zip_member(out, member, codec):
+    """Writes a member's local header and its compressed data to `out`"""
+    local, central = _zip_headers(member, codec, out.tell())
+    out.write(local)
+    chunk_size = buffer_size()
+    with open(member["output"], "rb") as src:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            out.write(chunk)
+    return central
+
+
+class _ZipMemberStream:
+    """File-like writer of one ZipStreamWriter member"""
+
+    def __init__(self, writer, name, mtime, mode):
+        self._writer = writer
+        self._compressor = _new_compressor(writer.codec, writer.level)
+        self.member = {"name": name, "mtime": mtime, "mode": mode,
+                       "crc": 0, "size": 0, "compressed": 0}
+        self._offset = writer.out.tell()
+        # Placeholder, rewritten with the CRC and sizes on close()
+        local, _ = _zip_headers(self.member, writer.codec, self._offset)
+        writer.out.write(local)
+        self._data_offset = writer.out.tell()
+        # Callers write line by line; compress in buffer_size() blocks
+        self._buffer = bytearray()
+        self._block_size = buffer_size()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._block_size:
+            self._flush_buffer()
+
+    def writelines(self, lines):
+        for line in lines:
+            self._buffer += line
+        if len(self._buffer) >= self._block_size:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        self.member["crc"] = zlib.crc32(data, self.member["crc"])
+        self.member["size"] += len(data)
+        self._writer.out.write(self._compressor.compress(data))
+
+    def close(self):
+        out = self._writer.out
+        self._flush_buffer()
+        out.write(self._compressor.flush())
+        end = out.tell()
+        self.member["compressed"] = end - self._data_offset
+        if end > ZIP32_LIMIT or self.member["size"] > ZIP32_LIMIT:
+            raise ValueError(f"{self.member['name']} is too large for a zip "
+                             "without zip64 records")
+
+        local, central = _zip_headers(self.member, self._writer.codec,
+                                      self._offset)
+        out.seek(self._offset)
+        out.write(local)
+        out.seek(end)
+        self._writer.central.append(central)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+class ZipStreamWriter:
+    """
+    Writes a zip archive whose members are produced on the fly (e.g. a
+    file being fixed), without a temporary file per member. Each local
+    header is patched in place once its member is complete, so `out`
+    must be seekable. Like the family writer, it has no zip64 records.
+    """
+
+    def __init__(self, out, codec="deflate", level=None):
+        if codec not in ZIP_CODECS:
+            raise ValueError(f"Not a zip codec: {codec}")
+        check_level(codec, level)
+        self.out = out
+        self.codec = codec
+        self.level = level
+        self.central = []
+
+    def open(self, name, mtime=None, mode=0o100644):
+        """
+        Returns:
+            _ZipMemberStream: writer of member `name`; close it (or use
+            it as a context manager) before opening the next one
+        """
+        return _ZipMemberStream(self, name,
+                                time.time() if mtime is None else mtime, mode)
+
+    def close(self):
+        _write_central_directory(self.out, self.central)
+
+
+@logger.timed("zip")
+def compress_rinex_family(rinex_file, codec="deflate", level=None,
+                          workers=None, progress=None, zip_filename=None):
+    """
+    Compresses the RINEX family of `rinex_file`, one member per thread.
+
+    With a zip codec (deflate, bzip2, lzma) the members go into
+    `zip_filename` (default <base>_RINEX.zip); with "gzip" each member
+    gets its own <member>.gz.
+    `progress` (progress.Progress) may cancel the operation, in which
+    case every partial output is removed and OperationCancelled is raised.
+
+    Returns:
+        dict: archive path (None for gzip) and per-member statistics
+        (size, compressed size, ratio, throughput), or None if no RINEX
+        file was found
+    """
+    check_level(codec, level)
+
+    file_path = Path(rinex_file)
+    rinex_files = find_rinex_family(file_path)
+    if not rinex_files:
+        logger.notify("Erro: Nenhum arquivo RINEX encontrado para compressão")
+        return None
+
+    total = sum(f.stat().st_size for f in rinex_files)
+    if progress:
+        progress.start("Comprimindo", total)
+
+    zip_filename = Path(zip_filename or
+                        file_path.parent / f"{file_path.stem}_RINEX.zip")
+
+    if codec != "gzip" and total > ZIP32_LIMIT:
+        # Too big for the zip writer above, fall back to zip64 via zipfile
+        return _zip_family_sequential(zip_filename, rinex_files, codec, level,
+                                      progress)
+
+    shared_progress = _SharedProgress(progress)
+    members = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers or len(rinex_files)) as executor:
+        futures = [executor.submit(_compress_member, file, codec, level,
+                                   shared_progress)
+                   for file in rinex_files]
+        try:
+            for future in futures:
+                members.append(future.result())
+        except BaseException as e:
+            # Stop the other members and remove everything written so far
+            shared_progress.stopped.set()
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    Path(future.result()["output"]).unlink()
+            if isinstance(e, OperationCancelled):
+                logger.notify("Compressão cancelada.")
+            raise
+
+    archive = None
+    if codec != "gzip":
+        try:
+            with open(zip_filename, "wb") as out:
+                _write_central_directory(out, [
+                    _append_zip_member(out, member, codec) for member in members])
+        finally:
+            for member in members:
+                Path(member["output"]).unlink()
+        archive = zip_filename
+
+    for member in members:
+        for key in ("crc", "mtime", "mode", "output"):
+            member.pop(key)
+
+    seconds = time.perf_counter() - start
+    log_compression_summary(archive, members, codec)
+
+    return {
+        "archive": str(archive) if archive else None,
+        "codec": codec,
+        "seconds": round(seconds, 3),
+        "members": members,
+    }
+
+
+def _zip_family_sequential(zip_filename, rinex_files, codec, level, progress):
+    method = ZIP_CODECS[codec][0]
+    start = time.perf_counter()
+
+    try:
+        with zipfile.ZipFile(str(zip_filename), 'w', method,
+                             compresslevel=level) as zipf:
+            processed = 0
+            for file in rinex_files:
+                processed = _write_member(zipf, file, processed, progress, method)
+    except OperationCancelled:
+        zip_filename.unlink()
+        logger.notify("Compressão cancelada.")
+        raise
+
+    with zipfile.ZipFile(str(zip_filename)) as zipf:
+        members = [{
+            "name": info.filename,
+            "size": info.file_size,
+            "compressed": info.compress_size,
+            "ratio": round(info.compress_size / info.file_size, 4)
+            if info.file_size else 0.0,
+        } for info in zipf.infolist()]
+
+    log_compression_summary(zip_filename, members, codec)
+    return {
+        "archive": str(zip_filename),
+        "codec": codec,
+        "seconds": round(time.perf_counter() - start, 3),
+        "members": members,
+    }
+
+
+def log_compression_summary(archive, members, codec):
+    """
+    Notifies where the members were written (`archive`, or None for
+    gzip) and the compression ratio and throughput of each one
+    """
+    if archive:
+        logger.notify(f"\nArquivos comprimidos com sucesso em: {archive}")
+    else:
+        logger.notify(f"\nArquivos comprimidos com sucesso ({codec})")
+    logger.notify("Arquivos incluídos:")
+    for member in members:
+        if "mb_per_s" in member:
+            logger.notify("- %s (%.1f%%, %.1f MB/s)", member["name"],
+                          100 * member["ratio"], member["mb_per_s"])
+        else:
+            logger.notify("- %s (%.1f%%)", member["name"], 100 * member["ratio"])
+
+
+def zip_rinex_family(rinex_file, progress=None, codec="deflate", level=None,
+                     workers=None):
+    """
+    Compresses the RINEX family of `rinex_file` into <base>_RINEX.zip
+
+    `progress` (progress.Progress) receives the bytes compressed and may
+    cancel the operation, in which case the partial zip is removed and
+    OperationCancelled is raised.
+
+    Returns:
+        Path: the zip file, or None if no RINEX file was found
+    """
+    result = compress_rinex_family(rinex_file, codec, level, workers, progress)
+    if not result or not result["archive"]:
+        return None
+    return Path(result["archive"])
+
+
+def _write_member(zipf, file, processed, progress, method=zipfile.ZIP_DEFLATED):
+    if progress is None:
+        zipf.write(str(file), file.name)
+        return processed
+
+    zinfo = zipfile.ZipInfo.from_file(str(file), file.name)
+    zinfo.compress_type = method
+    chunk_size = buffer_size()
+    with open(file, "rb") as src, \
+            zipf.open(zinfo, "w", force_zip64=zinfo.file_size > ZIP64_LIMIT) as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            dst.write(chunk)
+            processed += len(chunk)
+            progress.check_cancelled()
+            progress.update(processed)
+    return processed
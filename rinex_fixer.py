@@ -1,64 +1,222 @@
 #!/usr/bin/env python3
 
-import subprocess
 from pathlib import Path
 from rinex_gpsweek import calculate_gpsw_correction
-from bin.binary import get_gfzrnx_path
+from rinex_io import compressed_variant, decoded_path, is_compressed, rinex_size
+from rinex_shift import shift_rinex_nav_file, shift_rinex_obs_file
 from logger import logger
+from progress import OperationCancelled
+
+BACKENDS = ("gfzrnx", "native")
+
+
+# Navigation siblings of an observation file (.yyO -> .yyN, .yyG)
+NAV_TYPES = "NG"
+
+
+def navigation_files(filepath):
+    """
+    The .yyN/.yyG files next to the observation file `filepath`,
+    plain or compressed (.gz, .Z), in the same case as its suffix
+    """
+    filepath = decoded_path(filepath) if is_compressed(filepath) else Path(filepath)
+    prefix, obs_type = filepath.suffix[:-1], filepath.suffix[-1:]
+    nav_types = NAV_TYPES if obs_type.isupper() else NAV_TYPES.lower()
+    siblings = [compressed_variant(filepath.with_suffix(prefix + t))
+                for t in nav_types]
+    return [path for path in siblings if path]
 
 
 class RinexFixer:
-    def __init__(self):
-        gfzrnx_path = get_gfzrnx_path()
-        self.GFZRNX = gfzrnx_path
+    def __init__(self, backend="gfzrnx", fix_navigation=True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.backend = backend
+        # Also shift the .yyN/.yyG files of the family (always in-process)
+        self.fix_navigation = fix_navigation
         # self.RINEX_DIR = rinex_dir
         self.SHIFT_WEEKS = 1024
+        # Week shift applied by the last process_rinex_file() call
+        self.last_shift = None
+        # Fixed observation file written by the last process_rinex_file() call
+        self.last_output = None
 
-    def process_rinex_file(self, filepath) -> bool:
+    @property
+    def GFZRNX(self):
+        """gfzrnx binary, resolved on first use (the native backend never needs it)"""
+        if self.backend != "gfzrnx":
+            return None
+        from gfzrnx_executor import gfzrnx
+        return gfzrnx.binary
+
+    def navigation_files(self, filepath):
+        """navigation_files(), unless `fix_navigation` is off"""
+        return navigation_files(filepath) if self.fix_navigation else []
+
+    @staticmethod
+    def fixed_file(path):
+        """
+        Where the fixed copy of `path` goes: the file itself (the original
+        is kept as .ORIGINAL), or for a compressed input its plain
+        decoded name next to it, leaving the input as it is
+        """
+        return decoded_path(path) if is_compressed(path) else Path(path)
+
+    def process_rinex_file(self, filepath, progress=None) -> bool:
+        """
+        Shifts the epochs of `filepath`, and of its navigation files
+        unless `fix_navigation` is off, keeping every original file as
+        <file>.ORIGINAL. Compressed inputs (.gz, .Z, .zip) are decoded
+        on the fly and left as they are; the fixed family is written
+        next to them as plain files (see fixed_file()). The files are
+        only replaced once all of them were shifted. `progress` (progress.Progress) receives updates
+        and may cancel the shift; on cancellation the partial outputs are
+        removed, the originals are left untouched and OperationCancelled
+        is raised.
+        """
         filepath = Path(filepath)
         filename = filepath.name
-        outfile = f"{filepath}.CORRIGIDO"
+        outfile = f"{self.fixed_file(filepath)}.CORRIGIDO"
 
         logger.notify(f"Processando arquivo: {filename}")
+        backend = self.backend
+        if backend == "gfzrnx" and is_compressed(filepath):
+            # gfzrnx only reads plain files
+            logger.notify("Arquivo comprimido: usando o motor nativo")
+            backend = "native"
 
         try:
 
             shift = calculate_gpsw_correction(filepath)
-            logger.debug(f"Calculated weeh shift: {shift}")
+            logger.debug("Calculated weeh shift: %s", shift)
+            self.last_shift = shift
 
-            if Path(f"{filepath}.ORIGINAL").exists():
-                logger.notify("")
-                logger.notify(
-                    f"Erro: Foi encontrado o arquivo \"{filepath}.ORIGINAL\"")
-                logger.notify(
-                    "Verifique se o processo de correção já não foi realizado.\n")
-                return False
+            family = [filepath] + self.navigation_files(filepath)
+            for path in family:
+                if Path(f"{path}.ORIGINAL").exists():
+                    logger.notify("")
+                    logger.notify(
+                        f"Erro: Foi encontrado o arquivo \"{path}.ORIGINAL\"")
+                    logger.notify(
+                        "Verifique se o processo de correção já não foi realizado.\n")
+                    return False
+                if is_compressed(path) and self.fixed_file(path).exists():
+                    logger.notify("")
+                    logger.notify(
+                        f"Erro: o arquivo {self.fixed_file(path).name} já existe")
+                    return False
+
+            if progress:
+                progress.start("Corrigindo", rinex_size(filepath) or 0)
 
             try:
-                subprocess.run(
-                    [self.GFZRNX, "-shift_gpsw", str(shift), "-finp", str(filepath),
-                        "-fout", outfile, "-vo", "2"],
-                    check=True, capture_output=True, text=True
-                )
-            except subprocess.CalledProcessError as e:
-                log_file = open(f"{filepath}.gfzrnx.log", "w")
-                log_file.write(e.stdout or "")
-                log_file.write(e.stderr or "")
-                log_file.close()
-                logger.notify("")
-                logger.notify(
-                    f"Erro ao executar GFZRNX. Veja o log em {filepath}.gfzrnx.log")
+                with logger.span("shift", backend=backend, file=filename):
+                    if backend == "native":
+                        shifted = self._shift_native(filepath, outfile, shift, progress)
+                    else:
+                        shifted = self._shift_gfzrnx(filepath, outfile, shift, progress)
+                if shifted:
+                    shifted = self._shift_navigation(family[1:], shift, progress)
+            except OperationCancelled:
+                self._remove_outputs(family)
+                logger.notify("Correção cancelada. O arquivo original não foi alterado.")
+                raise
+
+            if not shifted:
+                self._remove_outputs(family)
                 return False
 
-            filepath.rename(f"{filepath}.ORIGINAL")
-            logger.notify(
-                f"Arquivo original renomeado para: {filename}.ORIGINAL")
+            for path in family:
+                fixed = self.fixed_file(path)
+                if fixed == path:
+                    path.rename(f"{path}.ORIGINAL")
+                    logger.notify(
+                        f"Arquivo original renomeado para: {path.name}.ORIGINAL")
 
-            Path(outfile).rename(filepath)
-            logger.notify(f"Arquivo corrigido salvo como: {filename}")
+                Path(f"{fixed}.CORRIGIDO").rename(fixed)
+                logger.notify(f"Arquivo corrigido salvo como: {fixed.name}")
 
+            self.last_output = self.fixed_file(filepath)
             return True
 
-        except subprocess.CalledProcessError as e:
-            logger.notify(f"Saída de erro: {e.stderr}")
+        except (FileNotFoundError, PermissionError) as e:
+            # Missing input or gfzrnx binary
+            logger.error(e)
+            logger.notify(f"Erro: {e}")
+            return False
+
+    def _shift_gfzrnx(self, filepath, outfile, shift, progress=None) -> bool:
+        # asyncio and the binary lookup are only loaded when gfzrnx runs
+        import subprocess
+        from gfzrnx_executor import gfzrnx
+
+        def report_output_size():
+            # gfzrnx gives no progress, use the output size instead
+            if Path(outfile).exists():
+                progress.update(Path(outfile).stat().st_size)
+
+        try:
+            # Killed on cancellation; OperationCancelled reaches the caller
+            result = gfzrnx.shift_gpsw(
+                filepath, outfile, shift,
+                cancelled=(lambda: progress.cancelled) if progress else None,
+                on_poll=report_output_size if progress else None)
+        except subprocess.TimeoutExpired as e:
+            if Path(outfile).exists():
+                Path(outfile).unlink()
+            logger.notify("")
+            logger.notify(
+                f"Erro: o GFZRNX não terminou em {e.timeout} segundos")
+            return False
+
+        if result.returncode != 0:
+            log_file = open(f"{filepath}.gfzrnx.log", "w")
+            log_file.write(result.stdout)
+            log_file.write(result.stderr)
+            log_file.close()
+            logger.notify("")
+            logger.notify(
+                f"Erro ao executar GFZRNX. Veja o log em {filepath}.gfzrnx.log")
+            return False
+
+        if progress:
+            progress.update(progress.total)
+        return True
+
+    def _remove_outputs(self, family):
+        for path in family:
+            outfile = Path(f"{self.fixed_file(path)}.CORRIGIDO")
+            if outfile.exists():
+                outfile.unlink()
+
+    def _shift_navigation(self, nav_files, shift, progress=None) -> bool:
+        for nav_file in nav_files:
+            if progress:
+                progress.start("Corrigindo navegação", rinex_size(nav_file) or 0)
+            try:
+                with logger.span("shift_nav", file=nav_file.name):
+                    records = shift_rinex_nav_file(
+                        nav_file, f"{self.fixed_file(nav_file)}.CORRIGIDO",
+                        shift, progress)
+            except (OSError, ValueError) as e:
+                logger.error(e)
+                logger.notify("")
+                logger.notify(
+                    f"Erro ao corrigir o arquivo de navegação {nav_file.name}: {e}")
+                return False
+            logger.debug("Shifted %d navigation records of %s by %s weeks",
+                         records, nav_file.name, shift)
+        return True
+
+    def _shift_native(self, filepath, outfile, shift, progress=None) -> bool:
+        try:
+            epochs = shift_rinex_obs_file(filepath, outfile, shift, progress)
+        except (OSError, ValueError) as e:
+            logger.error(e)
+            logger.notify("")
+            logger.notify(f"Erro ao deslocar as épocas do arquivo: {e}")
+            if Path(outfile).exists():
+                Path(outfile).unlink()
             return False
+        logger.debug("Shifted %d epochs by %s weeks", epochs, shift)
+        return True
@@ -1,27 +1,75 @@
 #!/usr/bin/env python3
 
 import sys
-import zipfile
+import queue
+import threading
+from collections import deque
 import tkinter as tk
 import json
 
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
-from termcolor import colored
 
 from rinex_fixer import RinexFixer
 from rinex_filename_fixer import rinex_filename_fixer
-from logger import Observer, logger
+from rinex_compress import zip_rinex_family
+from logger import DEBUG, ERROR, INFO, Observer, logger
+from metadata_cache import metadata_cache
+from progress import OperationCancelled, Progress, format_throughput
+from rinex_trace import TraceObserver
 
 CONFIG_FILE = Path(__file__).with_suffix('.config')
+CACHE_FILE = Path(__file__).with_suffix('.cache')
+TRACE_FILE = Path(__file__).with_suffix('.trace.json')
+
+# Interval (ms) between polls of the worker queue
+POLL_INTERVAL = 50
+# Log widget refresh rate and scrollback
+LOG_FLUSH_FPS = 10
+MAX_LOG_LINES = 5000
 
 
 class GUILogObserver(Observer):
-    def __init__(self, text_widget):
+    """
+    Buffers messages, which may come from the worker thread, and writes
+    them to the Text widget from the Tk main loop at a fixed frame rate:
+    one `insert` + `see` per frame, whatever the number of messages.
+    Only the last `max_lines` lines are kept.
+    """
+
+    level = INFO
+
+    def __init__(self, text_widget, fps=LOG_FLUSH_FPS, max_lines=MAX_LOG_LINES):
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.interval = max(1, int(1000 / fps))
+        self.pending = deque()
+        self._schedule()
 
     def log(self, message):
-        self.text_widget.insert('end', message + "\n")
+        self.pending.append(message)
+
+    def _schedule(self):
+        self.text_widget.after(self.interval, self._flush_loop)
+
+    def _flush_loop(self):
+        self.flush()
+        self._schedule()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        messages = []
+        while self.pending:
+            messages.append(self.pending.popleft())
+
+        self.text_widget.insert('end', "\n".join(map(str, messages)) + "\n")
+
+        # 'end' is the line after the trailing newline
+        lines = int(self.text_widget.index('end-1c').split('.')[0])
+        if lines > self.max_lines:
+            self.text_widget.delete('1.0', f'{lines - self.max_lines}.0')
         self.text_widget.see('end')
 
 
@@ -29,20 +77,27 @@ class CLIDebugObserver(Observer):
     def __init__(self, debug_mode=False):
         self.debug_mode = debug_mode
 
+    @property
+    def level(self):
+        # Without debug mode only errors are printed
+        return DEBUG if self.debug_mode else ERROR
+
     def log(self, message):
         if (self.debug_mode):
             print(f"[LOG] {message}")
 
     def debug(self, message):
         if (self.debug_mode):
+            from termcolor import colored
             print(f"{colored('[DEBUG]: ','yellow')}{message}")
 
     def error(self, message):
+        from termcolor import colored
         print(f"{colored('[ERRO]: ','red')}{message}")
 
 
 class RinexGUI:
-    def __init__(self, debug_mode, root):
+    def __init__(self, debug_mode, root, backend="gfzrnx"):
         self.root = root
         self.root.configure(background='white')
         self.root.title("RINEX GPS Week Rollover Fixer")
@@ -51,6 +106,7 @@ class RinexGUI:
 
         self.config_station_id = "SSTR"
         self._load_config()
+        metadata_cache.load(CACHE_FILE)
 
         self.style = ttk.Style()
         self.style.configure('TLabel', font=(
@@ -60,7 +116,7 @@ class RinexGUI:
         self.style.configure('TEntry', font=('Segoe UI', 10))
         self.style.configure('TFrame', padding=10, background='white')
 
-        self.fixer = RinexFixer()
+        self.fixer = RinexFixer(backend)
 
         logger.add_observer(CLIDebugObserver(debug_mode))
 
@@ -101,14 +157,15 @@ class RinexGUI:
 
         self.result_log = tk.Text(
             main_frame,
-            height=13,
+            height=11,
             font=('Segoe UI', 10),
             background='white'
         )
         self.result_log.grid(row=1, column=0, columnspan=4,
                              pady=5,  sticky="nsew")
 
-        logger.add_observer(GUILogObserver(self.result_log))
+        self.log_observer = GUILogObserver(self.result_log)
+        logger.add_observer(self.log_observer)
 
         ttk.Label(
             main_frame,
@@ -144,6 +201,15 @@ class RinexGUI:
         )
         self.zip_button.grid(row=3, column=2, padx=2, pady=15, sticky=tk.EW)
 
+        self.cancel_button = ttk.Button(
+            main_frame,
+            text="Cancelar",
+            command=self.cancel_operation,
+            state='disabled',
+            style='TButton'
+        )
+        self.cancel_button.grid(row=3, column=1, padx=2, pady=15, sticky=tk.W)
+
         # Botão Sair
         self.exit_button = ttk.Button(
             main_frame,
@@ -153,8 +219,29 @@ class RinexGUI:
         )
         self.exit_button.grid(row=3, column=3, padx=2, pady=15, sticky=tk.E)
 
+        self.progress_bar = ttk.Progressbar(
+            main_frame,
+            mode='determinate',
+            maximum=100
+        )
+        self.progress_bar.grid(row=4, column=0, columnspan=3,
+                               padx=2, sticky=tk.EW)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(
+            main_frame,
+            textvariable=self.status_var,
+            style='TLabel'
+        ).grid(row=4, column=3, padx=2, sticky=tk.E)
+
         root.protocol("WM_DELETE_WINDOW", self._on_close)  # <-- Adicionado
 
+        # Worker thread -> Tk main loop
+        self.events = queue.Queue()
+        self.worker = None
+        self.cancel_event = None
+        self._poll_events()
+
         root.update_idletasks()
 
     def browse_file(self):
@@ -175,11 +262,12 @@ class RinexGUI:
             # self.file_name =
             self.fix_button['state'] = 'enabled'
             self.zip_button['state'] = 'enabled'
+            self.log_observer.flush()
             self.result_log.delete(1.0, tk.END)
             logger.notify(
-                f"Arquivo aberto: {file_path_obj.name}", tk.END)
+                f"Arquivo aberto: {file_path_obj.name}")
             logger.notify(
-                "Pronto para correção. Clique no botão 'Corrigir' para iniciar.", tk.END)
+                "Pronto para correção. Clique no botão 'Corrigir' para iniciar.")
 
     def fix_file(self):
         file_path = self.selected_file.get()
@@ -187,40 +275,51 @@ class RinexGUI:
             messagebox.showerror("Erro", "Selecione um arquivo para corrigir")
             return
 
-        try:
-            logger.notify("\nIniciando processo de correção...\n", tk.END)
-            logger.debug(f"Running rinex_filename_fixer() on {file_path}")
+        logger.notify("\nIniciando processo de correção...\n")
 
-            # Pega o station_id da caixa de texto
-            station_id = self.station_id_var.get().strip() or "SSTR"
+        # Pega o station_id da caixa de texto
+        station_id = self.station_id_var.get().strip() or "SSTR"
 
-            fixed_filename = rinex_filename_fixer(
-                file_path, station_id=station_id)
+        self._run_in_background(
+            lambda progress: self._fix_file_task(file_path, station_id, progress),
+            self._on_fix_done)
 
-            if (not fixed_filename):
-                return
+    def _fix_file_task(self, file_path, station_id, progress):
+        """Runs on the worker thread"""
+        logger.debug("Running rinex_filename_fixer() on %s", file_path)
+        progress.start("Renomeando")
 
-            file_path_obj = Path(file_path)
+        fixed_filename = rinex_filename_fixer(
+            file_path, station_id=station_id)
 
-            dir_path = file_path_obj.parent
-            rinex_pattern = f"{fixed_filename}.[0-9][0-9]O"
-            rinex_observation_files = list(dir_path.glob(rinex_pattern))
-            if not rinex_observation_files:
-                logger.notify("Arquivo de observação não encontrado")
-                return
-            rinex_observation_file = str(rinex_observation_files[0])
+        if (not fixed_filename):
+            return None
 
-            self.selected_file.set(rinex_observation_file)
+        file_path_obj = Path(file_path)
 
-            success = self.fixer.process_rinex_file(rinex_observation_file)
+        dir_path = file_path_obj.parent
+        rinex_pattern = f"{fixed_filename}.[0-9][0-9]O"
+        rinex_observation_files = list(dir_path.glob(rinex_pattern))
+        if not rinex_observation_files:
+            logger.notify("Arquivo de observação não encontrado")
+            return None
+        rinex_observation_file = str(rinex_observation_files[0])
 
-            if success:
-                logger.notify("Correção concluída com sucesso!")
-            else:
-                messagebox.showerror("Erro", "Erro ao corrigir o arquivo")
-        except Exception as e:
-            logger.error(e)
-            messagebox.showerror("Erro", f"Erro ao corrigir arquivo: {str(e)}")
+        # The file is already renamed, even if the shift is cancelled
+        self.events.put(("selected_file", rinex_observation_file))
+
+        return self.fixer.process_rinex_file(rinex_observation_file, progress)
+
+    def _on_fix_done(self, success, error):
+        if isinstance(error, OperationCancelled):
+            return
+        if error is not None:
+            logger.error(error)
+            messagebox.showerror("Erro", f"Erro ao corrigir arquivo: {str(error)}")
+        elif success:
+            logger.notify("Correção concluída com sucesso!")
+        elif success is False:
+            messagebox.showerror("Erro", "Erro ao corrigir o arquivo")
 
     def zip_rinex_files(self):
         file_path = self.selected_file.get()
@@ -228,30 +327,91 @@ class RinexGUI:
             messagebox.showerror("Erro", "Selecione um arquivo para comprimir")
             return
 
-        try:
-            file_path_obj = Path(file_path)
-            file_dir = file_path_obj.parent
-            base_name = file_path_obj.stem
-            pattern = f"{base_name}.[0-9][0-9][G,N,O]"
-            rinex_files = list(file_dir.glob(pattern))
-            if not rinex_files:
-                messagebox.showerror(
-                    "Erro", "Nenhum arquivo RINEX encontrado para compressão")
-                return
-
-            zip_filename = file_dir / f"{base_name}_RINEX.zip"
-            with zipfile.ZipFile(str(zip_filename), 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file in rinex_files:
-                    zipf.write(str(file), file.name)
-            logger.notify(
-                f"\nArquivos comprimidos com sucesso em: {zip_filename}", tk.END)
-            logger.notify("Arquivos incluídos:", tk.END)
-            for file in rinex_files:
-                logger.notify(f"- {file.name}", tk.END)
-        except Exception as e:
-            logger.error(e)
+        self._run_in_background(
+            lambda progress: zip_rinex_family(file_path, progress),
+            self._on_zip_done)
+
+    def _on_zip_done(self, zip_filename, error):
+        if isinstance(error, OperationCancelled):
+            return
+        if error is not None:
+            logger.error(error)
+            messagebox.showerror(
+                "Erro", f"Erro ao comprimir arquivos: {str(error)}")
+        elif not zip_filename:
             messagebox.showerror(
-                "Erro", f"Erro ao comprimir arquivos: {str(e)}")
+                "Erro", "Nenhum arquivo RINEX encontrado para compressão")
+
+    def cancel_operation(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button['state'] = 'disabled'
+            self.status_var.set("Cancelando...")
+
+    def _run_in_background(self, task, on_done):
+        """
+        Runs `task(progress)` on a worker thread; `on_done(result, error)`
+        is called back on the Tk main loop when it finishes.
+        """
+        if self.worker is not None and self.worker.is_alive():
+            return
+
+        self.cancel_event = threading.Event()
+        progress = Progress(
+            lambda data: self.events.put(("progress", data)), self.cancel_event)
+
+        def run():
+            try:
+                self.events.put(("done", on_done, task(progress), None))
+            except Exception as e:
+                self.events.put(("done", on_done, None, e))
+
+        self._set_running(True)
+        self.worker = threading.Thread(target=run, daemon=True)
+        self.worker.start()
+
+    def _set_running(self, running):
+        state = 'disabled' if running else 'enabled'
+        self.fix_button['state'] = state
+        self.zip_button['state'] = state
+        self.cancel_button['state'] = 'enabled' if running else 'disabled'
+        if not running:
+            self.progress_bar['value'] = 0
+            self.status_var.set("")
+
+    def _poll_events(self):
+        last_progress = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if event[0] == "progress":
+                last_progress = event[1]
+            elif event[0] == "selected_file":
+                self.selected_file.set(event[1])
+            elif event[0] == "done":
+                _, on_done, result, error = event
+                self.log_observer.flush()
+                last_progress = None
+                self._set_running(False)
+                on_done(result, error)
+
+        if last_progress is not None:
+            self._show_progress(last_progress)
+
+        self.root.after(POLL_INTERVAL, self._poll_events)
+
+    def _show_progress(self, data):
+        if data["total"]:
+            self.progress_bar['value'] = 100 * data["bytes"] / data["total"]
+        status = data["stage"] or ""
+        if data["epochs"]:
+            status = f"{status} ({data['epochs']} épocas)"
+        if data["bytes_per_s"]:
+            status = f"{status} - {format_throughput(data)}"
+        self.status_var.set(status)
 
     def _load_config(self):
         try:
@@ -287,16 +447,36 @@ class RinexGUI:
             pass
 
     def _on_close(self):
+        if self.worker is not None and self.worker.is_alive():
+            # Let the worker clean up its partial output before exiting
+            self.cancel_event.set()
+            self.worker.join(timeout=5)
         self._save_config()
+        try:
+            metadata_cache.save(CACHE_FILE)
+        except OSError:
+            pass
         self.root.destroy()
 
 
 def main():
     root = tk.Tk()
     debug_mode = any(arg in ("--debug", "-D") for arg in sys.argv)
-    RinexGUI(debug_mode, root)
+    backend = "native" if "--native" in sys.argv else "gfzrnx"
+
+    tracer = None
+    if "--trace" in sys.argv:
+        tracer = TraceObserver(TRACE_FILE)
+        logger.add_observer(tracer)
+
+    RinexGUI(debug_mode, root, backend)
     root.mainloop()
 
+    if tracer:
+        tracer.close()
+        print(tracer.summary())
+        print(f"Trace saved to {TRACE_FILE}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+"""
+Pure-Python Compact RINEX (Hatanaka) 1.0 encoder/decoder for RINEX 2
+observation files, written as line-streaming stages.
+
+Each epoch of a CRX 1.0 file has:
+    - the epoch line (first 32 columns + the whole satellite list),
+      written in full after a '&' on the first epoch and after events,
+      otherwise as a text difference against the previous epoch line;
+    - the receiver clock offset line (empty if there is none);
+    - one line per satellite with the observations as integer
+      differences (an arc starts with "<order>&<value>") followed by
+      the LLI/SSI flags as a text difference.
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from rinex_io import buffer_size
+from rinex_reader import (END_OF_HEADER, OBS_PER_LINE_V2, SATS_PER_LINE_V2,
+                          obs_lines_per_satellite)
+
+CRX_VERSION = "1.0"
+CRX_VERSION_LABEL = "CRINEX VERS   / TYPE"
+CRX_PROG_LABEL = "CRINEX PROG / DATE"
+PROGRAM_NAME = "rinex_hatanaka"
+
+# Differencing order of the observation and clock arcs
+OBS_ARC_ORDER = 3
+CLOCK_ARC_ORDER = 2
+
+OBS_DECIMALS = 3
+CLOCK_DECIMALS = 9
+FIELD_WIDTH = 16
+
+
+class _Arc:
+    """State of one differenced data arc (value and its differences)"""
+
+    __slots__ = ("max_order", "diffs")
+
+    def __init__(self, value, max_order):
+        self.max_order = max_order
+        self.diffs = [value]
+
+    def diff(self, value):
+        # Encoder: returns the highest-order difference of `value`
+        previous = self.diffs
+        current = [value]
+        for k in range(min(len(previous), self.max_order)):
+            current.append(current[k] - previous[k])
+        self.diffs = current
+        return current[-1]
+
+    def undiff(self, difference):
+        # Decoder: rebuilds the value from its highest-order difference
+        previous = self.diffs
+        order = min(len(previous), self.max_order)
+        current = [0] * order + [difference]
+        for k in range(order - 1, -1, -1):
+            current[k] = previous[k] + current[k + 1]
+        self.diffs = current
+        return current[0]
+
+
+def _parse_fixed(text, decimals):
+    """'-1234.567' -> -1234567 (for decimals=3); blank -> None"""
+    text = text.strip()
+    if not text:
+        return None
+    negative = text.startswith("-")
+    whole, _, frac = text.lstrip("+-").partition(".")
+    frac = (frac + "0" * decimals)[:decimals]
+    value = int(whole or "0") * 10 ** decimals + int(frac or "0")
+    return -value if negative else value
+
+
+def _format_fixed(value, decimals, width):
+    whole, frac = divmod(abs(value), 10 ** decimals)
+    sign = "-" if value < 0 else ""
+    return f"{sign}{whole}.{frac:0{decimals}d}".rjust(width)
+
+
+def _text_diff(old, new):
+    """
+    Character difference used for epoch lines and flags: unchanged
+    characters become ' ', characters blanked in `new` become '&'.
+    """
+    size = max(len(old), len(new))
+    old, new = old.ljust(size), new.ljust(size)
+    return "".join(
+        " " if n == o else ("&" if n == " " else n)
+        for o, n in zip(old, new)).rstrip()
+
+
+def _text_apply(old, diff):
+    size = max(len(old), len(diff))
+    old, diff = old.ljust(size), diff.ljust(size)
+    return "".join(
+        o if d == " " else (" " if d == "&" else d)
+        for o, d in zip(old, diff)).rstrip()
+
+
+class _NumberedLines:
+    """Line iterator counting the lines read, for the error messages"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self.number = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.number += 1
+        return line
+
+    def record_line(self):
+        """Next line of an epoch record, which cannot be missing"""
+        try:
+            return next(self)
+        except StopIteration:
+            raise ValueError(f"Line {self.number}: the file ends inside an "
+                             f"epoch record") from None
+
+
+def _crinex_header():
+    date = datetime.now(timezone.utc).strftime("%d-%b-%y %H:%M")
+    return [
+        f"{CRX_VERSION:<20}{'COMPACT RINEX FORMAT':<40}{CRX_VERSION_LABEL:<20}\n",
+        f"{PROGRAM_NAME:<40}{date:<20}{CRX_PROG_LABEL:<20}\n",
+    ]
+
+
+def _copy_header(lines, output):
+    """Yields header lines up to END OF HEADER; returns the obs type count"""
+    obs_types = 0
+    for line in lines:
+        label = line[60:].strip()
+        if label == "# / TYPES OF OBSERV" and line[:6].strip():
+            obs_types = int(line[:6])
+        output.append(line if line.endswith("\n") else line + "\n")
+        if label == END_OF_HEADER:
+            return obs_types
+    raise ValueError("END OF HEADER not found")
+
+
+def iter_crinex_lines(lines):
+    """
+    Generator converting the lines of a RINEX 2 observation file into
+    Compact RINEX 1.0 lines (each ending with a newline).
+    A line that is not an epoch line where one is expected, or a file
+    ending inside an epoch record, raises ValueError with its number.
+    """
+    lines = _NumberedLines(lines)
+    header = _crinex_header()
+    obs_types = _copy_header(lines, header)
+    yield from header
+
+    lines_per_sat = obs_lines_per_satellite({"obs_types": obs_types})
+    epoch_ref = None
+    clock_arc = None
+    satellites = {}
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        if (len(line) < 32 or not line[28:29].isdigit()
+                or not line[29:32].strip().isdigit()):
+            raise ValueError(f"Line {lines.number}: not a RINEX 2 epoch line: "
+                             f"{line!r}")
+
+        flag = line[28]
+        count = int(line[29:32])
+
+        if flag in "2345":
+            # Events are written in full and restart every arc
+            yield "&" + line[1:] + "\n"
+            for _ in range(count):
+                yield lines.record_line()
+            epoch_ref, clock_arc, satellites = None, None, {}
+            continue
+
+        sats = line[32:32 + 3 * min(count, SATS_PER_LINE_V2)]
+        for _ in range((count - 1) // SATS_PER_LINE_V2 if count else 0):
+            remaining = count - len(sats) // 3
+            continuation = lines.record_line()
+            sats += continuation[32:32 + 3 * min(remaining, SATS_PER_LINE_V2)]
+
+        epoch_text = line[:32] + sats
+        if epoch_ref is None:
+            yield "&" + epoch_text[1:] + "\n"
+        else:
+            yield _text_diff(epoch_ref, epoch_text) + "\n"
+        epoch_ref = epoch_text
+
+        clock = _parse_fixed(line[68:80], CLOCK_DECIMALS)
+        if clock is None:
+            clock_arc = None
+            yield "\n"
+        elif clock_arc is None:
+            clock_arc = _Arc(clock, CLOCK_ARC_ORDER)
+            yield f"{CLOCK_ARC_ORDER}&{clock}\n"
+        else:
+            yield f"{clock_arc.diff(clock)}\n"
+
+        current = {}
+        for i in range(count):
+            sat = sats[3 * i:3 * i + 3]
+            data = "".join(lines.record_line().rstrip("\r\n").ljust(80)
+                           for _ in range(lines_per_sat))
+            arcs, flags_ref = satellites.get(sat) or ([None] * obs_types, "")
+
+            fields = []
+            flags = []
+            for j in range(obs_types):
+                field = data[FIELD_WIDTH * j:FIELD_WIDTH * (j + 1)]
+                value = _parse_fixed(field[:14], OBS_DECIMALS)
+                flags.append(field[14:16].ljust(2))
+                if value is None:
+                    arcs[j] = None
+                    fields.append("")
+                elif arcs[j] is None:
+                    arcs[j] = _Arc(value, OBS_ARC_ORDER)
+                    fields.append(f"{OBS_ARC_ORDER}&{value}")
+                else:
+                    fields.append(str(arcs[j].diff(value)))
+
+            flags = "".join(flags)
+            flags_diff = _text_diff(flags_ref, flags)
+            if flags_diff:
+                yield " ".join(fields) + " " + flags_diff + "\n"
+            else:
+                yield " ".join(fields).rstrip() + "\n"
+            current[sat] = (arcs, flags)
+
+        satellites = current
+
+
+def iter_rinex_lines(lines):
+    """
+    Generator converting the lines of a Compact RINEX 1.0 file back
+    into RINEX 2 observation lines (each ending with a newline).
+    """
+    lines = iter(lines)
+    first = next(lines, "")
+    if first[60:].strip() != CRX_VERSION_LABEL:
+        raise ValueError("Not a Compact RINEX file")
+    if first[:20].strip() != CRX_VERSION:
+        raise ValueError(f"Unsupported Compact RINEX version: {first[:20].strip()}")
+    next(lines)  # CRINEX PROG / DATE
+
+    header = []
+    obs_types = _copy_header(lines, header)
+    yield from header
+
+    epoch_ref = ""
+    clock_arc = None
+    satellites = {}
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("&"):
+            epoch_text = " " + line[1:]
+        else:
+            epoch_text = _text_apply(epoch_ref, line)
+        epoch_ref = epoch_text
+
+        flag = epoch_text[28:29]
+        count = int(epoch_text[29:32] or 0)
+
+        if flag in ("2", "3", "4", "5"):
+            yield epoch_text + "\n"
+            for _ in range(count):
+                yield next(lines)
+            clock_arc, satellites = None, {}
+            continue
+
+        clock_line = next(lines).rstrip("\r\n")
+        if not clock_line:
+            clock_arc = None
+            clock = None
+        elif "&" in clock_line:
+            order, value = clock_line.split("&")
+            clock = int(value)
+            clock_arc = _Arc(clock, int(order))
+        else:
+            clock = clock_arc.undiff(int(clock_line))
+
+        sats = epoch_text[32:]
+        first_line = epoch_text[:32] + sats[:3 * SATS_PER_LINE_V2]
+        if clock is not None:
+            first_line = first_line.ljust(68) + _format_fixed(clock, CLOCK_DECIMALS, 12)
+        yield first_line + "\n"
+        for k in range(3 * SATS_PER_LINE_V2, len(sats), 3 * SATS_PER_LINE_V2):
+            yield " " * 32 + sats[k:k + 3 * SATS_PER_LINE_V2] + "\n"
+
+        current = {}
+        for i in range(count):
+            sat = sats[3 * i:3 * i + 3]
+            parts = next(lines).rstrip("\r\n").split(" ", obs_types)
+            parts += [""] * (obs_types + 1 - len(parts))
+            arcs, flags_ref = satellites.get(sat) or ([None] * obs_types, "")
+
+            flags = _text_apply(flags_ref, parts[obs_types]).ljust(2 * obs_types)
+            fields = []
+            for j in range(obs_types):
+                text = parts[j]
+                if not text:
+                    arcs[j] = None
+                    value = None
+                elif "&" in text:
+                    order, text = text.split("&")
+                    value = int(text)
+                    arcs[j] = _Arc(value, int(order))
+                else:
+                    value = arcs[j].undiff(int(text))
+
+                value_text = " " * 14 if value is None else \
+                    _format_fixed(value, OBS_DECIMALS, 14)
+                fields.append(value_text + flags[2 * j:2 * j + 2])
+
+            for k in range(0, obs_types, OBS_PER_LINE_V2):
+                yield "".join(fields[k:k + OBS_PER_LINE_V2]).rstrip() + "\n"
+            current[sat] = (arcs, flags)
+
+        satellites = current
+
+
+def is_crinex_file(path):
+    with open(path, "r", encoding="latin-1") as f:
+        return f.readline()[60:].strip() == CRX_VERSION_LABEL
+
+
+def crinex_filename(rinex_file):
+    """base.yyO -> base.yyD"""
+    path = Path(rinex_file)
+    return path.with_suffix(path.suffix[:-1] + ("d" if path.suffix[-1:] == "o" else "D"))
+
+
+def rinex_filename(crinex_file):
+    """base.yyD -> base.yyO"""
+    path = Path(crinex_file)
+    return path.with_suffix(path.suffix[:-1] + ("o" if path.suffix[-1:] == "d" else "O"))
+
+
+def compress_obs_file(rinex_file, crinex_file=None):
+    """
+    Hatanaka-compresses a RINEX 2 observation file (.yyO -> .yyD)
+
+    Returns:
+        Path: the Compact RINEX file
+    """
+    crinex_file = Path(crinex_file or crinex_filename(rinex_file))
+    with open(rinex_file, "r", encoding="latin-1", buffering=buffer_size()) as src, \
+            open(crinex_file, "w", encoding="latin-1", newline="\n",
+                 buffering=buffer_size()) as dst:
+        dst.writelines(iter_crinex_lines(src))
+    return crinex_file
+
+
+def decompress_crx_file(crinex_file, rinex_file=None):
+    """
+    Restores a RINEX 2 observation file from Compact RINEX (.yyD -> .yyO)
+
+    Returns:
+        Path: the RINEX file
+    """
+    rinex_file = Path(rinex_file or rinex_filename(crinex_file))
+    with open(crinex_file, "r", encoding="latin-1", buffering=buffer_size()) as src, \
+            open(rinex_file, "w", encoding="latin-1", newline="\n",
+                 buffering=buffer_size()) as dst:
+        dst.writelines(iter_rinex_lines(src))
+    return rinex_file
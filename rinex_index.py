@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from gps_time import NS_PER_SECOND, GPSTime, _seconds_to_ns, full_year
+from logger import logger
+from rinex_io import buffer_size, open_output
+from rinex_reader import (END_OF_HEADER, epoch_record_length, is_epoch_line,
+                          obs_lines_per_satellite, obs_time_line,
+                          read_rinex_header)
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"RNXIDX01"
+# magic, source size, source mtime (ns), epochs, gaps, interval (s), header size
+INDEX_HEADER = struct.Struct("<8sqqqqdq")
+
+
+def _epoch_line_to_gps_ns(line, day_cache):
+    """GPS time of a RINEX 2 epoch line (bytes), in ns since the GPS epoch"""
+    day_key = line[1:9]
+    day_ns = day_cache.get(day_key)
+    if day_ns is None:
+        day_ns = GPSTime.from_calendar(full_year(line[1:3]), int(line[4:6]),
+                                       int(line[7:9])).total_ns
+        day_cache[day_key] = day_ns
+
+    seconds = int(line[10:12]) * 3600 + int(line[13:15]) * 60
+    return (day_ns + seconds * NS_PER_SECOND
+            + _seconds_to_ns(line[15:26].decode("ascii")))
+
+
+class EpochIndex:
+    """
+    Byte offset, GPS time and satellite count of every epoch record of
+    a RINEX 2 observation file, kept in typed arrays.
+    """
+
+    def __init__(self, offsets, times, sat_counts, gaps, interval,
+                 header_size, source_size=0, source_mtime_ns=0):
+        self.offsets = offsets          # array('q'): byte offset of each epoch line
+        self.times = times              # array('q'): GPS time in ns
+        self.sat_counts = sat_counts    # array('H')
+        self.gaps = gaps                # array('q'): epoch numbers starting a gap
+        self.interval = interval        # seconds
+        self.header_size = header_size  # bytes up to END OF HEADER
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def first_epoch(self):
+        return self.times[0] if self.times else None
+
+    @property
+    def last_epoch(self):
+        return self.times[-1] if self.times else None
+
+    def gap_ranges(self):
+        """
+        Returns:
+            list: (last epoch before, first epoch after) GPS ns of each gap
+        """
+        return [(self.times[i - 1], self.times[i]) for i in self.gaps]
+
+    def epoch_range(self, start_ns=None, end_ns=None):
+        """Epoch numbers [first, last) inside the time window [start_ns, end_ns]"""
+        first = 0 if start_ns is None else bisect_left(self.times, start_ns)
+        last = len(self.times) if end_ns is None else bisect_right(self.times, end_ns)
+        return first, last
+
+    def is_current(self, rinex_file):
+        stat = os.stat(rinex_file)
+        return (stat.st_size == self.source_size
+                and stat.st_mtime_ns == self.source_mtime_ns)
+
+    def save(self, index_file):
+        with open(index_file, "wb") as f:
+            f.write(INDEX_HEADER.pack(
+                INDEX_MAGIC, self.source_size, self.source_mtime_ns,
+                len(self.times), len(self.gaps), self.interval or 0.0,
+                self.header_size))
+            for values in (self.offsets, self.times, self.gaps, self.sat_counts):
+                _little_endian(values).tofile(f)
+
+    @classmethod
+    def load(cls, index_file):
+        with open(index_file, "rb") as f:
+            (magic, source_size, source_mtime_ns, count, gap_count, interval,
+             header_size) = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"Not an epoch index file: {index_file}")
+
+            offsets, times, gaps, sat_counts = (
+                array("q"), array("q"), array("q"), array("H"))
+            offsets.fromfile(f, count)
+            times.fromfile(f, count)
+            gaps.fromfile(f, gap_count)
+            sat_counts.fromfile(f, count)
+
+        for values in (offsets, times, gaps, sat_counts):
+            _little_endian(values)
+
+        return cls(offsets, times, sat_counts, gaps, interval or None,
+                   header_size, source_size, source_mtime_ns)
+
+
+def _little_endian(values):
+    # The sidecar is always little-endian; byteswap() is its own inverse
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def build_epoch_index(rinex_file):
+    """
+    Memory-maps a RINEX 2 observation file and records every epoch
+    record, reading only the epoch lines.
+
+    Returns:
+        EpochIndex
+    """
+    stat = os.stat(rinex_file)
+    if not stat.st_size:
+        # mmap cannot map an empty file
+        raise ValueError(f"Not a RINEX observation file (empty): {rinex_file}")
+    offsets, times, sat_counts = array("q"), array("q"), array("H")
+    day_cache = {}
+
+    with open(rinex_file, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        label_pos = mm.find(END_OF_HEADER.encode("ascii"))
+        if label_pos < 0:
+            raise ValueError("END OF HEADER not found")
+        header_size = mm.find(b"\n", label_pos) + 1 or len(mm)
+
+        header_lines = mm[:header_size].decode("latin-1").splitlines(True)
+        header = read_rinex_header(iter(header_lines))
+        lines_per_sat = obs_lines_per_satellite(header)
+
+        pos = header_size
+        size = len(mm)
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            end = size if end < 0 else end + 1
+            line = mm[pos:end]
+
+            follow = 0
+            if is_epoch_line(line):
+                follow = epoch_record_length(line[:32].decode("latin-1"),
+                                             lines_per_sat)
+                # Only regular epochs (flags 0, 1) carry observations to index
+                if line[28:29] in b"01" and line[1:9].strip():
+                    offsets.append(pos)
+                    times.append(_epoch_line_to_gps_ns(line, day_cache))
+                    sat_counts.append(int(line[29:32]))
+
+            pos = end
+            for _ in range(follow):
+                end = mm.find(b"\n", pos)
+                pos = size if end < 0 else end + 1
+
+    interval = header["interval"] or _guess_interval(times)
+    gaps = _find_gaps(times, interval)
+
+    logger.debug("Indexed %d epochs, %d gaps in %s",
+                 len(times), len(gaps), rinex_file)
+
+    return EpochIndex(offsets, times, sat_counts, gaps, interval,
+                      header_size, stat.st_size, stat.st_mtime_ns)
+
+
+def _guess_interval(times):
+    if len(times) < 2:
+        return None
+    steps = [times[i + 1] - times[i] for i in range(min(len(times) - 1, 100))]
+    return max(set(steps), key=steps.count) / NS_PER_SECOND
+
+
+def _find_gaps(times, interval):
+    gaps = array("q")
+    if not interval:
+        return gaps
+    max_step = interval * NS_PER_SECOND * 1.5
+    for i in range(1, len(times)):
+        if times[i] - times[i - 1] > max_step:
+            gaps.append(i)
+    return gaps
+
+
+def find_epoch_index(rinex_file):
+    """
+    The sidecar index (<file>.idx) of `rinex_file` if there is one and
+    the file did not change since it was built, else None (never scans
+    the RINEX file)
+    """
+    try:
+        index = EpochIndex.load(f"{rinex_file}{INDEX_SUFFIX}")
+        if index.is_current(rinex_file):
+            return index
+    except (OSError, ValueError, EOFError, struct.error):
+        pass
+    return None
+
+
+def load_epoch_index(rinex_file, save=True):
+    """
+    Loads the sidecar index (<file>.idx) of `rinex_file`, rebuilding it
+    when missing or when the RINEX file changed since it was built.
+    """
+    index = find_epoch_index(rinex_file)
+    if index is not None:
+        return index
+
+    index = build_epoch_index(rinex_file)
+    if save:
+        index.save(f"{rinex_file}{INDEX_SUFFIX}")
+    return index
+
+
+def extract_time_window(rinex_file, output_file, start_ns=None, end_ns=None,
+                        index=None):
+    """
+    Writes the epochs of `rinex_file` inside [start_ns, end_ns] to
+    `output_file`, seeking straight to them through the epoch index.
+    The TIME OF FIRST/LAST OBS records are updated to the window.
+
+    Returns:
+        int: number of epochs written
+    """
+    index = index or load_epoch_index(rinex_file)
+    first, last = index.epoch_range(start_ns, end_ns)
+    if first >= last:
+        return 0
+
+    with open(rinex_file, "rb") as src, open_output(output_file) as dst:
+        header = src.read(index.header_size)
+        for line in header.splitlines(True):
+            label = line[60:].strip()
+            if label == b"TIME OF FIRST OBS":
+                line = obs_time_line(GPSTime.from_ns(index.times[first]),
+                                     "TIME OF FIRST OBS")
+            elif label == b"TIME OF LAST OBS":
+                line = obs_time_line(GPSTime.from_ns(index.times[last - 1]),
+                                     "TIME OF LAST OBS")
+            dst.write(line)
+
+        start = index.offsets[first]
+        end = index.offsets[last] if last < len(index) else index.source_size
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(remaining, buffer_size()))
+            if not chunk:
+                break
+            dst.write(chunk)
+            remaining -= len(chunk)
+
+    return last - first
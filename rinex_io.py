@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+"""
+Input layer for compressed RINEX files: gzip (.gz), Unix compress (.Z)
+and zip archives are opened as streams of the plain RINEX content,
+decoding Compact RINEX (Hatanaka) on the fly, so the native stages
+(metadata, shift, re-date) read them without temporary files.
+
+    with open_rinex("SSTR0970.99D.Z") as f:   # yields RINEX .99O lines
+        for line in f:
+            ...
+
+It also sets the buffer size of every file-rewriting stage (shift,
+split, re-date, pipeline, Hatanaka, zip), which all stream line by line:
+their peak memory is a constant, one read and one write buffer of
+buffer_size() (1 MiB by default) plus one epoch record, whatever the
+file size. A .Z input adds the LZW table (at most 64 Ki strings) and a
+zip member one compression block of buffer_size().
+"""
+
+import io
+import os
+import re
+from pathlib import Path
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+MIN_BUFFER_SIZE = 64 * 1024
+# Inherited by worker processes
+BUFFER_SIZE_ENV = "RINEX_BUFFER_SIZE"
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)(?:i?[bB])?\s*$")
+# Compressed bytes read per step when decoding a .Z file
+LZW_CHUNK_SIZE = 64 * 1024
+# Decoded Compact RINEX lines handed over per step
+CRX_LINES_PER_CHUNK = 4096
+
+LZW_MAGIC = b"\x1f\x9d"
+LZW_INIT_BITS = 9
+LZW_MAX_BITS = 16
+LZW_CLEAR = 256
+
+# ssssdddf.yyO / .yyD (RINEX 2 observation, plain or Compact RINEX)
+OBS_NAME_PATTERN = re.compile(r"\.\d\d[oOdD]$")
+
+
+def parse_size(text):
+    """ "4M" -> 4194304 (K, M, G units, binary)"""
+    match = SIZE_PATTERN.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid size: {text!r}")
+    size = int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+    if size < MIN_BUFFER_SIZE:
+        raise ValueError(f"Buffer size must be at least {MIN_BUFFER_SIZE} bytes")
+    return size
+
+
+def buffer_size():
+    """I/O buffer size of the streaming stages, in bytes"""
+    size = os.environ.get(BUFFER_SIZE_ENV)
+    return parse_size(size) if size else DEFAULT_BUFFER_SIZE
+
+
+def set_buffer_size(size):
+    """Sets buffer_size(), for this process and the ones it starts"""
+    os.environ[BUFFER_SIZE_ENV] = str(parse_size(size))
+
+
+def open_output(path):
+    """Opens `path` for binary writing with buffer_size()"""
+    return open(path, "wb", buffering=buffer_size())
+
+
+def compression_suffix(path):
+    """".gz", ".Z", ".zip", or "" for a file that is not compressed"""
+    suffix = Path(path).suffix
+    if suffix == ".Z":
+        return suffix
+    if suffix.lower() in (".gz", ".zip"):
+        return suffix.lower()
+    return ""
+
+
+def is_compressed(path):
+    return bool(compression_suffix(path))
+
+
+def strip_compression(path):
+    """SSTR0970.99O.gz -> SSTR0970.99O (zip archives are left as they are)"""
+    path = Path(path)
+    if compression_suffix(path) in (".gz", ".Z"):
+        return path.with_suffix("")
+    return path
+
+
+def _zip_member(archive, member=None):
+    """The RINEX member of a zip archive: `member`, or the only one"""
+    import zipfile
+
+    with zipfile.ZipFile(archive) as zf:
+        names = [name for name in zf.namelist() if not name.endswith("/")]
+    if member is not None:
+        if member not in names:
+            raise FileNotFoundError(f"{archive}: no member named {member}")
+        return member
+    if len(names) == 1:
+        return names[0]
+    observations = [name for name in names if OBS_NAME_PATTERN.search(name)]
+    if len(observations) == 1:
+        return observations[0]
+    raise ValueError(f"{archive}: ambiguous RINEX member, choose one of {names}")
+
+
+def rinex_name(path, member=None):
+    """Name of the RINEX file stored in `path` (the zip member for archives)"""
+    if compression_suffix(path) == ".zip":
+        return Path(_zip_member(path, member)).name
+    return strip_compression(path).name
+
+
+def decoded_path(path, member=None):
+    """
+    Plain file holding the decoded content of `path`, next to it:
+    compression suffixes are dropped and Compact RINEX names become
+    observation names (SSTR0970.99D.Z -> SSTR0970.99O)
+    """
+    from rinex_hatanaka import rinex_filename
+
+    name = Path(path).parent / rinex_name(path, member)
+    if OBS_NAME_PATTERN.search(name.name) and name.suffix[-1:] in ("d", "D"):
+        return rinex_filename(name)
+    return name
+
+
+def compressed_variant(path):
+    """`path` itself, or path.gz / path.Z if only a compressed copy exists"""
+    path = Path(path)
+    for candidate in (path, Path(f"{path}.gz"), Path(f"{path}.Z")):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def rinex_size(path, member=None):
+    """
+    Size of the RINEX content of `path` when known without decoding it,
+    for progress reporting: exact for plain, zip and gzip files (modulo
+    4 GiB), None for .Z files and Compact RINEX
+    """
+    path = Path(path)
+    suffix = compression_suffix(path)
+    if decoded_path(path, member).name != rinex_name(path, member):
+        return None
+    if suffix == ".zip":
+        import zipfile
+        with zipfile.ZipFile(path) as zf:
+            return zf.getinfo(_zip_member(path, member)).file_size
+    if suffix == ".gz":
+        # ISIZE: the last 4 bytes of the last gzip member
+        with open(path, "rb") as f:
+            f.seek(-4, io.SEEK_END)
+            return int.from_bytes(f.read(4), "little")
+    if suffix == ".Z":
+        return None
+    return path.stat().st_size
+
+
+class LZWDecompressor:
+    """
+    Incremental decoder of the Unix compress(1) format (.Z, LZW with 9
+    to 16 bit codes). Feed it with decompress() and call flush() once
+    the input is exhausted.
+    """
+
+    def __init__(self):
+        self._header = b""
+        self._pending = b""
+        self._max_bits = None
+        self._block_mode = False
+        self._bits = LZW_INIT_BITS
+        self._table = []
+        self._prev = None
+
+    def _start(self, header):
+        if header[:2] != LZW_MAGIC:
+            raise ValueError("Not a compress (.Z) file")
+        self._max_bits = header[2] & 0x1f
+        self._block_mode = bool(header[2] & 0x80)
+        if not LZW_INIT_BITS <= self._max_bits <= LZW_MAX_BITS:
+            raise ValueError(f"Unsupported .Z code size: {self._max_bits} bits")
+        self._reset()
+
+    def _reset(self):
+        self._bits = LZW_INIT_BITS
+        self._table = [bytes((i,)) for i in range(256)]
+        if self._block_mode:
+            # CLEAR takes a code, never an entry
+            self._table.append(b"")
+        self._prev = None
+
+    def decompress(self, data):
+        """Decodes `data`, keeping an incomplete code group for the next call"""
+        if self._max_bits is None:
+            self._header += data
+            if len(self._header) < 3:
+                return b""
+            data = self._header[3:]
+            self._start(self._header[:3])
+        self._pending += data
+        return self._decode(final=False)
+
+    def flush(self):
+        """Decodes the last, incomplete, code group"""
+        if self._max_bits is None:
+            if self._header:
+                raise EOFError("Truncated .Z header")
+            return b""
+        return self._decode(final=True)
+
+    def _decode(self, final):
+        # compress(1) writes the codes in groups of 8, i.e. `bits` bytes;
+        # a code size change or a CLEAR skips the rest of the group
+        data = self._pending
+        table = self._table
+        prev = self._prev
+        max_entries = 1 << self._max_bits
+        out = []
+        pos = 0
+
+        while True:
+            bits = self._bits
+            group_size = bits if len(data) - pos >= bits else len(data) - pos
+            if not group_size or (group_size < bits and not final):
+                break
+            group = int.from_bytes(data[pos:pos + group_size], "little")
+            pos += group_size
+            mask = (1 << bits) - 1
+
+            for _ in range(group_size * 8 // bits):
+                code = group & mask
+                group >>= bits
+
+                if code == LZW_CLEAR and self._block_mode:
+                    self._reset()
+                    table, prev = self._table, None
+                    break
+
+                if prev is None:
+                    if code >= 256:
+                        raise ValueError(f"Corrupt .Z data: first code {code}")
+                    entry = table[code]
+                else:
+                    if code < len(table):
+                        entry = table[code]
+                    elif code == len(table):
+                        entry = prev + prev[:1]
+                    else:
+                        raise ValueError(f"Corrupt .Z data: code {code}")
+                    if len(table) < max_entries:
+                        table.append(prev + entry[:1])
+                out.append(entry)
+                prev = entry
+
+                # As in compress(1), 9 bit files also grow to 10 bits
+                if len(table) > mask and (bits < self._max_bits
+                                          or bits == LZW_INIT_BITS):
+                    self._bits += 1
+                    break
+
+        self._pending = data[pos:]
+        self._prev = prev
+        return b"".join(out)
+
+
+class _ChunkStream(io.RawIOBase):
+    """
+    Read-only raw stream over the byte chunks of a generator; tell()
+    gives the decoded bytes read so far
+    """
+
+    def __init__(self, chunks, source=None):
+        self._chunks = chunks
+        self._source = source
+        self._pending = memoryview(b"")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        return size
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._chunks.close()
+            if self._source is not None:
+                self._source.close()
+        super().close()
+
+
+def _lzw_chunks(f):
+    decompressor = LZWDecompressor()
+    while True:
+        data = f.read(LZW_CHUNK_SIZE)
+        if not data:
+            break
+        chunk = decompressor.decompress(data)
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _crx_chunks(stream):
+    from rinex_hatanaka import iter_rinex_lines
+
+    text = io.TextIOWrapper(stream, encoding="latin-1")
+    batch = []
+    for line in iter_rinex_lines(text):
+        batch.append(line)
+        if len(batch) == CRX_LINES_PER_CHUNK:
+            yield "".join(batch).encode("latin-1")
+            batch = []
+    if batch:
+        yield "".join(batch).encode("latin-1")
+
+
+def _is_crinex(stream):
+    from rinex_hatanaka import CRX_VERSION_LABEL
+
+    first_line = stream.peek(80)[:80].split(b"\n", 1)[0]
+    return first_line[60:].strip().decode("latin-1") == CRX_VERSION_LABEL
+
+
+def open_rinex(path, member=None, buffering=None):
+    """
+    Opens the RINEX file stored in `path` as a binary stream: plain,
+    gzip (.gz), Unix compress (.Z) or a zip archive (its `member`, or
+    its only RINEX member). Compact RINEX content is decoded, so the
+    stream always yields RINEX lines. tell() gives the decoded bytes.
+    `buffering` defaults to buffer_size().
+    """
+    path = Path(path)
+    suffix = compression_suffix(path)
+    buffering = buffering or buffer_size()
+
+    if suffix == ".gz":
+        import gzip
+        stream = gzip.open(path, "rb")
+    elif suffix == ".Z":
+        f = open(path, "rb")
+        stream = io.BufferedReader(_ChunkStream(_lzw_chunks(f), f), buffering)
+    elif suffix == ".zip":
+        import zipfile
+        with zipfile.ZipFile(path) as zf:
+            # The member stream keeps the archive file open
+            stream = zf.open(_zip_member(path, member))
+    else:
+        stream = open(path, "rb", buffering=buffering)
+
+    try:
+        if not _is_crinex(stream):
+            return stream
+    except BaseException:
+        stream.close()
+        raise
+    return io.BufferedReader(_ChunkStream(_crx_chunks(stream), stream), buffering)
+
+
+def open_rinex_text(path, member=None):
+    """open_rinex() as text, the way RINEX files are read elsewhere"""
+    return io.TextIOWrapper(open_rinex(path, member), encoding="latin-1")
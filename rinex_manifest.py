@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from logger import logger
+
+MANIFEST_NAME = ".rinex_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Results of Manifest.check()
+NEW = "new"              # never processed (or the manifest is missing)
+FIXED = "fixed"          # already a recorded output
+PROCESSED = "processed"  # a copy of an input that was already processed
+MISMATCH = "mismatch"    # has the name of a recorded output, not its content
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_record(path, sha256=None):
+    stat = os.stat(path)
+    return {
+        "name": Path(path).name,
+        "sha256": sha256 or file_sha256(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def new_entry(input_record, output_file, shift_weeks, archive=None,
+              new_name=None):
+    """Manifest entry of a processed family, keyed on its output name"""
+    return {
+        "input": input_record,
+        "output": file_record(output_file),
+        "shift_weeks": shift_weeks,
+        "new_name": new_name or Path(output_file).stem,
+        "archive": Path(archive).name if archive else None,
+        "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+class Manifest:
+    """
+    Per-directory record of the processed families: input and output
+    content hashes, applied week shift and new name, keyed on the
+    output file name. Files are settled with a stat comparison first
+    and only hashed when it does not match.
+    """
+
+    def __init__(self, directory, entries=None):
+        self.directory = Path(directory)
+        self.entries = entries or {}
+        self._by_output_hash = None
+        self._by_input_hash = None
+
+    @property
+    def path(self):
+        return self.directory / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, directory):
+        """Loads the manifest of `directory`; a missing or invalid one is empty"""
+        manifest = cls(directory)
+        try:
+            with open(manifest.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get("version") == MANIFEST_VERSION:
+            manifest.entries = data.get("entries", {})
+        return manifest
+
+    def save(self):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries},
+                      f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.path)
+        logger.debug("Saved %d manifest entries to %s", len(self.entries), self.path)
+
+    def _hash_indexes(self):
+        if self._by_output_hash is None:
+            self._by_output_hash = {
+                e["output"]["sha256"]: e for e in self.entries.values()}
+            self._by_input_hash = {
+                e["input"]["sha256"]: e for e in self.entries.values()}
+        return self._by_output_hash, self._by_input_hash
+
+    def is_recorded_output(self, path):
+        """Cheap stat-only check: `path` is an unchanged recorded output"""
+        path = Path(path)
+        entry = self.entries.get(path.name)
+        if not entry:
+            return False
+        stat = os.stat(path)
+        return (entry["output"]["size"] == stat.st_size
+                and entry["output"]["mtime_ns"] == stat.st_mtime_ns)
+
+    def check(self, path):
+        """
+        Settles `path` against the manifest.
+
+        Returns:
+            tuple: (NEW | FIXED | PROCESSED | MISMATCH, matching entry or
+            None, sha256 of the file or None when it was not hashed)
+        """
+        path = Path(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path.name)
+        if entry:
+            output = entry["output"]
+            if (output["size"] == stat.st_size
+                    and output["mtime_ns"] == stat.st_mtime_ns):
+                return FIXED, entry, None
+
+        sha256 = file_sha256(path)
+        by_output_hash, by_input_hash = self._hash_indexes()
+
+        if sha256 in by_output_hash:
+            # Touched, moved or copied output: refresh its stat
+            match = by_output_hash[sha256]
+            if match is entry:
+                entry["output"]["mtime_ns"] = stat.st_mtime_ns
+            return FIXED, match, sha256
+
+        if sha256 in by_input_hash:
+            return PROCESSED, by_input_hash[sha256], sha256
+
+        if entry:
+            logger.error(
+                "O arquivo %s não confere com o manifesto (sha256 %s, esperado %s)",
+                path, sha256, entry["output"]["sha256"])
+            return MISMATCH, entry, sha256
+
+        return NEW, None, sha256
+
+    def add(self, entry):
+        self.entries[entry["output"]["name"]] = entry
+        self._by_output_hash = None
+
+    def verify(self):
+        """
+        Returns:
+            list: (output name, "missing" | "modified") of every entry whose
+            output no longer matches
+        """
+        problems = []
+        for name, entry in sorted(self.entries.items()):
+            path = self.directory / name
+            if not path.exists():
+                problems.append((name, "missing"))
+            elif self.check(path)[0] != FIXED:
+                problems.append((name, "modified"))
+        return problems
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from logger import logger
+from progress import OperationCancelled
+from rinex_compress import ZIP32_LIMIT, ZipStreamWriter, log_compression_summary
+from rinex_filename_fixer import fixed_rinex_filename
+from rinex_fixer import navigation_files
+from rinex_gpsweek import calculate_gpsw_correction
+from rinex_io import decoded_path, open_output, open_rinex, rinex_size
+from rinex_shift import shift_rinex_nav_stream, shift_rinex_obs_stream
+
+PART_SUFFIX = ".part"
+ORIGINAL_SUFFIX = ".ORIGINAL"
+
+
+class _Tee:
+    """Writes the same data to a zip member and a plain file"""
+
+    def __init__(self, *outputs):
+        self.outputs = outputs
+
+    def write(self, data):
+        for output in self.outputs:
+            output.write(data)
+
+    def writelines(self, lines):
+        lines = list(lines)
+        for output in self.outputs:
+            output.writelines(lines)
+
+
+class _OffsetProgress:
+    """Reports a member's bytes on top of those of the members before it"""
+
+    def __init__(self, progress, offset):
+        self.progress = progress
+        self.offset = offset
+
+    def check_cancelled(self):
+        self.progress.check_cancelled()
+
+    def update(self, processed, epochs=None):
+        self.progress.update(self.offset + processed, epochs)
+
+
+def _family_sources(obs_file):
+    # A .yyD next to the .yyO is a stale copy of the same observations
+    return [obs_file] + navigation_files(obs_file)
+
+
+def _source_size(source):
+    # Compressed size when the decoded one is unknown (.Z, Compact RINEX)
+    size = rinex_size(source)
+    return source.stat().st_size if size is None else size
+
+
+def _check_outputs(archive, obs_file, sources, targets, tee):
+    if archive.exists():
+        raise FileExistsError(f"{archive} already exists")
+    if not tee:
+        return
+    for source, target in zip(sources, targets):
+        if target != source and target.exists():
+            raise FileExistsError(f"{target} already exists")
+        if target == source and Path(f"{source}{ORIGINAL_SUFFIX}").exists():
+            raise FileExistsError(f"{source}{ORIGINAL_SUFFIX} already exists")
+
+
+@logger.timed("pipeline")
+def fix_and_archive(obs_file, station_id, codec="deflate", level=None,
+                    tee=False, progress=None):
+    """
+    Fixes the family of `obs_file` in a single pass, without
+    intermediate files: the observation file is read once and its
+    shifted epochs are streamed, under the new name, straight into
+    <new name>_RINEX.zip, followed by the shifted navigation files. The
+    inputs are never modified or renamed, and may be compressed (.gz,
+    .Z, Compact RINEX; see rinex_io). With `tee`, the fixed family
+    is also written as plain files next to the inputs (a file that
+    keeps its name is then moved to <file>.ORIGINAL first).
+
+    `progress` (progress.Progress) receives the bytes read and may
+    cancel the operation, in which case every partial output is removed
+    and OperationCancelled is raised.
+
+    Returns:
+        dict: archive path, new base name, week shift, plain outputs and
+        per-member statistics
+    """
+    start = time.perf_counter()
+    obs_file = Path(obs_file)
+    directory = obs_file.parent
+
+    new_name = fixed_rinex_filename(obs_file, station_id)
+    shift = calculate_gpsw_correction(obs_file)
+    logger.debug("Pipeline %s -> %s, week shift %s", obs_file.name, new_name, shift)
+
+    sources = _family_sources(obs_file)
+    targets = [directory / f"{new_name}{decoded_path(f).suffix}" for f in sources]
+    total = sum(_source_size(f) for f in sources)
+    if total > ZIP32_LIMIT:
+        raise ValueError(f"{obs_file.name}: family too large for the "
+                         "single-pass archive")
+
+    archive = directory / f"{new_name}_RINEX.zip"
+    _check_outputs(archive, obs_file, sources, targets, tee)
+
+    logger.notify(f"Processando arquivo: {obs_file.name}")
+    if progress:
+        progress.start("Corrigindo", total)
+
+    parts = [Path(f"{archive}{PART_SUFFIX}")]
+    members = []
+    epochs = 0
+    try:
+        with open_output(parts[0]) as out:
+            writer = ZipStreamWriter(out, codec, level)
+            processed = 0
+
+            for source, target in zip(sources, targets):
+                member_start = time.perf_counter()
+                stat = source.stat()
+                source_size = _source_size(source)
+                plain_file = None
+                if tee:
+                    plain_file = Path(f"{target}{PART_SUFFIX}")
+                    parts.append(plain_file)
+
+                # Fixed files are new files, dated now
+                with writer.open(target.name, mode=stat.st_mode) as member, \
+                        open_rinex(source) as src, \
+                        (open_output(plain_file)
+                         if plain_file else nullcontext()) as plain:
+                    dst = _Tee(member, plain) if plain else member
+                    if source == obs_file:
+                        with logger.span("shift", backend="pipeline",
+                                         file=source.name):
+                            epochs = shift_rinex_obs_stream(src, dst, shift,
+                                                            progress)
+                    else:
+                        shift_rinex_nav_stream(
+                            src, dst, shift,
+                            _OffsetProgress(progress, processed) if progress else None)
+
+                processed += source_size
+                seconds = time.perf_counter() - member_start
+                size, compressed = member.member["size"], member.member["compressed"]
+                members.append({
+                    "name": target.name,
+                    "size": size,
+                    "compressed": compressed,
+                    "ratio": round(compressed / size, 4) if size else 0.0,
+                    "seconds": round(seconds, 3),
+                    "mb_per_s": round(size / 1e6 / seconds, 1) if seconds else 0.0,
+                })
+
+            writer.close()
+    except BaseException as e:
+        for part in parts:
+            if part.exists():
+                part.unlink()
+        if isinstance(e, OperationCancelled):
+            logger.notify("Correção cancelada. O arquivo original não foi alterado.")
+        raise
+
+    os.replace(parts[0], archive)
+    outputs = []
+    for part in parts[1:]:
+        target = Path(str(part)[:-len(PART_SUFFIX)])
+        if target.exists():
+            # Same name as its input, kept like RinexFixer does
+            os.rename(target, f"{target}{ORIGINAL_SUFFIX}")
+        os.replace(part, target)
+        outputs.append(str(target))
+
+    logger.debug("Shifted %d epochs by %s weeks", epochs, shift)
+    log_compression_summary(archive, members, codec)
+
+    return {
+        "archive": str(archive),
+        "codec": codec,
+        "new_name": new_name,
+        "shift_weeks": shift,
+        "epochs": epochs,
+        "outputs": outputs,
+        "seconds": round(time.perf_counter() - start, 3),
+        "members": members,
+    }
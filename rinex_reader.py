@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from gps_time import GPSTime, full_year
+from logger import logger
+from metadata_cache import metadata_cache
+from rinex_io import open_rinex_text, rinex_name
+
+END_OF_HEADER = "END OF HEADER"
+
+# ssssdddf.yyt (RINEX 2 short file name)
+RINEX_FILENAME_PATTERN = re.compile(
+    r"^(?P<station>.{4})(?P<doy>\d{3})(?P<session>[0-9a-xA-X])$")
+
+OBS_PER_LINE_V2 = 5
+SATS_PER_LINE_V2 = 12
+
+EPOCH_FLAGS = b"0123456"
+
+
+def format_epoch(year, month, day, hour, minute, second):
+    """
+    Formats an epoch the same way `gfzrnx -meta basic:json` does for
+    `epo_first` / `epo_first_name` ("YYYY MM DD HH MM SS.sssssss").
+    """
+    return (f"{year:04d} {month:02d} {day:02d} "
+            f"{hour:02d} {minute:02d} {second:010.7f}")
+
+
+def parse_epoch(date_str):
+    """
+    Parses a "YYYY MM DD HH MM SS.sssssss" epoch (format_epoch, gfzrnx
+    metadata) into a datetime, truncating the seconds to microseconds.
+    Use gps_time.GPSTime.parse() to keep the full precision.
+    """
+    return GPSTime.parse(date_str).to_datetime()
+
+
+def read_rinex_header(stream):
+    """
+    Reads the header block of a RINEX file, stopping right after
+    the END OF HEADER record.
+
+    Returns:
+        dict: parsed header fields
+    """
+    header = {
+        "version": None,
+        "type": None,
+        "satsys": None,
+        "marker_name": None,
+        "receiver": None,
+        "interval": None,
+        "obs_types": 0,
+        "time_first_obs": None,
+        "time_last_obs": None,
+    }
+
+    for line in stream:
+        label = line[60:].strip()
+
+        if label == "RINEX VERSION / TYPE":
+            header["version"] = line[:9].strip()
+            header["type"] = line[20:21]
+            header["satsys"] = line[40:41].strip() or "G"
+        elif label == "MARKER NAME":
+            header["marker_name"] = line[:60].strip()
+        elif label == "REC # / TYPE / VERS":
+            header["receiver"] = line[20:40].strip()
+        elif label == "INTERVAL":
+            header["interval"] = float(line[:10])
+        elif label == "# / TYPES OF OBSERV":
+            # Continuation lines leave the count blank
+            if line[:6].strip():
+                header["obs_types"] = int(line[:6])
+        elif label == "TIME OF FIRST OBS":
+            header["time_first_obs"] = _parse_header_time(line)
+        elif label == "TIME OF LAST OBS":
+            header["time_last_obs"] = _parse_header_time(line)
+        elif label == END_OF_HEADER:
+            return header
+
+    raise ValueError("END OF HEADER not found")
+
+
+def _parse_header_time(line):
+    fields = line[:43].split()
+    return format_epoch(int(fields[0]), int(fields[1]), int(fields[2]),
+                        int(fields[3]), int(fields[4]), float(fields[5]))
+
+
+def obs_time_line(epoch, label, time_system="GPS"):
+    """TIME OF FIRST/LAST OBS record (5I6,F13.7,5X,A3) of a GPSTime, as bytes"""
+    text = f"{epoch.format_header()}     {time_system:<3}"
+    return f"{text:<60}{label:<20}\n".encode("ascii")
+
+
+def obs_lines_per_satellite(header):
+    """Number of data lines each satellite takes in a RINEX 2 epoch"""
+    return max(1, -(-header["obs_types"] // OBS_PER_LINE_V2))
+
+
+def is_epoch_line(line):
+    """True if `line` (bytes) has the layout of a RINEX 2 epoch line"""
+    return (len(line) >= 32 and line[28:29] in EPOCH_FLAGS
+            and line[29:32].strip().isdigit())
+
+
+def epoch_record_length(epoch_line, lines_per_sat):
+    """
+    Number of lines that follow a RINEX 2 epoch line and belong to
+    the same epoch record (satellite list continuation lines plus
+    observation lines, or the special records of an event).
+    """
+    flag = epoch_line[28:29]
+    count = int(epoch_line[29:32] or 0)
+
+    if flag in ("2", "3", "4", "5"):
+        return count
+
+    sat_lines = (count - 1) // SATS_PER_LINE_V2 if count else 0
+    return sat_lines + count * lines_per_sat
+
+
+def parse_epoch_line(epoch_line):
+    """
+    Parses the date fields of a RINEX 2 (" yy mm dd hh mm ss.sssssss")
+    or RINEX 3 ("> yyyy mm dd hh mm ss.sssssss") epoch line.
+
+    Returns:
+        tuple: (year, month, day, hour, minute, second)
+    """
+    if epoch_line.startswith(">"):
+        fields = epoch_line[1:29].split()
+    else:
+        fields = epoch_line[:26].split()
+
+    return (full_year(fields[0]), int(fields[1]), int(fields[2]),
+            int(fields[3]), int(fields[4]), float(fields[5]))
+
+
+def read_first_epoch(stream, header):
+    """
+    Reads epoch records until the first regular epoch (flag 0 or 1)
+    and returns its formatted date, without reading the rest of the file.
+    """
+    lines_per_sat = obs_lines_per_satellite(header)
+
+    for line in stream:
+        if line.startswith(">"):
+            if line[31:32] in ("0", "1"):
+                return format_epoch(*parse_epoch_line(line))
+            continue
+
+        if len(line) < 32 or not line[:26].strip():
+            continue
+
+        if line[28:29] in ("0", "1"):
+            return format_epoch(*parse_epoch_line(line))
+
+        for _ in range(epoch_record_length(line, lines_per_sat)):
+            next(stream, None)
+
+    return None
+
+
+def epoch_from_filename(filename):
+    """
+    Builds the nominal epoch encoded in a RINEX 2 file name
+    (ssssdddf.yyt), the same information gfzrnx reports as
+    `epo_first_name`.
+
+    Returns:
+        str: formatted epoch, or None if the name is not a RINEX name
+    """
+    path = Path(filename)
+    match = RINEX_FILENAME_PATTERN.match(path.stem)
+    suffix = path.suffix[1:]
+
+    if not match or len(suffix) != 3 or not suffix[:2].isdigit():
+        return None
+
+    # 0-9: daily file (sequence number), a-x: hourly session 00h-23h
+    session = match.group("session").lower()
+    hour = ord(session) - ord("a") if session.isalpha() else 0
+    if not 0 <= hour <= 23:
+        return None
+
+    date = datetime(full_year(suffix[:2]), 1, 1) + \
+        timedelta(days=int(match.group("doy")) - 1)
+
+    return format_epoch(date.year, date.month, date.day, hour, 0, 0.0)
+
+
+def read_rinex_content_metadata(rinex_file):
+    """
+    Reads only the header block and the first epoch record of a RINEX
+    observation file. Compressed (.gz, .Z, .zip) and Compact RINEX
+    files are decoded on the fly. Without TIME OF LAST OBS in the
+    header, the last epoch comes from the epoch index, if there is one.
+
+    Returns:
+        dict: metadata depending only on the file content
+    """
+    with open_rinex_text(rinex_file) as f:
+        header = read_rinex_header(f)
+        epo_first = read_first_epoch(f, header)
+
+    epo_last = header["time_last_obs"]
+    if epo_last is None:
+        epo_last = _last_epoch_from_index(rinex_file)
+
+    return {
+        "version": header["version"],
+        "type": header["type"],
+        "satsys": header["satsys"],
+        "interval": header["interval"],
+        "marker_name": header["marker_name"],
+        "receiver": header["receiver"],
+        "epo_first": epo_first or header["time_first_obs"],
+        "epo_last": epo_last,
+    }
+
+
+def _last_epoch_from_index(rinex_file):
+    """
+    Last epoch of a file whose header has no TIME OF LAST OBS, from its
+    epoch index sidecar (rinex_index) when a current one exists; the
+    file itself is not scanned for it
+    """
+    from rinex_index import find_epoch_index
+
+    index = find_epoch_index(rinex_file)
+    if index is None or index.last_epoch is None:
+        return None
+    return GPSTime.from_ns(index.last_epoch).format_epoch()
+
+
+@logger.timed("metadata")
+def read_rinex_metadata(rinex_file, cache=metadata_cache):
+    """
+    In-process replacement for `gfzrnx -meta basic:json`.
+
+    The content part is looked up in `cache` (pass None to bypass it),
+    so the same file is only scanned once per run even after a rename.
+
+    Returns:
+        dict: metadata with the same shape used from the gfzrnx output
+        (data["file"]["epo_first"], data["file"]["epo_first_name"], ...)
+    """
+    if cache is None:
+        content = read_rinex_content_metadata(rinex_file)
+    else:
+        content = cache.get_or_load(rinex_file, read_rinex_content_metadata)
+
+    file_data = {
+        "name": Path(rinex_file).name,
+        "version": content["version"],
+        "type": content["type"],
+        "satsys": content["satsys"],
+        "interval": content["interval"],
+        "epo_first": content["epo_first"],
+        "epo_last": content["epo_last"],
+    }
+
+    epo_first_name = epoch_from_filename(rinex_name(rinex_file))
+    if epo_first_name:
+        file_data["epo_first_name"] = epo_first_name
+
+    return {
+        "file": file_data,
+        "site": {
+            "name": content["marker_name"],
+            "receiver": content["receiver"],
+        },
+    }
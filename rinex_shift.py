@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+from datetime import date, timedelta
+from itertools import islice
+
+from gps_time import full_year
+from rinex_io import open_output, open_rinex
+from rinex_reader import (END_OF_HEADER, epoch_record_length, is_epoch_line,
+                          obs_lines_per_satellite)
+
+# Epochs between progress reports / cancellation checks
+PROGRESS_EPOCHS = 1000
+# Navigation records between progress reports / cancellation checks
+PROGRESS_RECORDS = 1000
+
+# Broadcast orbit lines after the epoch line of a RINEX 2 navigation record
+NAV_ORBIT_LINES = {b"N": 7, b"G": 3}
+# GPS week (BROADCAST ORBIT - 5, third D19.12 field) of a GPS record
+GPS_WEEK_ORBIT_LINE = 5
+GPS_WEEK_COLUMNS = slice(41, 60)
+# W of DELTA-UTC: A0,A1,T,W (3X,2D19.12,2I9)
+DELTA_UTC_WEEK_COLUMNS = slice(50, 59)
+
+
+class _DateShifter:
+    """Shifts RINEX date fields by whole GPS weeks, memoizing per date"""
+
+    def __init__(self, shift_weeks):
+        self.delta = timedelta(weeks=shift_weeks)
+        self._epoch_dates = {}
+
+    def shift(self, year, month, day):
+        return date(year, month, day) + self.delta
+
+    def epoch_date(self, fields):
+        """
+        Shifts the " yy mm dd" columns (1-9) of a RINEX 2 epoch line.
+        Consecutive epochs share the same date, so the result is cached.
+        """
+        shifted = self._epoch_dates.get(fields)
+        if shifted is None:
+            new_date = self.shift(full_year(fields[1:3]), int(fields[4:6]),
+                                  int(fields[7:9]))
+            shifted = (f" {new_date.year % 100:02d}{new_date.month:3d}"
+                       f"{new_date.day:3d}").encode("ascii")
+            self._epoch_dates[fields] = shifted
+        return shifted
+
+    def nav_date(self, line):
+        """Shifts the date columns (3-11) of a RINEX 2 navigation record"""
+        return line[:2] + self.epoch_date(line[2:11]) + line[11:]
+
+    def header_date(self, line):
+        """Shifts the year/month/day fields (3I6) of TIME OF FIRST/LAST OBS"""
+        new_date = self.shift(int(line[0:6]), int(line[6:12]), int(line[12:18]))
+        fields = f"{new_date.year:6d}{new_date.month:6d}{new_date.day:6d}"
+        return fields.encode("ascii") + line[18:]
+
+
+def shift_rinex_obs_file(input_file, output_file, shift_weeks, progress=None):
+    """
+    Streams a RINEX 2 observation file, shifting its epochs by
+    `shift_weeks` GPS weeks. Only the epoch lines and the TIME OF
+    FIRST/LAST OBS header records are rewritten; observation lines are
+    copied through as raw bytes, so memory use does not depend on the
+    file size. A compressed or Compact RINEX input (see rinex_io) is
+    decoded on the fly; the output is always plain RINEX.
+
+    `progress` (progress.Progress) receives the bytes read every
+    PROGRESS_EPOCHS epochs and may cancel the operation.
+
+    Returns:
+        int: number of epoch records shifted
+    """
+    with open_rinex(input_file) as src, open_output(output_file) as dst:
+        return shift_rinex_obs_stream(src, dst, shift_weeks, progress)
+
+
+def shift_rinex_obs_stream(src, dst, shift_weeks, progress=None):
+    """
+    shift_rinex_obs_file() between open binary streams: `src` is read
+    line by line (tell() gives the progress), `dst` only needs write()
+    and writelines(), e.g. a zip member.
+
+    Returns:
+        int: number of epoch records shifted
+    """
+    shifter = _DateShifter(shift_weeks)
+    obs_types = 0
+    epochs = 0
+
+    for line in src:
+        label = line[60:].strip()
+        if label in (b"TIME OF FIRST OBS", b"TIME OF LAST OBS"):
+            line = shifter.header_date(line)
+        elif label == b"# / TYPES OF OBSERV" and line[:6].strip():
+            obs_types = int(line[:6])
+        dst.write(line)
+        if label == END_OF_HEADER.encode("ascii"):
+            break
+    else:
+        raise ValueError("END OF HEADER not found")
+
+    lines_per_sat = obs_lines_per_satellite({"obs_types": obs_types})
+
+    for line in src:
+        if not is_epoch_line(line):
+            dst.write(line)
+            continue
+
+        follow = epoch_record_length(line[:32].decode("latin-1"),
+                                     lines_per_sat)
+
+        # Event records (flags 2-5) may leave the date blank
+        if line[1:9].strip():
+            line = shifter.epoch_date(line[:9]) + line[9:]
+            epochs += 1
+
+        dst.write(line)
+        dst.writelines(islice(src, follow))
+
+        if progress and epochs % PROGRESS_EPOCHS == 0:
+            progress.check_cancelled()
+            progress.update(src.tell(), epochs)
+
+    if progress:
+        progress.update(src.tell(), epochs)
+
+    return epochs
+
+
+def _shift_week_field(field, shift_weeks):
+    """
+    Adds `shift_weeks` to a GPS week written as a D19.12 (or E19.12)
+    float, keeping the layout of the original: FORTRAN style (0.2048D+04,
+    .2048D+04) or scientific (2.048000000000D+03)
+    """
+    text = field.decode("ascii")
+    exponent_char = "D" if "D" in text.upper() else "E"
+    mantissa = text.strip().upper().replace("D", "E").split("E")[0]
+    digits = len(mantissa.split(".")[1]) if "." in mantissa else 12
+    week = round(float(text.upper().replace("D", "E"))) + shift_weeks
+
+    if mantissa.lstrip("-").startswith((".", "0.")):
+        week_digits = str(week)
+        leading = "0" if mantissa.lstrip("-").startswith("0") else ""
+        shifted = (f"{leading}.{week_digits.ljust(digits, '0')[:digits]}"
+                   f"{exponent_char}+{len(week_digits):02d}")
+    else:
+        shifted = f"{week:.{digits}E}".replace("E", exponent_char)
+    return shifted.rjust(len(field)).encode("ascii")
+
+
+def shift_rinex_nav_file(input_file, output_file, shift_weeks, progress=None):
+    """
+    Streams a RINEX 2 GPS (.yyN) or GLONASS (.yyG) navigation file,
+    shifting it by `shift_weeks` GPS weeks: the epoch (TOC) of every
+    record, the GPS week of the GPS orbits, the W of DELTA-UTC and the
+    date of CORR TO SYSTEM TIME. Everything else is copied through as
+    raw bytes, so multi-day merged files run in constant memory.
+    Compressed inputs are decoded on the fly, as in shift_rinex_obs_file().
+
+    Returns:
+        int: number of navigation records shifted
+    """
+    with open_rinex(input_file) as src, open_output(output_file) as dst:
+        return shift_rinex_nav_stream(src, dst, shift_weeks, progress)
+
+
+def shift_rinex_nav_stream(src, dst, shift_weeks, progress=None):
+    """shift_rinex_nav_file() between open binary streams"""
+    shifter = _DateShifter(shift_weeks)
+    file_type = None
+
+    for line in src:
+        label = line[60:].strip()
+        if label == b"RINEX VERSION / TYPE":
+            if not line[:9].strip().startswith(b"2"):
+                raise ValueError("Only RINEX 2 navigation files are supported")
+            file_type = line[20:21]
+        elif label == b"DELTA-UTC: A0,A1,T,W" and line[DELTA_UTC_WEEK_COLUMNS].strip():
+            week = int(line[DELTA_UTC_WEEK_COLUMNS]) + shift_weeks
+            line = (line[:DELTA_UTC_WEEK_COLUMNS.start] + b"%9d" % week
+                    + line[DELTA_UTC_WEEK_COLUMNS.stop:])
+        elif label == b"CORR TO SYSTEM TIME" and line[:18].strip():
+            line = shifter.header_date(line)
+        dst.write(line)
+        if label == END_OF_HEADER.encode("ascii"):
+            break
+    else:
+        raise ValueError("END OF HEADER not found")
+
+    if file_type not in NAV_ORBIT_LINES:
+        raise ValueError(f"Not a GPS or GLONASS navigation file: {file_type!r}")
+    orbit_lines = NAV_ORBIT_LINES[file_type]
+    records = 0
+
+    for line in src:
+        if not line.strip():
+            dst.write(line)
+            continue
+
+        dst.write(shifter.nav_date(line))
+        records += 1
+        for index, orbit in enumerate(islice(src, orbit_lines), 1):
+            if (file_type == b"N" and index == GPS_WEEK_ORBIT_LINE
+                    and orbit[GPS_WEEK_COLUMNS].strip()):
+                orbit = (orbit[:GPS_WEEK_COLUMNS.start]
+                         + _shift_week_field(orbit[GPS_WEEK_COLUMNS], shift_weeks)
+                         + orbit[GPS_WEEK_COLUMNS.stop:])
+            dst.write(orbit)
+
+        if progress and records % PROGRESS_RECORDS == 0:
+            progress.check_cancelled()
+            progress.update(src.tell())
+
+    if progress:
+        progress.update(src.tell())
+
+    return records
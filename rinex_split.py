@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from datetime import date
+from itertools import islice
+from pathlib import Path
+
+from gps_time import GPSTime, full_year
+from logger import logger
+from progress import OperationCancelled
+from rinex_gpsweek import calculate_gpsw_correction
+from rinex_io import decoded_path, open_output, open_rinex, rinex_size
+from rinex_reader import (END_OF_HEADER, epoch_record_length, is_epoch_line,
+                          obs_lines_per_satellite, obs_time_line)
+from rinex_shift import PROGRESS_EPOCHS, _DateShifter
+
+PART_SUFFIX = ".part"
+ORIGINAL_SUFFIX = ".ORIGINAL"
+
+# Header records describing the whole session, left out of the daily files
+SESSION_LABELS = (b"# OF SATELLITES", b"PRN / # OF OBS")
+TIME_LABELS = (b"TIME OF FIRST OBS", b"TIME OF LAST OBS")
+
+
+def daily_filename(station_id, day, obs_type="O"):
+    """RINEX 2 name of the daily file of `day`: ssssddd0.yyO"""
+    doy = day.timetuple().tm_yday
+    return f"{station_id}{doy:03d}0.{day.year % 100:02d}{obs_type}"
+
+
+class _DailyFile:
+    """
+    One daily output: the session header is written up front with
+    placeholder TIME OF FIRST/LAST OBS records, which are patched in
+    place once the day is complete
+    """
+
+    def __init__(self, path, header, time_system):
+        self.path = path
+        self.part = Path(f"{path}{PART_SUFFIX}")
+        self.time_system = time_system
+        self.first = self.last = None
+        self.epochs = 0
+
+        self.file = open_output(self.part)
+        for line in header:
+            label = line[60:].strip()
+            if label in TIME_LABELS or label in SESSION_LABELS:
+                continue
+            if label == END_OF_HEADER.encode("ascii"):
+                self._times_offset = self.file.tell()
+                placeholder = obs_time_line(GPSTime(0), "", "")
+                self.file.write(placeholder * 2)
+            self.file.write(line)
+
+    def add_epoch(self, epoch):
+        if self.first is None:
+            self.first = epoch
+        self.last = epoch
+        self.epochs += 1
+
+    def close(self):
+        self.file.seek(self._times_offset)
+        self.file.write(obs_time_line(self.first, "TIME OF FIRST OBS",
+                                      self.time_system))
+        self.file.write(obs_time_line(self.last, "TIME OF LAST OBS",
+                                      self.time_system))
+        self.file.close()
+
+
+def _check_target(path, obs_file):
+    if path == obs_file:
+        if Path(f"{path}{ORIGINAL_SUFFIX}").exists():
+            raise FileExistsError(f"{path}{ORIGINAL_SUFFIX} already exists")
+    elif path.exists():
+        raise FileExistsError(f"{path} already exists")
+
+
+@logger.timed("split")
+def split_rinex_obs_file(obs_file, station_id, output_dir=None,
+                         shift_weeks=None, progress=None):
+    """
+    Splits a RINEX 2 observation session into daily files in a single
+    read, fixing its week rollover on the way: every epoch is shifted
+    by `shift_weeks` (by default the correction computed from the file
+    name) and written to the file of its shifted day, named
+    <station_id><doy>0.yyO, with its own TIME OF FIRST/LAST OBS. The
+    session-wide satellite counts are left out of the daily headers.
+
+    The input (plain or compressed, see rinex_io) is not modified; a
+    daily file with the same name as the input replaces it, the input
+    being kept as <file>.ORIGINAL. `progress` (progress.Progress)
+    receives the bytes read and may cancel the split, in which case
+    every partial output is removed and OperationCancelled is raised.
+
+    Returns:
+        dict: week shift, epochs and the daily files with their first
+        and last epochs
+    """
+    start = time.perf_counter()
+    obs_file = Path(obs_file)
+    output_dir = Path(output_dir) if output_dir else obs_file.parent
+    obs_type = "o" if decoded_path(obs_file).suffix[-1:] == "o" else "O"
+    if shift_weeks is None:
+        shift_weeks = calculate_gpsw_correction(obs_file)
+
+    logger.notify(f"Dividindo {obs_file.name} em arquivos diários...")
+    if progress:
+        progress.start("Dividindo", rinex_size(obs_file) or 0)
+
+    shifter = _DateShifter(shift_weeks)
+    days = {}
+    outputs = {}
+    current = None
+    # Records before the first dated epoch (events without a date)
+    pending = []
+    epochs = 0
+
+    try:
+        with open_rinex(obs_file) as src:
+            header = []
+            obs_types = 0
+            time_system = "GPS"
+            for line in src:
+                label = line[60:].strip()
+                if label == b"# / TYPES OF OBSERV" and line[:6].strip():
+                    obs_types = int(line[:6])
+                elif label == b"TIME OF FIRST OBS" and line[48:51].strip():
+                    time_system = line[48:51].strip().decode("ascii")
+                header.append(line)
+                if label == END_OF_HEADER.encode("ascii"):
+                    break
+            else:
+                raise ValueError("END OF HEADER not found")
+
+            lines_per_sat = obs_lines_per_satellite({"obs_types": obs_types})
+
+            for line in src:
+                if not is_epoch_line(line):
+                    if current:
+                        current.file.write(line)
+                    else:
+                        pending.append(line)
+                    continue
+
+                follow = epoch_record_length(line[:32].decode("latin-1"),
+                                             lines_per_sat)
+
+                # Event records (flags 2-5) may leave the date blank
+                if line[1:9].strip():
+                    fields = shifter.epoch_date(line[:9])
+                    line = fields + line[9:]
+                    day = days.get(fields)
+                    if day is None:
+                        day = date(full_year(fields[1:3]), int(fields[4:6]),
+                                   int(fields[7:9]))
+                        days[fields] = day
+
+                    current = outputs.get(day)
+                    if current is None:
+                        path = output_dir / daily_filename(station_id, day, obs_type)
+                        _check_target(path, obs_file)
+                        current = _DailyFile(path, header, time_system)
+                        outputs[day] = current
+                        current.file.writelines(pending)
+                        pending = []
+                    current.add_epoch(GPSTime.from_epoch_line(line))
+                    epochs += 1
+
+                if current:
+                    current.file.write(line)
+                    current.file.writelines(islice(src, follow))
+                else:
+                    pending.append(line)
+                    pending.extend(islice(src, follow))
+
+                if progress and epochs % PROGRESS_EPOCHS == 0:
+                    progress.check_cancelled()
+                    progress.update(src.tell(), epochs)
+
+            if progress:
+                progress.update(src.tell(), epochs)
+
+        if not outputs:
+            raise ValueError(f"{obs_file.name}: no epochs to split")
+        for output in outputs.values():
+            output.close()
+    except BaseException as e:
+        for output in outputs.values():
+            output.file.close()
+            if output.part.exists():
+                output.part.unlink()
+        if isinstance(e, OperationCancelled):
+            logger.notify("Divisão cancelada. O arquivo original não foi alterado.")
+        raise
+
+    files = []
+    for day in sorted(outputs):
+        output = outputs[day]
+        if output.path == obs_file:
+            os.rename(obs_file, f"{obs_file}{ORIGINAL_SUFFIX}")
+            logger.notify(
+                f"Arquivo original renomeado para: {obs_file.name}{ORIGINAL_SUFFIX}")
+        os.replace(output.part, output.path)
+        logger.notify(f"Arquivo diário salvo como: {output.path.name} "
+                      f"({output.epochs} épocas)")
+        files.append({
+            "file": str(output.path),
+            "first": output.first.format_epoch(),
+            "last": output.last.format_epoch(),
+            "epochs": output.epochs,
+        })
+
+    logger.debug("Split %d epochs of %s into %d daily files, week shift %s",
+                 epochs, obs_file.name, len(files), shift_weeks)
+    return {
+        "source": str(obs_file),
+        "shift_weeks": shift_weeks,
+        "epochs": epochs,
+        "files": files,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+
+from logger import ERROR, Observer
+
+
+def _chrome_event(record):
+    return {
+        "name": record["name"],
+        "cat": "rinex",
+        "ph": "X",
+        "ts": record["start_ns"] / 1000,
+        "dur": record["duration_ns"] / 1000,
+        "pid": record["pid"],
+        "tid": record["tid"],
+        "args": record["args"],
+    }
+
+
+class TraceObserver(Observer):
+    """
+    Collects the spans of logger.span()/logger.timed() as Chrome trace
+    events (chrome://tracing, Perfetto). With `path`, every event is also
+    appended to that file as it ends (JSON array format, which tolerates
+    an unterminated file), so traces of killed processes are not lost.
+    """
+
+    level = ERROR + 1  # spans only, no log messages
+    traces = True
+
+    def __init__(self, path=None):
+        self.events = []
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            self._file = open(path, "w")
+            self._file.write("[\n")
+            self._file.flush()
+
+    def log(self, message):
+        pass
+
+    def span(self, record):
+        event = _chrome_event(record)
+        with self._lock:
+            self.events.append(event)
+            if self._file:
+                self._file.write(json.dumps(event) + ",\n")
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.write("{}]\n")
+                self._file.close()
+                self._file = None
+
+    def write(self, path):
+        """Writes all collected events as one Chrome trace file"""
+        with self._lock:
+            events = list(self.events)
+        write_trace(path, events)
+
+    def summary(self):
+        with self._lock:
+            events = list(self.events)
+        return format_summary(events)
+
+
+def write_trace(path, events):
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def load_trace_events(path):
+    """Reads a trace in object or (possibly unterminated) array format"""
+    with open(path) as f:
+        text = f.read().strip()
+
+    if text.startswith("{"):
+        return json.loads(text)["traceEvents"]
+
+    text = text.rstrip(",")
+    if not text.endswith("]"):
+        text = text.rstrip(",\n") + "]"
+    return [event for event in json.loads(text) if event]
+
+
+def merge_traces(paths, output):
+    """
+    Merges the trace files of several processes into `output`
+
+    Returns:
+        list: the merged events
+    """
+    events = []
+    for path in paths:
+        events.extend(load_trace_events(path))
+    events.sort(key=lambda event: event["ts"])
+    write_trace(output, events)
+    return events
+
+
+def summarize(events):
+    """
+    Returns:
+        list: (name, count, total_s, mean_ms, max_ms) sorted by total time
+    """
+    stats = {}
+    for event in events:
+        count, total, longest = stats.get(event["name"], (0, 0.0, 0.0))
+        stats[event["name"]] = (count + 1, total + event["dur"],
+                                max(longest, event["dur"]))
+
+    rows = [(name, count, total / 1e6, total / count / 1e3, longest / 1e3)
+            for name, (count, total, longest) in stats.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def format_summary(events):
+    """Per-span summary table; spans nest, so totals may add up to more than the run"""
+    if not events:
+        return "No spans recorded."
+
+    start = min(event["ts"] for event in events)
+    end = max(event["ts"] + event["dur"] for event in events)
+    wall_s = (end - start) / 1e6
+
+    lines = [f"{'span':<28}{'count':>7}{'total s':>10}{'mean ms':>10}"
+             f"{'max ms':>10}{'% wall':>8}"]
+    for name, count, total_s, mean_ms, max_ms in summarize(events):
+        share = 100 * total_s / wall_s if wall_s else 0.0
+        lines.append(f"{name:<28}{count:>7}{total_s:>10.3f}{mean_ms:>10.1f}"
+                     f"{max_ms:>10.1f}{share:>7.1f}%")
+    lines.append(f"{'wall':<28}{'':>7}{wall_s:>10.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Native check of a fixed RINEX 2 observation file, in one streaming pass
+(the observation lines are skipped, only the epoch lines are parsed):
+
+- the epochs are strictly increasing, and evenly spaced on the declared
+  INTERVAL (whole missing intervals are only counted as gaps);
+- the first and last epochs match TIME OF FIRST/LAST OBS;
+- the file name is a RINEX short name and the first epoch is on its day
+  of year (without one, the rollover cannot be checked: an issue too);
+- no epoch is still rolled back by 1024 weeks from the file name date.
+
+    python rinex_validate.py campo/2019 -r -j 8
+"""
+
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+
+from gps_time import (NS_PER_DAY, NS_PER_SECOND, NS_PER_WEEK, WEEK_ROLLOVER,
+                      GPSTime, _seconds_to_ns, full_year)
+from logger import logger
+from rinex_io import open_rinex, rinex_name, rinex_size
+from rinex_reader import (epoch_from_filename, is_epoch_line,
+                          epoch_record_length, obs_lines_per_satellite,
+                          read_rinex_header)
+from rinex_shift import PROGRESS_EPOCHS
+
+# Clock offsets below this do not count as a spacing/header mismatch
+TOLERANCE_NS = NS_PER_SECOND // 1000
+# Epochs this far behind the file name date are still rolled back
+ROLLBACK_NS = WEEK_ROLLOVER // 2 * NS_PER_WEEK
+# Messages kept per file; the issue counts are always complete
+MAX_MESSAGES = 20
+
+# Issue kinds
+NO_EPOCHS = "no_epochs"
+NOT_INCREASING = "not_increasing"
+IRREGULAR_INTERVAL = "irregular_interval"
+TIME_OF_FIRST_OBS = "time_of_first_obs"
+TIME_OF_LAST_OBS = "time_of_last_obs"
+FILENAME_DATE = "filename_date"
+ROLLED_BACK = "rolled_back"
+
+
+def _format_ns(gps_ns):
+    return GPSTime.from_ns(gps_ns).format_epoch()
+
+
+def _close(a, b):
+    return abs(a - b) <= TOLERANCE_NS
+
+
+class _Report:
+    """Issue counts and the first MAX_MESSAGES messages of a file"""
+
+    def __init__(self):
+        self.issues = {}
+        self.messages = []
+
+    def add(self, kind, message, count=1):
+        self.issues[kind] = self.issues.get(kind, 0) + count
+        if len(self.messages) < MAX_MESSAGES:
+            self.messages.append(message)
+
+
+@logger.timed("validate")
+def validate_rinex_obs_file(obs_file, member=None, progress=None):
+    """
+    Validates the epochs of a RINEX 2 observation file (plain or
+    compressed, see rinex_io) against its header and its name, reading
+    it once in constant memory. Only regular epochs (flags 0 and 1)
+    are checked. `progress` (progress.Progress) receives the bytes read
+    and may cancel the validation.
+
+    Returns:
+        dict: `ok`, the number of `epochs`, the first and last epoch,
+        the missing intervals (`gaps`) and the `issues` found, counted
+        by kind, with the first `messages`
+    """
+    start = time.perf_counter()
+    report = _Report()
+    name = rinex_name(obs_file, member)
+    name_epoch = epoch_from_filename(name)
+    name_ns = GPSTime.parse(name_epoch).total_ns if name_epoch else None
+
+    if progress:
+        progress.start("Validando", rinex_size(obs_file, member) or 0)
+
+    with open_rinex(obs_file, member) as src:
+        header = read_rinex_header(line.decode("latin-1") for line in src)
+        lines_per_sat = obs_lines_per_satellite(header)
+        interval_ns = (round(header["interval"] * NS_PER_SECOND)
+                       if header["interval"] else None)
+        # Rollbacks are measured from the name; without one, only epochs
+        # behind TIME OF FIRST OBS are caught (a FILENAME_DATE issue)
+        reference_ns = name_ns
+        if reference_ns is None and header["time_first_obs"]:
+            reference_ns = GPSTime.parse(header["time_first_obs"]).total_ns
+
+        # Date columns -> (ns of the day, rolled back weeks)
+        days = {}
+        rolled_back = {}
+        first = previous = None
+        epochs = gaps = 0
+
+        for line in src:
+            if not is_epoch_line(line):
+                continue
+            follow = epoch_record_length(line[:32].decode("latin-1"),
+                                         lines_per_sat)
+            # Skips the satellite and observation lines unparsed
+            next(islice(src, follow, follow), None)
+            # Events (flags 2-5), cycle slips (6) and blank dates
+            if line[28:29] not in b"01" or not line[1:9].strip():
+                continue
+
+            fields = line[:9]
+            day = days.get(fields)
+            if day is None:
+                day_ns = GPSTime.from_calendar(
+                    full_year(fields[1:3]), int(fields[4:6]),
+                    int(fields[7:9])).total_ns
+                weeks = 0
+                if reference_ns is not None and reference_ns - day_ns >= ROLLBACK_NS:
+                    weeks = round((reference_ns - day_ns) / NS_PER_WEEK
+                                  / WEEK_ROLLOVER) * WEEK_ROLLOVER
+                day = days[fields] = (day_ns, weeks)
+
+            epoch_ns = (day[0] + int(line[10:12]) * 3600 * NS_PER_SECOND
+                        + int(line[13:15]) * 60 * NS_PER_SECOND
+                        + _seconds_to_ns(line[15:26].decode("ascii")))
+            epochs += 1
+            if day[1]:
+                rolled_back[day[1]] = rolled_back.get(day[1], 0) + 1
+
+            if previous is None:
+                first = epoch_ns
+            elif epoch_ns <= previous:
+                report.add(NOT_INCREASING,
+                           f"epoch {_format_ns(epoch_ns)} does not follow "
+                           f"{_format_ns(previous)}")
+            elif interval_ns:
+                step = epoch_ns - previous
+                intervals = max(1, round(step / interval_ns))
+                if not _close(step, intervals * interval_ns):
+                    report.add(IRREGULAR_INTERVAL,
+                               f"epoch {_format_ns(epoch_ns)} is "
+                               f"{step / NS_PER_SECOND:g} s after the previous "
+                               f"one, INTERVAL is {header['interval']:g} s")
+                elif intervals > 1:
+                    gaps += 1
+            previous = epoch_ns
+
+            if progress and epochs % PROGRESS_EPOCHS == 0:
+                progress.check_cancelled()
+                progress.update(src.tell(), epochs)
+
+        if progress:
+            progress.update(src.tell(), epochs)
+
+    if first is None:
+        report.add(NO_EPOCHS, "no regular epochs")
+    else:
+        for label, kind, key, epoch_ns, edge in (
+                ("TIME OF FIRST OBS", TIME_OF_FIRST_OBS, "time_first_obs",
+                 first, "start"),
+                ("TIME OF LAST OBS", TIME_OF_LAST_OBS, "time_last_obs",
+                 previous, "end")):
+            if header[key] and not _close(GPSTime.parse(header[key]).total_ns,
+                                          epoch_ns):
+                report.add(kind, f"{label} is {header[key]}, the epochs "
+                                 f"{edge} at {_format_ns(epoch_ns)}")
+        if name_ns is None:
+            # The header dates are rolled back along with the epochs
+            report.add(FILENAME_DATE, f"{name} carries no date, rollover "
+                                      f"not checked")
+        elif first // NS_PER_DAY != name_ns // NS_PER_DAY:
+            report.add(FILENAME_DATE, f"first epoch {_format_ns(first)} is not "
+                                      f"on the day of {name}")
+    for weeks, count in sorted(rolled_back.items()):
+        report.add(ROLLED_BACK, f"{count} epochs still {weeks} weeks behind "
+                                f"the date of the file", count)
+
+    result = {
+        "file": str(obs_file),
+        "ok": not report.issues,
+        "epochs": epochs,
+        "first": _format_ns(first) if first is not None else None,
+        "last": _format_ns(previous) if previous is not None else None,
+        "interval": header["interval"],
+        "gaps": gaps,
+        "issues": report.issues,
+        "messages": report.messages,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    if result["ok"]:
+        logger.notify(f"Validação OK: {name} ({epochs} épocas)")
+    else:
+        logger.error(f"Validação falhou: {name}: {'; '.join(report.messages[:3])}")
+    return result
+
+
+def _validate_file(obs_file):
+    # Runs on the worker processes; never raises
+    try:
+        return validate_rinex_obs_file(obs_file)
+    except Exception as e:
+        logger.error(e)
+        return {"file": str(obs_file), "ok": False, "error": str(e)}
+
+
+def validate_files(obs_files, jobs=None, debug_mode=False):
+    """
+    Validates every file on a process pool of `jobs` workers.
+
+    Returns:
+        dict: totals and the result of each file, in input order
+    """
+    # Only here: the process pool takes longer to import than a check
+    from concurrent.futures import ProcessPoolExecutor
+    from rinex_batch import init_worker
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(debug_mode,)) as executor:
+        results = list(executor.map(_validate_file, [str(f) for f in obs_files]))
+
+    valid = sum(1 for r in results if r["ok"])
+    return {
+        "total": len(results),
+        "ok": valid,
+        "failed": len(results) - valid,
+        "seconds": round(time.perf_counter() - start, 3),
+        "files": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Checks the epochs of fixed RINEX observation files "
+                    "against their header and file name.")
+    parser.add_argument("inputs", nargs="+",
+                        help="directories, RINEX observation files or glob patterns")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="search directories recursively")
+    parser.add_argument("-o", "--summary",
+                        help="write the JSON summary to this file instead of stdout")
+    parser.add_argument("-D", "--debug", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from rinex_batch import discover_observation_files
+
+    args = parse_args(argv)
+    obs_files = discover_observation_files(args.inputs, args.recursive)
+    if not obs_files:
+        print("No RINEX observation files found.", file=sys.stderr)
+        return 1
+
+    summary = validate_files(obs_files, args.jobs, args.debug)
+
+    output = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
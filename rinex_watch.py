@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import re
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from logger import logger
+from rinex_batch import batch_observer, init_worker, process_family, update_manifests
+from rinex_compress import CODECS, check_level
+from rinex_filename_fixer import fixed_rinex_filename
+from rinex_manifest import Manifest
+
+QUEUE_NAME = ".rinex_watch_queue.json"
+QUEUE_VERSION = 1
+
+# Seconds a family must stay unchanged before it is processed
+SETTLE_SECONDS = 2.0
+# Seconds between directory scans of the polling watcher
+POLL_INTERVAL = 1.0
+# Longest sleep of the main loop, so settled families are picked up quickly
+TICK_SECONDS = 0.25
+# Times a family is run again after its worker process died
+MAX_RETRIES = 2
+
+# Members of a RINEX 2 family: observation (or Compact RINEX) and navigation
+RINEX_NAME = re.compile(r"^(?P<stem>.+)\.(?P<yy>\d\d)(?P<type>[oOdDnNgG])$")
+OBS_TYPES = "oOdD"
+
+# linux/inotify.h
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Changed file names of one directory, from Linux inotify (via ctypes)"""
+
+    MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE)
+
+    def __init__(self, directory):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self.directory = Path(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(self.directory),
+                                  self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed: {self.directory}")
+
+    def wait(self, timeout):
+        """
+        Returns:
+            set: names changed since the last call (empty on timeout)
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: treat every file as changed
+                names.update(os.listdir(self.directory))
+            elif length:
+                name = data[offset:offset + length].rstrip(b"\0")
+                names.add(os.fsdecode(name))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Changed file names of one directory, from periodic size/mtime scans"""
+
+    def __init__(self, directory, interval=POLL_INTERVAL):
+        self.directory = Path(directory)
+        self.interval = interval
+        self._next_scan = 0.0
+        self._files = self._scan()
+
+    def _scan(self):
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def wait(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(delay, 0))
+        self._next_scan = time.monotonic() + self.interval
+
+        files = self._scan()
+        changed = {name for name in files.keys() | self._files.keys()
+                   if files.get(name) != self._files.get(name)}
+        self._files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(directory, poll=False, interval=POLL_INTERVAL):
+    """inotify where available, otherwise (or with `poll`) directory scans"""
+    if not poll:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logger.debug("inotify unavailable (%s), polling instead", e)
+    return PollingWatcher(directory, interval)
+
+
+class WatchQueue:
+    """
+    Journal of the observation files queued for processing, kept in the
+    watched directory so queued work survives a restart.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.files = []
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == QUEUE_VERSION:
+                self.files = data.get("files", [])
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def path(self):
+        return self.directory / QUEUE_NAME
+
+    def add(self, name):
+        if name not in self.files:
+            self.files.append(name)
+            self._save()
+
+    def remove(self, name):
+        if name in self.files:
+            self.files.remove(name)
+            self._save()
+
+    def _save(self):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"version": QUEUE_VERSION, "files": self.files}, f, indent=1)
+        os.replace(tmp_file, self.path)
+
+
+def _init_watch_worker(debug_mode):
+    # Ctrl+C stops the daemon, which lets the running families finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker(debug_mode)
+
+
+class WatchDaemon:
+    """
+    Watches `directory` for RINEX families (.yyO/.yyD with their .yyN and
+    .yyG), waits until every member has stopped changing for `settle`
+    seconds and runs the family through rinex_batch.process_family() on
+    a pool of `jobs` worker processes. `options` are passed on to
+    process_family() (backend, compress, codec, level, pipeline, tee).
+    """
+
+    def __init__(self, directory, station_id, jobs=None, settle=SETTLE_SECONDS,
+                 poll=False, interval=POLL_INTERVAL, debug_mode=False,
+                 **options):
+        self.directory = Path(directory)
+        self.station_id = station_id
+        self.jobs = jobs or os.cpu_count()
+        self.settle = settle
+        self.poll = poll
+        self.interval = interval
+        self.debug_mode = debug_mode
+        self.options = options
+
+        self.queue = WatchQueue(self.directory)
+        # name: (size, mtime_ns, monotonic time of the last change)
+        self._pending = {}
+        # Family stems being written by a running job, before and after rename
+        self._busy = {}
+        self._done = queue.Queue()
+        self._stop = threading.Event()
+        # name: runs lost to a dead worker process
+        self._retries = {}
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, scan_existing=False):
+        watcher = create_watcher(self.directory, self.poll, self.interval)
+        logger.notify(f"Monitorando {self.directory} ({type(watcher).__name__})")
+
+        self._executor = self._new_executor()
+        try:
+            for name in list(self.queue.files):
+                if (self.directory / name).exists():
+                    logger.notify(f"Retomando arquivo da fila: {name}")
+                    self._submit(name)
+                else:
+                    logger.notify(f"Arquivo da fila não encontrado: {name}")
+                    self.queue.remove(name)
+
+            if scan_existing:
+                for name in os.listdir(self.directory):
+                    self._touch(name, changed_at=0.0)
+
+            try:
+                while not self._stop.is_set():
+                    for name in watcher.wait(TICK_SECONDS):
+                        self._touch(name)
+                    self._submit_settled()
+                    self._collect_results()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                watcher.close()
+                logger.notify("Encerrando; aguardando os arquivos em processamento...")
+        finally:
+            self._executor.shutdown(wait=True)
+
+        # Families lost now stay in the queue for the next run
+        self._collect_results(resubmit=False)
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.jobs,
+                                   initializer=_init_watch_worker,
+                                   initargs=(self.debug_mode,))
+
+    def _restart_executor(self, broken):
+        # A worker that dies (killed, out of memory) breaks the whole pool:
+        # every later submit fails until it is replaced
+        if broken is self._executor:
+            logger.notify("Processo de trabalho encerrado; reiniciando os processos")
+            broken.shutdown(wait=False)
+            self._executor = self._new_executor()
+
+    def _touch(self, name, changed_at=None):
+        match = RINEX_NAME.match(name)
+        if not match or match["stem"] in self._busy:
+            return
+        try:
+            stat = os.stat(self.directory / name)
+        except OSError:
+            self._pending.pop(name, None)
+            return
+
+        previous = self._pending.get(name)
+        if previous is None or previous[:2] != (stat.st_size, stat.st_mtime_ns):
+            changed_at = time.monotonic() if changed_at is None else changed_at
+            self._pending[name] = (stat.st_size, stat.st_mtime_ns, changed_at)
+
+    def _submit_settled(self):
+        families = {}
+        for name in self._pending:
+            match = RINEX_NAME.match(name)
+            families.setdefault((match["stem"], match["yy"]), []).append(name)
+
+        now = time.monotonic()
+        for members in families.values():
+            # Re-stat, so writes missed by the watcher still count
+            for name in members:
+                self._touch(name)
+            if any(name not in self._pending
+                   or now - self._pending[name][2] < self.settle
+                   for name in members):
+                continue
+
+            for name in members:
+                self._pending.pop(name)
+            obs_files = [name for name in members if name[-1] in OBS_TYPES]
+            # A .yyD next to its .yyO is a copy of the same observations
+            obs_files.sort(key=lambda name: name[-1] in "dD")
+            if obs_files and not self._is_fixed(obs_files[0]):
+                logger.notify(f"Nova família na fila: {obs_files[0]}")
+                self.queue.add(obs_files[0])
+                self._submit(obs_files[0])
+
+    def _is_fixed(self, name):
+        # Renamed outputs of our own jobs are already in the manifest
+        try:
+            return Manifest.load(self.directory).is_recorded_output(
+                self.directory / name)
+        except OSError:
+            return True
+
+    def _submit(self, name):
+        obs_file = self.directory / name
+        stems = {obs_file.stem}
+        try:
+            stems.add(fixed_rinex_filename(obs_file, self.station_id))
+        except Exception as e:
+            logger.debug("Could not predict the new name of %s: %s", name, e)
+        for stem in stems:
+            self._busy[stem] = self._busy.get(stem, 0) + 1
+        self._start(name, stems)
+
+    def _start(self, name, stems):
+        args = (process_family, str(self.directory / name), self.station_id,
+                self.options.get("backend", "gfzrnx"),
+                self.options.get("compress", True),
+                self.options.get("codec", "deflate"), self.options.get("level"),
+                False, True, self.options.get("pipeline", False),
+                self.options.get("tee", False))
+        executor = self._executor
+        try:
+            future = executor.submit(*args)
+        except BrokenProcessPool:
+            self._restart_executor(executor)
+            executor = self._executor
+            future = executor.submit(*args)
+        future.add_done_callback(
+            lambda future: self._done.put((name, stems, future, executor)))
+
+    def _collect_results(self, resubmit=True):
+        while True:
+            try:
+                name, stems, future, executor = self._done.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                if not resubmit:
+                    logger.notify(f"Processamento interrompido, mantido na fila: {name}")
+                    continue
+                retries = self._retries.get(name, 0)
+                if retries < MAX_RETRIES:
+                    # Still journaled: run it again on a new pool
+                    self._retries[name] = retries + 1
+                    self._restart_executor(executor)
+                    logger.notify(f"Reenviando arquivo da fila: {name}")
+                    self._start(name, stems)
+                    continue
+                result = {"input": str(self.directory / name),
+                          "status": "failed", "error": str(e)}
+            except Exception as e:
+                # The worker process itself died
+                result = {"input": str(self.directory / name),
+                          "status": "failed", "error": str(e)}
+
+            update_manifests([result])
+            self.queue.remove(name)
+            self._retries.pop(name, None)
+            for stem in stems:
+                self._busy[stem] -= 1
+                if not self._busy[stem]:
+                    del self._busy[stem]
+            # Files written by the job itself are not new arrivals
+            for pending in list(self._pending):
+                if RINEX_NAME.match(pending)["stem"] in stems:
+                    del self._pending[pending]
+
+            if result["status"] == "failed":
+                logger.notify(f"Falha ao processar {name}: {result.get('error')}")
+            else:
+                logger.notify(f"Família processada ({result['status']}): {name} -> "
+                              f"{result.get('archive') or result.get('output')}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Watches a directory and fixes the GPS week rollover of "
+                    "every RINEX family dropped into it.")
+    parser.add_argument("directory", help="directory to watch")
+    parser.add_argument("-s", "--station-id", default="SSTR",
+                        help="station id used in the new file names (default: SSTR)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--backend", choices=("gfzrnx", "native"), default="gfzrnx",
+                        help="GPS week shift engine (default: gfzrnx)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="fix and archive each family in a single pass")
+    parser.add_argument("--tee", action="store_true",
+                        help="with --pipeline, also write the fixed files")
+    parser.add_argument("--no-zip", action="store_true",
+                        help="do not compress the fixed families")
+    parser.add_argument("--codec", choices=CODECS, default="deflate",
+                        help="compression codec (default: deflate)")
+    parser.add_argument("--level", type=int, default=None,
+                        help="compression level of the codec")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="seconds a family must stay unchanged before it "
+                             "is processed (default: %(default)s)")
+    parser.add_argument("--poll", action="store_true",
+                        help="scan the directory instead of using inotify "
+                             "(e.g. for network shares)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between scans with --poll "
+                             "(default: %(default)s)")
+    parser.add_argument("--scan", action="store_true",
+                        help="also process the families already in the directory")
+    parser.add_argument("-D", "--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.tee and not args.pipeline:
+        parser.error("--tee requires --pipeline")
+    if args.pipeline and (args.no_zip or args.codec == "gzip"):
+        parser.error("--pipeline writes a zip archive: it cannot be combined "
+                     "with --no-zip or --codec gzip")
+    try:
+        check_level(args.codec, args.level)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not Path(args.directory).is_dir():
+        print(f"Not a directory: {args.directory}", file=sys.stderr)
+        return 1
+
+    # The same observer as the workers, which inherit it when forked
+    batch_observer.debug_mode = args.debug
+    logger.add_observer(batch_observer)
+    daemon = WatchDaemon(
+        args.directory, args.station_id, args.jobs, args.settle, args.poll,
+        args.interval, args.debug, backend=args.backend,
+        compress=not args.no_zip, codec=args.codec, level=args.level,
+        pipeline=args.pipeline, tee=args.tee)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    daemon.run(args.scan)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
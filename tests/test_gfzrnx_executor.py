@@ -0,0 +1,22 @@
+import sys
+
+from gfzrnx_executor import GfzrnxExecutor
+
+
+def _fake_gfzrnx(tmp_path, monkeypatch, script):
+    binary = tmp_path / "gfzrnx"
+    binary.write_text(f"#!{sys.executable}\nimport sys\n{script}")
+    binary.chmod(0o755)
+    monkeypatch.setenv("GFZRNX_PATH", str(binary))
+
+
+def test_long_lines(tmp_path, monkeypatch):
+    _fake_gfzrnx(tmp_path, monkeypatch,
+                 "sys.stdout.write('a' * 300000 + '\\nb\\n\\nc')\n"
+                 "sys.stderr.write('e' * 100000 + '\\n')\n")
+    streamed = []
+    result = GfzrnxExecutor().run_sync([], capture=True,
+                                       on_stdout=streamed.append)
+    assert streamed == ["a" * 300000 + "\n", "b\n", "\n", "c"]
+    assert result.stdout == "a" * 300000 + "\nb\n\nc"
+    assert result.stderr == "e" * 100000 + "\n"
@@ -0,0 +1,99 @@
+import gzip
+import io
+import struct
+import zipfile
+
+import pytest
+
+import rinex_compress
+from rinex_compress import (ZIP_CODECS, ZipStreamWriter, check_level,
+                            compress_rinex_family)
+
+MTIME = 1554595200  # 2019-04-07
+
+MEMBERS = {
+    "SSTR0970.19O": b"".join(b"%14.3f 7\n" % (i * 1.5) for i in range(20000)),
+    "SSTR0970.19N": b"".join(b"%19.12E\n" % (i * 1e-9) for i in range(5000)),
+    "SSTR0970.19G": b"",
+}
+
+
+def _write_archive(codec, members=MEMBERS):
+    out = io.BytesIO()
+    writer = ZipStreamWriter(out, codec)
+    for name, data in members.items():
+        with writer.open(name, MTIME) as member:
+            # Line by line, as the pipeline writes it
+            member.writelines(data.splitlines(True))
+    writer.close()
+    return out
+
+
+def _read_archive(archive):
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        return {info.filename: zipf.read(info) for info in zipf.infolist()}
+
+
+@pytest.mark.parametrize("codec", ZIP_CODECS)
+def test_zip_stream_writer(codec):
+    assert _read_archive(_write_archive(codec)) == MEMBERS
+
+
+def test_zip_stream_writer_utf8_name():
+    members = {"ESTAÇÃO.19O": b"data\n"}
+    assert _read_archive(_write_archive("deflate", members)) == members
+
+
+def test_zip_stream_writer_zip32_limit(monkeypatch):
+    data = _write_archive("deflate").getvalue()
+    # The members end where the central directory starts (end record)
+    central_offset = struct.unpack("<L", data[-6:-2])[0]
+    limit = max(central_offset, *map(len, MEMBERS.values()))
+
+    monkeypatch.setattr(rinex_compress, "ZIP32_LIMIT", limit)
+    assert _read_archive(_write_archive("deflate")) == MEMBERS
+
+    monkeypatch.setattr(rinex_compress, "ZIP32_LIMIT", limit - 1)
+    with pytest.raises(ValueError, match="too large"):
+        _write_archive("deflate")
+
+
+def _family(directory):
+    for name, data in MEMBERS.items():
+        (directory / name).write_bytes(data)
+    return directory / "SSTR0970.19O"
+
+
+@pytest.mark.parametrize("codec", ZIP_CODECS)
+def test_compress_rinex_family(tmp_path, codec):
+    result = compress_rinex_family(_family(tmp_path), codec)
+    assert result["archive"] == str(tmp_path / "SSTR0970_RINEX.zip")
+    assert _read_archive(result["archive"]) == MEMBERS
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        list(MEMBERS) + ["SSTR0970_RINEX.zip"])
+
+
+def test_compress_rinex_family_zip32_fallback(tmp_path, monkeypatch):
+    # Families above the limit are written through zipfile instead
+    monkeypatch.setattr(rinex_compress, "ZIP32_LIMIT", 1000)
+    result = compress_rinex_family(_family(tmp_path), "bzip2", 5)
+    assert _read_archive(result["archive"]) == MEMBERS
+
+
+def test_compress_rinex_family_gzip(tmp_path):
+    result = compress_rinex_family(_family(tmp_path), "gzip")
+    assert result["archive"] is None
+    for name, data in MEMBERS.items():
+        assert gzip.decompress((tmp_path / f"{name}.gz").read_bytes()) == data
+
+
+@pytest.mark.parametrize("codec, level", [
+    ("deflate", 10), ("bzip2", 0), ("lzma", -1), ("gzip", 10), ("zstd", None)])
+def test_invalid_level(tmp_path, codec, level):
+    obs_file = _family(tmp_path)
+    with pytest.raises(ValueError):
+        check_level(codec, level)
+    with pytest.raises(ValueError):
+        compress_rinex_family(obs_file, codec, level)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(MEMBERS)
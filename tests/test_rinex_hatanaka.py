@@ -0,0 +1,113 @@
+import pytest
+
+from rinex_hatanaka import (compress_obs_file, decompress_crx_file,
+                            iter_crinex_lines, iter_rinex_lines)
+
+OBS_TYPES = ("L1", "L2", "C1", "P2", "D1", "D2", "S1")
+
+
+def _header():
+    types = f"{len(OBS_TYPES):6d}" + "".join(f"{t:>6}" for t in OBS_TYPES)
+    return [
+        f"{'     2.11':<20}{'OBSERVATION DATA':<20}{'G (GPS)':<20}"
+        f"RINEX VERSION / TYPE\n",
+        f"{types:<60}# / TYPES OF OBSERV\n",
+        f"{'':<60}END OF HEADER\n",
+    ]
+
+
+def _epoch(second, sats, clock=None, flag=0):
+    line = f" 19  4  7  0 {second // 60:2d}{second % 60:11.7f}  {flag}" \
+           f"{len(sats):3d}" + "".join(sats[:12])
+    if clock is not None:
+        line = line.ljust(68) + f"{clock:12.9f}"
+    lines = [line + "\n"]
+    for k in range(12, len(sats), 12):
+        lines.append(" " * 32 + "".join(sats[k:k + 12]) + "\n")
+    return lines
+
+
+def _observations(fields):
+    # fields: (value in thousandths or None, LLI, SSI) per observation type
+    text = [(" " * 14 if value is None else f"{value / 1000:14.3f}") + lli + ssi
+            for value, lli, ssi in fields]
+    return ["".join(text[k:k + 5]).rstrip() + "\n"
+            for k in range(0, len(text), 5)]
+
+
+def _value(sat, j, epoch):
+    value = (int(sat[1:]) * 1000003 + j * 7919) * 1000 + epoch * epoch * 12345 \
+            + epoch * 678
+    # Doppler observations are negative
+    return -value if OBS_TYPES[j].startswith("D") else value
+
+
+def _record(epoch, sats, clock=None, blank=(), flags=None):
+    lines = _epoch(30 * epoch, sats, clock)
+    for sat in sats:
+        lli, ssi = (flags or {}).get(sat, (" ", "7"))
+        lines += _observations(
+            (None if (sat, j) in blank else _value(sat, j, epoch), lli, ssi)
+            for j in range(len(OBS_TYPES)))
+    return lines
+
+
+def _sample():
+    sats = [f"G{n:02d}" for n in range(1, 15)]
+    lines = _header()
+    lines += _record(0, sats, clock=0.000123456)
+    lines += _record(1, sats, clock=0.000123789,
+                     flags={"G03": ("1", "5"), "G07": (" ", "4")})
+    # No clock offset, a blank field, G14 lost and G15 rising
+    lines += _record(2, sats[:13] + ["G15"], blank={("G05", 2), ("G06", 0)},
+                     flags={"G03": ("1", "5")})
+    # Event with two special records, restarting every arc
+    lines += ["                            4  2\n",
+              f"{'ANTENNA MOVED':<60}COMMENT\n",
+              f"{'BACK IN PLACE':<60}COMMENT\n"]
+    lines += _record(3, sats, clock=-0.000004321)
+    lines += _record(4, sats, clock=-0.000004298, blank={("G01", 6)})
+    lines += _record(5, sats[:3], flags={"G02": ("2", "9")})
+    return lines
+
+
+def test_round_trip():
+    lines = _sample()
+    crinex = list(iter_crinex_lines(lines))
+    assert crinex[0].startswith("1.0")
+    assert list(iter_rinex_lines(crinex)) == lines
+
+
+def test_round_trip_files(tmp_path):
+    rinex_file = tmp_path / "SSTR0970.19O"
+    rinex_file.write_text("".join(_sample()), encoding="latin-1")
+    crinex_file = compress_obs_file(rinex_file)
+    assert crinex_file.name == "SSTR0970.19D"
+    assert crinex_file.stat().st_size < rinex_file.stat().st_size
+
+    restored = decompress_crx_file(crinex_file, tmp_path / "restored.19O")
+    assert restored.read_bytes() == rinex_file.read_bytes()
+
+
+def test_trailing_blank_line():
+    lines = _sample()
+    assert list(iter_rinex_lines(iter_crinex_lines(lines + ["\n"]))) == lines
+
+
+def test_unparsable_line():
+    lines = _sample()
+    lines.insert(3, "not an epoch line\n")
+    with pytest.raises(ValueError, match="Line 4"):
+        list(iter_crinex_lines(lines))
+
+
+def test_blank_satellite_count():
+    lines = _header() + [" 19  4  7  0  0  0.0000000  0   G01\n"]
+    with pytest.raises(ValueError, match="Line 4"):
+        list(iter_crinex_lines(lines))
+
+
+def test_truncated_record():
+    lines = _sample()[:-1]
+    with pytest.raises(ValueError, match="ends inside an epoch record"):
+        list(iter_crinex_lines(lines))
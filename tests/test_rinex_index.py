@@ -0,0 +1,33 @@
+import pytest
+
+from gps_time import GPSTime
+from rinex_index import build_epoch_index
+
+HEADER = [
+    f"{'     2.11':<20}{'OBSERVATION DATA':<20}{'G (GPS)':<20}"
+    f"RINEX VERSION / TYPE\n",
+    f"{'     1    C1':<60}# / TYPES OF OBSERV\n",
+    f"{'':<60}END OF HEADER\n",
+]
+
+
+def test_fractional_seconds(tmp_path):
+    rinex_file = tmp_path / "SSTR0970.19O"
+    seconds = ("0.0000000", "0.1000000", "59.9999999")
+    lines = list(HEADER)
+    for minute, second in enumerate(seconds):
+        lines += [f" 19  4  7 23 {minute:2d}{second:>11}  0  1G01\n",
+                  "  20000000.123\n"]
+    rinex_file.write_text("".join(lines))
+
+    index = build_epoch_index(rinex_file)
+    assert list(index.times) == [
+        GPSTime.from_epoch_line(line).total_ns for line in lines[3::2]]
+    assert index.times[2] - index.times[0] == 179999999900
+
+
+def test_empty_file(tmp_path):
+    rinex_file = tmp_path / "SSTR0970.19O"
+    rinex_file.touch()
+    with pytest.raises(ValueError, match="Not a RINEX observation file"):
+        build_epoch_index(rinex_file)
@@ -0,0 +1,118 @@
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from rinex_io import LZWDecompressor, open_rinex
+
+LZW_CLEAR = 256
+
+
+def _lzw_compress(data, max_bits, clear_when_full=False):
+    """
+    compress(1) encoder: codes in groups of 8 (`bits` bytes), a group
+    padded whenever the code size changes or after a CLEAR
+    """
+    out = bytearray(b"\x1f\x9d" + bytes((max_bits | 0x80,)))
+    max_entries = 1 << max_bits
+    state = {"bits": 9, "maxcode": (1 << 9) - 1, "free": LZW_CLEAR + 1}
+    group = []
+
+    def write_group(size):
+        value = 0
+        for k, code in enumerate(group):
+            value |= code << (k * state["bits"])
+        out.extend(value.to_bytes(state["bits"], "little")[:size])
+        group.clear()
+
+    def emit(code, clear=False):
+        group.append(code)
+        if len(group) == 8:
+            write_group(state["bits"])
+        if clear or state["free"] > state["maxcode"]:
+            if group:
+                write_group(state["bits"])
+            if clear:
+                state["bits"], state["maxcode"] = 9, (1 << 9) - 1
+            else:
+                # As compress(1) does, 9 bit files also grow to 10 bits
+                state["bits"] += 1
+                state["maxcode"] = (max_entries if state["bits"] == max_bits
+                                    else (1 << state["bits"]) - 1)
+
+    table = {bytes((i,)): i for i in range(256)}
+    prefix = b""
+    for byte in data:
+        extended = prefix + bytes((byte,))
+        if extended in table:
+            prefix = extended
+            continue
+        emit(table[prefix])
+        if state["free"] < max_entries:
+            table[extended] = state["free"]
+            state["free"] += 1
+        elif clear_when_full:
+            table = {bytes((i,)): i for i in range(256)}
+            state["free"] = LZW_CLEAR + 1
+            emit(LZW_CLEAR, clear=True)
+        prefix = bytes((byte,))
+    if prefix:
+        emit(table[prefix])
+    if group:
+        write_group((len(group) * state["bits"] + 7) // 8)
+    return bytes(out)
+
+
+def _sample(size, seed=97):
+    # Observation-like text: repetitive enough to build long table entries
+    rng = random.Random(seed)
+    lines = []
+    while sum(map(len, lines)) < size:
+        lines.append("".join(f"{rng.uniform(-3e7, 3e7):14.3f} {rng.randint(0, 9)}"
+                             for _ in range(5)) + "\n")
+    return "".join(lines).encode("ascii")[:size]
+
+
+def _decode(data, chunk_size):
+    decoder = LZWDecompressor()
+    out = [decoder.decompress(data[k:k + chunk_size])
+           for k in range(0, len(data), chunk_size)]
+    return b"".join(out) + decoder.flush()
+
+
+@pytest.mark.parametrize("max_bits, clear_when_full", [
+    (9, False), (9, True), (12, False), (12, True), (16, False)])
+def test_lzw_table_fill(max_bits, clear_when_full):
+    data = _sample(300000)
+    compressed = _lzw_compress(data, max_bits, clear_when_full)
+    # Code groups split across decompress() calls
+    for chunk_size in (len(compressed), 1 << 16, 7):
+        assert _decode(compressed, chunk_size) == data
+
+    # The encoder itself against an independent decoder
+    if shutil.which("gzip"):
+        assert subprocess.run(["gzip", "-dc"], input=compressed,
+                              stdout=subprocess.PIPE, check=True).stdout == data
+
+
+def test_lzw_clear_codes_reset_the_table():
+    data = _sample(100000, seed=7)
+    compressed = _lzw_compress(data, 9, clear_when_full=True)
+    assert compressed != _lzw_compress(data, 9)
+    assert _decode(compressed, 1) == data
+
+
+def test_lzw_corrupt_code():
+    # A 9 bit code past the end of the table as the second code
+    bad = b"\x1f\x9d\x90" + (ord("A") | 300 << 9).to_bytes(3, "little")
+    with pytest.raises(ValueError, match="Corrupt"):
+        _decode(bad, len(bad))
+
+
+def test_open_rinex_z(tmp_path):
+    data = _sample(50000)
+    path = tmp_path / "SSTR0970.19O.Z"
+    path.write_bytes(_lzw_compress(data, 16))
+    with open_rinex(path) as src:
+        assert src.read() == data